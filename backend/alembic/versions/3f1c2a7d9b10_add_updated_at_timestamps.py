@@ -0,0 +1,33 @@
+"""Add updated_at timestamps to genomes and experiments
+
+Revision ID: 3f1c2a7d9b10
+Revises: 929e5e919224
+Create Date: 2026-10-19 09:12:41.508113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7d9b10'
+down_revision: Union[str, None] = '929e5e919224'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('genomes', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('experiments', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # Existing rows have not changed since we started tracking
+    op.execute("UPDATE genomes SET updated_at = created_at")
+    op.execute("UPDATE experiments SET updated_at = created_at")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('experiments', 'updated_at')
+    op.drop_column('genomes', 'updated_at')
@@ -0,0 +1,30 @@
+"""Track archived experiments and archived contributions
+
+Revision ID: 8b2e4c6d1a37
+Revises: 3f1c2a7d9b10
+Create Date: 2026-10-19 18:02:15.734120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4c6d1a37'
+down_revision: Union[str, None] = '3f1c2a7d9b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('experiments', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.add_column('users', sa.Column('archived_contribution_count', sa.Integer(), nullable=True, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'archived_contribution_count')
+    op.drop_column('experiments', 'archived_at')
@@ -0,0 +1,36 @@
+"""Give every experiment a root seed for its random streams
+
+Revision ID: a6c1e3f5b7d9
+Revises: f4b8d2e6a1c3
+Create Date: 2026-10-19 20:48:06.517390
+
+"""
+import secrets
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c1e3f5b7d9'
+down_revision: Union[str, None] = 'f4b8d2e6a1c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('experiments', sa.Column('rng_seed', sa.BigInteger(), nullable=True))
+
+    # Existing experiments continue from a fresh seed (63 bits, fits a signed BIGINT)
+    bind = op.get_bind()
+    experiments = sa.table('experiments', sa.column('id', sa.Integer), sa.column('rng_seed', sa.BigInteger))
+    for (experiment_id,) in bind.execute(sa.select(experiments.c.id)).fetchall():
+        bind.execute(experiments.update().where(experiments.c.id == experiment_id).values(rng_seed=secrets.randbits(63)))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('experiments') as batch_op:
+        batch_op.drop_column('rng_seed')
@@ -0,0 +1,31 @@
+"""Archived contribution count of experiments
+
+Revision ID: a8c0e2f4b6d7
+Revises: f7b9d1e3a5c6
+Create Date: 2026-10-20 09:41:52.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c0e2f4b6d7'
+down_revision: Union[str, None] = 'f7b9d1e3a5c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('experiments', sa.Column('archived_contribution_count', sa.Integer(), nullable=True))
+    # Experiments already archived stay NULL until python -m app.archive --backfill-contributions counts them
+    op.execute(sa.text("UPDATE experiments SET archived_contribution_count = 0 WHERE archived_at IS NULL"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('experiments') as batch_op:
+        batch_op.drop_column('archived_contribution_count')
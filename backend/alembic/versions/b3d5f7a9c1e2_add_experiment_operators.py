@@ -0,0 +1,32 @@
+"""Per-experiment selection and crossover operators
+
+Revision ID: b3d5f7a9c1e2
+Revises: a6c1e3f5b7d9
+Create Date: 2026-10-19 21:30:44.108265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3d5f7a9c1e2'
+down_revision: Union[str, None] = 'a6c1e3f5b7d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing experiments keep breeding the way they always have
+    op.add_column('experiments', sa.Column('selection_operator', sa.String(), nullable=True, server_default='elitist'))
+    op.add_column('experiments', sa.Column('crossover_operator', sa.String(), nullable=True, server_default='midpoint'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('experiments') as batch_op:
+        batch_op.drop_column('crossover_operator')
+        batch_op.drop_column('selection_operator')
@@ -0,0 +1,39 @@
+"""Surrogate predicted score of genomes
+
+Revision ID: b9d1f3a5c7e8
+Revises: a8c0e2f4b6d7
+Create Date: 2026-10-20 10:17:06.552931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d1f3a5c7e8'
+down_revision: Union[str, None] = 'a8c0e2f4b6d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('genomes', sa.Column('predicted_score', sa.Float(), nullable=True))
+
+    # Predictions used to be written into score; only human scores stay there
+    op.execute(sa.text("""
+        UPDATE genomes SET predicted_score = score, score = 0.0
+        WHERE (user_scored IS NULL OR user_scored = :false) AND score IS NOT NULL AND score != 0
+    """).bindparams(false=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(sa.text("""
+        UPDATE genomes SET score = predicted_score
+        WHERE (user_scored IS NULL OR user_scored = :false) AND predicted_score IS NOT NULL
+    """).bindparams(false=False))
+    with op.batch_alter_table('genomes') as batch_op:
+        batch_op.drop_column('predicted_score')
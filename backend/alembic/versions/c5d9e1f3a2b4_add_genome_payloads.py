@@ -0,0 +1,93 @@
+"""Store genome notes in a content-addressed genome_payloads table
+
+Revision ID: c5d9e1f3a2b4
+Revises: 8b2e4c6d1a37
+Create Date: 2026-10-19 19:40:03.118542
+
+"""
+from typing import Sequence, Union
+import hashlib
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d9e1f3a2b4'
+down_revision: Union[str, None] = '8b2e4c6d1a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def content_hash(genome_data):
+    # Must match app.payloads.content_hash
+    try:
+        canonical = json.dumps(json.loads(genome_data), sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        canonical = genome_data or ""
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'genome_payloads',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('heuristic_score', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('hash')
+    )
+    with op.batch_alter_table('genomes') as batch_op:
+        batch_op.add_column(sa.Column('payload_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_genomes_payload_hash', ['payload_hash'])
+        batch_op.create_foreign_key('fk_genomes_payload_hash', 'genome_payloads', ['payload_hash'], ['hash'])
+
+    # Move existing notes into payloads, one copy per distinct melody
+    bind = op.get_bind()
+    genomes = sa.table('genomes', sa.column('id', sa.Integer), sa.column('data', sa.Text),
+                       sa.column('payload_hash', sa.String))
+    payloads = sa.table('genome_payloads', sa.column('hash', sa.String), sa.column('data', sa.Text),
+                        sa.column('ref_count', sa.Integer), sa.column('created_at', sa.DateTime))
+
+    ref_counts = {}
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(genomes.c.id, genomes.c.data)
+            .where(genomes.c.id > last_id, genomes.c.data != None)
+            .order_by(genomes.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for genome_id, data in rows:
+            payload_hash = content_hash(data)
+            if payload_hash not in ref_counts:
+                ref_counts[payload_hash] = 0
+                bind.execute(payloads.insert().values(
+                    hash=payload_hash, data=data, ref_count=0, created_at=datetime.utcnow()
+                ))
+            ref_counts[payload_hash] += 1
+            bind.execute(genomes.update().where(genomes.c.id == genome_id).values(payload_hash=payload_hash, data=None))
+        last_id = rows[-1][0]
+
+    for payload_hash, count in ref_counts.items():
+        bind.execute(payloads.update().where(payloads.c.hash == payload_hash).values(ref_count=count))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(
+        "UPDATE genomes SET data = (SELECT data FROM genome_payloads WHERE genome_payloads.hash = genomes.payload_hash) "
+        "WHERE payload_hash IS NOT NULL"
+    )
+    with op.batch_alter_table('genomes') as batch_op:
+        batch_op.drop_constraint('fk_genomes_payload_hash', type_='foreignkey')
+        batch_op.drop_index('ix_genomes_payload_hash')
+        batch_op.drop_column('payload_hash')
+    op.drop_table('genome_payloads')
@@ -0,0 +1,34 @@
+"""Steady-state evolution mode
+
+Revision ID: c8e2a4f6b0d3
+Revises: b3d5f7a9c1e2
+Create Date: 2026-10-19 22:40:12.531907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e2a4f6b0d3'
+down_revision: Union[str, None] = 'b3d5f7a9c1e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('experiments', sa.Column('evolution_mode', sa.String(), nullable=True, server_default='generational'))
+    op.add_column('experiments', sa.Column('steady_state_births', sa.Integer(), nullable=True, server_default='0'))
+    op.add_column('genome_experiments', sa.Column('replaced_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('genome_experiments') as batch_op:
+        batch_op.drop_column('replaced_at')
+    with op.batch_alter_table('experiments') as batch_op:
+        batch_op.drop_column('steady_state_births')
+        batch_op.drop_column('evolution_mode')
@@ -0,0 +1,58 @@
+"""Event-driven generation advancement
+
+Revision ID: d1f3b5c7e9a2
+Revises: c8e2a4f6b0d3
+Create Date: 2026-10-19 23:25:51.720334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f3b5c7e9a2'
+down_revision: Union[str, None] = 'c8e2a4f6b0d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('experiments', sa.Column('advance_after_scores', sa.Integer(), nullable=True))
+    op.add_column('experiments', sa.Column('advance_after_fraction', sa.Float(), nullable=True))
+    op.add_column('experiments', sa.Column('advance_max_wait_seconds', sa.Integer(), nullable=True))
+    op.add_column('experiments', sa.Column('generation_contributions', sa.Integer(), nullable=True, server_default='0'))
+    op.add_column('experiments', sa.Column('generation_started_at', sa.DateTime(), nullable=True))
+    op.add_column('experiments', sa.Column('advance_due_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_experiments_advance_due_at'), 'experiments', ['advance_due_at'], unique=False)
+
+    # Count the contributions already made to each current generation, and let
+    # the first tick look at the experiments that have some, as the fixed
+    # interval update would have
+    op.execute(sa.text("""
+        UPDATE experiments SET generation_contributions = (
+            SELECT COUNT(*) FROM mutations
+            JOIN genome_experiments ON genome_experiments.genome_id = mutations.genome_id
+            WHERE genome_experiments.experiment_id = experiments.id
+              AND genome_experiments.generation = experiments.current_generation
+        ),
+        generation_started_at = CURRENT_TIMESTAMP
+    """))
+    op.execute(sa.text("""
+        UPDATE experiments SET advance_due_at = CURRENT_TIMESTAMP
+        WHERE generation_contributions > 0 AND completed = :false
+    """).bindparams(false=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_experiments_advance_due_at'), table_name='experiments')
+    with op.batch_alter_table('experiments') as batch_op:
+        batch_op.drop_column('advance_due_at')
+        batch_op.drop_column('generation_started_at')
+        batch_op.drop_column('generation_contributions')
+        batch_op.drop_column('advance_max_wait_seconds')
+        batch_op.drop_column('advance_after_fraction')
+        batch_op.drop_column('advance_after_scores')
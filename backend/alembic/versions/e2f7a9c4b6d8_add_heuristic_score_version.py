@@ -0,0 +1,30 @@
+"""Tag cached heuristic scores with the scorer version
+
+Revision ID: e2f7a9c4b6d8
+Revises: c5d9e1f3a2b4
+Create Date: 2026-10-19 19:12:40.281734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f7a9c4b6d8'
+down_revision: Union[str, None] = 'c5d9e1f3a2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Scores cached before versioning have no tag and are recomputed on next use
+    op.add_column('genome_payloads', sa.Column('heuristic_score_version', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('genome_payloads') as batch_op:
+        batch_op.drop_column('heuristic_score_version')
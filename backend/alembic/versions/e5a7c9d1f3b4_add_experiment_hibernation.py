@@ -0,0 +1,42 @@
+"""Hibernation of idle experiments
+
+Revision ID: e5a7c9d1f3b4
+Revises: d1f3b5c7e9a2
+Create Date: 2026-10-20 00:12:37.904418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9d1f3b4'
+down_revision: Union[str, None] = 'd1f3b5c7e9a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('experiments', sa.Column('last_active_at', sa.DateTime(), nullable=True))
+    op.add_column('experiments', sa.Column('dormant_since', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_experiments_dormant_since'), 'experiments', ['dormant_since'], unique=False)
+
+    # Idle time counts from the last contribution
+    op.execute(sa.text("""
+        UPDATE experiments SET last_active_at = (
+            SELECT MAX(mutations.created_at) FROM mutations
+            JOIN genome_experiments ON genome_experiments.genome_id = mutations.genome_id
+            WHERE genome_experiments.experiment_id = experiments.id
+        )
+    """))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_experiments_dormant_since'), table_name='experiments')
+    with op.batch_alter_table('experiments') as batch_op:
+        batch_op.drop_column('dormant_since')
+        batch_op.drop_column('last_active_at')
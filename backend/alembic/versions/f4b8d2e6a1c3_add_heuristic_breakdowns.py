@@ -0,0 +1,44 @@
+"""Store heuristic score components per payload
+
+Revision ID: f4b8d2e6a1c3
+Revises: e2f7a9c4b6d8
+Create Date: 2026-10-19 20:03:51.904217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4b8d2e6a1c3'
+down_revision: Union[str, None] = 'e2f7a9c4b6d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled in by the background job (score_breakdowns.run_batch_job)
+    op.create_table(
+        'heuristic_breakdowns',
+        sa.Column('hash', sa.String(length=64), sa.ForeignKey('genome_payloads.hash'), primary_key=True),
+        sa.Column('scorer_version', sa.Integer(), nullable=False),
+        sa.Column('pitch', sa.Float(), nullable=True),
+        sa.Column('rhythm', sa.Float(), nullable=True),
+        sa.Column('contour', sa.Float(), nullable=True),
+        sa.Column('phrase', sa.Float(), nullable=True),
+        sa.Column('interval', sa.Float(), nullable=True),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index(op.f('ix_heuristic_breakdowns_scorer_version'), 'heuristic_breakdowns', ['scorer_version'], unique=False)
+    op.create_index(op.f('ix_heuristic_breakdowns_total'), 'heuristic_breakdowns', ['total'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_heuristic_breakdowns_total'), table_name='heuristic_breakdowns')
+    op.drop_index(op.f('ix_heuristic_breakdowns_scorer_version'), table_name='heuristic_breakdowns')
+    op.drop_table('heuristic_breakdowns')
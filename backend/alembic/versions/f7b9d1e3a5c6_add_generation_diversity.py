@@ -0,0 +1,48 @@
+"""Per-generation population diversity
+
+Revision ID: f7b9d1e3a5c6
+Revises: e5a7c9d1f3b4
+Create Date: 2026-10-20 01:03:18.265139
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7b9d1e3a5c6'
+down_revision: Union[str, None] = 'e5a7c9d1f3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'generation_diversity',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('experiment_id', sa.Integer(), nullable=False),
+        sa.Column('generation', sa.Integer(), nullable=False),
+        sa.Column('steady_state_births', sa.Integer(), nullable=True),
+        sa.Column('genomes', sa.Integer(), nullable=False),
+        sa.Column('mean_pairwise_distance', sa.Float(), nullable=False),
+        sa.Column('mean_hamming_distance', sa.Float(), nullable=False),
+        sa.Column('unique_ratio', sa.Float(), nullable=False),
+        sa.Column('positional_entropy', sa.Float(), nullable=False),
+        sa.Column('mutation_rate', sa.Float(), nullable=True),
+        sa.Column('mutation_strength', sa.Float(), nullable=True),
+        sa.Column('computed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['experiment_id'], ['experiments.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_generation_diversity_id'), 'generation_diversity', ['id'], unique=False)
+    op.create_index(op.f('ix_generation_diversity_experiment_id'), 'generation_diversity', ['experiment_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_generation_diversity_experiment_id'), table_name='generation_diversity')
+    op.drop_index(op.f('ix_generation_diversity_id'), table_name='generation_diversity')
+    op.drop_table('generation_diversity')
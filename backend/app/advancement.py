@@ -0,0 +1,127 @@
+"""
+Event-driven generation advancement.
+
+A generational experiment advances when its advance policy says so:
+
+- after K human scores in the current generation (advance_after_scores),
+- once a fraction of the generation's genomes is human-scored
+  (advance_after_fraction; 1.0, every genome, is the default), or
+- at the latest max-wait seconds after the generation started
+  (advance_max_wait_seconds), provided it got at least one score.
+
+Each setting left NULL on the experiment falls back to the environment
+default; a K or wait of 0 turns that trigger off. The thresholds are checked
+in the mutation path, which also maintains the per-generation contribution
+counter. The first contribution of a generation arms Experiment.advance_due_at
+for the max-wait trigger. The scheduler tick only looks at armed experiments
+that are due (an indexed range query), so experiments nobody contributes to
+cost nothing per tick.
+"""
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Load environment variables
+load_dotenv()
+
+ADVANCE_AFTER_SCORES = int(os.getenv("ADVANCE_AFTER_SCORES", 0))
+ADVANCE_AFTER_FRACTION = float(os.getenv("ADVANCE_AFTER_FRACTION", 1.0))
+# The fixed generation update used to run every 3 minutes
+ADVANCE_MAX_WAIT_SECONDS = int(os.getenv("ADVANCE_MAX_WAIT_SECONDS", 180))
+ADVANCE_CHECK_SECONDS = int(os.getenv("ADVANCE_CHECK_SECONDS", 15))
+
+
+class InvalidPolicyError(ValueError):
+    pass
+
+
+def check_policy(after_scores: int = None, after_fraction: float = None, max_wait_seconds: int = None):
+    if after_scores is not None and after_scores < 0:
+        raise InvalidPolicyError("advance_after_scores must be 0 (off) or more")
+    if after_fraction is not None and not 0 < after_fraction <= 1:
+        raise InvalidPolicyError("advance_after_fraction must be in (0, 1]")
+    if max_wait_seconds is not None and max_wait_seconds < 0:
+        raise InvalidPolicyError("advance_max_wait_seconds must be 0 (off) or more")
+
+
+def policy(experiment: models.Experiment) -> dict:
+    """The experiment's effective policy, environment defaults filled in"""
+    return {
+        "advance_after_scores": experiment.advance_after_scores
+        if experiment.advance_after_scores is not None else ADVANCE_AFTER_SCORES,
+        "advance_after_fraction": experiment.advance_after_fraction
+        if experiment.advance_after_fraction is not None else ADVANCE_AFTER_FRACTION,
+        "advance_max_wait_seconds": experiment.advance_max_wait_seconds
+        if experiment.advance_max_wait_seconds is not None else ADVANCE_MAX_WAIT_SECONDS,
+    }
+
+
+def start_generation(experiment: models.Experiment):
+    """Reset the counters for a new generation (caller commits)"""
+    experiment.generation_contributions = 0
+    experiment.generation_started_at = datetime.utcnow()
+    experiment.advance_due_at = None
+
+
+def record_contribution(db: Session, experiment: models.Experiment, scored: int, population: int) -> bool:
+    """
+    Count one contribution to the experiment's current generation and tell
+    whether it should advance now. scored and population are the human-scored
+    and total genomes of the generation, this contribution included.
+    """
+    # Incremented in SQL, so concurrent contributions aren't lost
+    experiment.generation_contributions = func.coalesce(models.Experiment.generation_contributions, 0) + 1
+    db.flush()
+    settings = policy(experiment)
+
+    if experiment.advance_due_at is None and settings["advance_max_wait_seconds"]:
+        started_at = experiment.generation_started_at or datetime.utcnow()
+        experiment.advance_due_at = started_at + timedelta(seconds=settings["advance_max_wait_seconds"])
+
+    if settings["advance_after_scores"] and experiment.generation_contributions >= settings["advance_after_scores"]:
+        return True
+    return population > 0 and scored >= _fraction_target(settings, population)
+
+
+def _fraction_target(settings: dict, population: int) -> int:
+    """Human-scored genomes the fraction trigger needs"""
+    # (rounded so that e.g. 0.3 of 10 genomes means 3, despite float error)
+    return math.ceil(round(settings["advance_after_fraction"] * population, 9))
+
+
+def progress(experiment: models.Experiment, scored: int = None, population: int = None) -> dict:
+    """
+    What clients can tell about the next advance of the current generation:
+    when the max-wait trigger fires (next_update, None until the generation's
+    first contribution arms it) and how many more contributions would
+    advance it at the latest (None if not known). scored and population are
+    as in record_contribution; without them the fraction trigger is left out.
+    """
+    if experiment is None or experiment.completed or experiment.evolution_mode == "steady_state":
+        return {"next_update": None, "contributions_until_advance": None}
+    settings = policy(experiment)
+    remaining = []
+    if settings["advance_after_scores"]:
+        remaining.append(settings["advance_after_scores"] - (experiment.generation_contributions or 0))
+    if population:
+        remaining.append(_fraction_target(settings, population) - (scored or 0))
+    due_at = experiment.advance_due_at
+    return {
+        "next_update": due_at.replace(tzinfo=timezone.utc).isoformat() if due_at else None,
+        "contributions_until_advance": max(0, min(remaining)) if remaining else None,
+    }
+
+
+def due_experiments(db: Session, now: datetime = None):
+    """Generational experiments whose max wait is over"""
+    return db.query(models.Experiment).filter(
+        models.Experiment.advance_due_at <= (now or datetime.utcnow()),
+        models.Experiment.completed == False,
+        models.Experiment.dormant_since == None
+    ).all()
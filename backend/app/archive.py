@@ -0,0 +1,566 @@
+"""
+Cold storage for completed experiments.
+
+Once an experiment has been completed for ARCHIVE_AFTER_HOURS, its genomes
+and mutations are moved out of the hot tables into a separate archive
+database, one zlib-compressed JSON blob per generation. The hot tables keep
+the experiment row, its final genome and any genome a user saved, so they
+only grow with active experiments.
+
+Reads fall through transparently: find_genome() and friends look in the hot
+tables first and then in the archive, which keeps an index of archived
+genome ids and a small LRU of decompressed generations.
+
+Usage (from the backend directory):
+    python -m app.archive              archive every experiment that is due
+    python -m app.archive --experiment 3
+    python -m app.archive --backfill-contributions
+                                       count the contributions of experiments
+                                       archived before they were recorded
+"""
+import argparse
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import Column, Integer, LargeBinary, Text, UniqueConstraint, create_engine, func
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import models, generation_state, payloads
+
+# Load environment variables
+load_dotenv()
+
+ARCHIVE_DATABASE_URL = os.getenv("ARCHIVE_DATABASE_URL", "sqlite:///./tunebreeder_archive.db")
+# How long a completed experiment stays hot before it is archived
+ARCHIVE_AFTER_HOURS = float(os.getenv("ARCHIVE_AFTER_HOURS", 24))
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", 6))
+# Decompressed generations kept in memory for reads
+ARCHIVE_CACHE_SIZE = int(os.getenv("ARCHIVE_CACHE_SIZE", 32))
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+DELETE_CHUNK_SIZE = 500
+
+archive_engine = create_engine(
+    ARCHIVE_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+ArchiveSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=archive_engine)
+
+ArchiveBase = declarative_base()
+
+
+class ArchivedGeneration(ArchiveBase):
+    __tablename__ = "archived_generations"
+    __table_args__ = (UniqueConstraint("experiment_id", "generation"),)
+
+    id = Column(Integer, primary_key=True)
+    experiment_id = Column(Integer, index=True)
+    generation = Column(Integer)
+    genome_count = Column(Integer)
+    payload = Column(LargeBinary)  # zlib-compressed JSON list of genome records
+
+
+class ArchivedGenome(ArchiveBase):
+    """Index from genome id to the generation blob that holds it"""
+    __tablename__ = "archived_genomes"
+
+    genome_id = Column(Integer, primary_key=True)
+    experiment_id = Column(Integer, index=True)
+    generation = Column(Integer)
+
+
+class ArchivedScoreSummary(ArchiveBase):
+    """Heuristic score component statistics of one archived generation (see score_breakdowns.py)"""
+    __tablename__ = "archived_score_summaries"
+    __table_args__ = (UniqueConstraint("experiment_id", "generation"),)
+
+    id = Column(Integer, primary_key=True)
+    experiment_id = Column(Integer, index=True)
+    generation = Column(Integer)
+    scorer_version = Column(Integer)
+    summary = Column(Text)  # JSON, as returned by score_breakdowns.generation_summaries
+
+
+@dataclass
+class GenomeRecord:
+    """Read-only stand-in for models.Genome, served from the archive"""
+    id: int
+    generation: int
+    data: str
+    score: float
+    user_scored: bool
+    parent1_id: Optional[int]
+    parent2_id: Optional[int]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    mutations: List[dict] = field(default_factory=list)
+    archived: bool = True
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _encode_generation(genomes_list, mutations_by_genome) -> bytes:
+    records = []
+    for genome in genomes_list:
+        records.append({
+            "id": genome.id,
+            "generation": genome.generation,
+            "data": genome.data,
+            "score": genome.score,
+            "user_scored": bool(genome.user_scored),
+            "parent1_id": genome.parent1_id,
+            "parent2_id": genome.parent2_id,
+            "created_at": _isoformat(genome.created_at),
+            "updated_at": _isoformat(genome.updated_at),
+            "mutations": [
+                {
+                    "id": mutation.id,
+                    "user_id": mutation.user_id,
+                    "mutation_data": mutation.mutation_data,
+                    "score": mutation.score,
+                    "created_at": _isoformat(mutation.created_at),
+                }
+                for mutation in mutations_by_genome.get(genome.id, ())
+            ],
+        })
+    raw = json.dumps(records, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, ARCHIVE_COMPRESSION_LEVEL)
+
+
+def _decode_generation(payload: bytes):
+    records = json.loads(zlib.decompress(payload))
+    genomes_list = []
+    for record in records:
+        for mutation in record["mutations"]:
+            mutation["created_at"] = _datetime(mutation["created_at"])
+        genomes_list.append(GenomeRecord(
+            id=record["id"],
+            generation=record["generation"],
+            data=record["data"],
+            score=record["score"],
+            user_scored=record["user_scored"],
+            parent1_id=record["parent1_id"],
+            parent2_id=record["parent2_id"],
+            created_at=_datetime(record["created_at"]),
+            updated_at=_datetime(record["updated_at"]),
+            mutations=record["mutations"],
+        ))
+    return genomes_list
+
+
+class ArchiveStore:
+    """Reads and writes the archive database"""
+
+    def __init__(self, session_factory=ArchiveSessionLocal, cache_size: int = ARCHIVE_CACHE_SIZE):
+        self.session_factory = session_factory
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (experiment_id, generation) -> {genome_id: GenomeRecord}
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _session(self):
+        if not self._schema_ready:
+            ArchiveBase.metadata.create_all(bind=self.session_factory.kw["bind"])
+            self._schema_ready = True
+        return self.session_factory()
+
+    def write_experiment(self, experiment_id: int, generations, score_summaries=(), scorer_version=None):
+        """
+        Store an experiment's generations, replacing any earlier partial
+        archive of it. generations is {generation: (genomes, mutations_by_genome)}.
+        """
+        session = self._session()
+        try:
+            session.query(ArchivedGenome).filter(ArchivedGenome.experiment_id == experiment_id).delete()
+            session.query(ArchivedGeneration).filter(ArchivedGeneration.experiment_id == experiment_id).delete()
+            session.query(ArchivedScoreSummary).filter(ArchivedScoreSummary.experiment_id == experiment_id).delete()
+            session.add_all(
+                ArchivedScoreSummary(
+                    experiment_id=experiment_id,
+                    generation=summary["generation"],
+                    scorer_version=scorer_version,
+                    summary=json.dumps(summary),
+                )
+                for summary in score_summaries
+            )
+            for generation, (genomes_list, mutations_by_genome) in generations.items():
+                session.add(ArchivedGeneration(
+                    experiment_id=experiment_id,
+                    generation=generation,
+                    genome_count=len(genomes_list),
+                    payload=_encode_generation(genomes_list, mutations_by_genome),
+                ))
+                session.add_all(
+                    ArchivedGenome(genome_id=genome.id, experiment_id=experiment_id, generation=generation)
+                    for genome in genomes_list
+                )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        self.forget(experiment_id)
+
+    def forget(self, experiment_id: int):
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == experiment_id]:
+                del self._cache[key]
+
+    def _load(self, session, experiment_id: int, generation: int):
+        key = (experiment_id, generation)
+        with self._lock:
+            records = self._cache.get(key)
+            if records is not None:
+                self._cache.move_to_end(key)
+                return records
+
+        row = session.query(ArchivedGeneration.payload).filter(
+            ArchivedGeneration.experiment_id == experiment_id,
+            ArchivedGeneration.generation == generation
+        ).first()
+        records = {record.id: record for record in _decode_generation(row.payload)} if row else {}
+
+        with self._lock:
+            self._cache[key] = records
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return records
+
+    def get_genomes(self, genome_ids):
+        """Return {genome_id: (GenomeRecord, experiment_id)} for the ids found in the archive"""
+        found = {}
+        session = self._session()
+        try:
+            locations = session.query(
+                ArchivedGenome.genome_id, ArchivedGenome.experiment_id, ArchivedGenome.generation
+            ).filter(ArchivedGenome.genome_id.in_(set(genome_ids))).all()
+            for genome_id, experiment_id, generation in locations:
+                record = self._load(session, experiment_id, generation).get(genome_id)
+                if record is not None:
+                    found[genome_id] = (record, experiment_id)
+        finally:
+            session.close()
+        return found
+
+    def get_genome(self, genome_id: int):
+        """Return (GenomeRecord, experiment_id), or (None, None) if the genome isn't archived"""
+        return self.get_genomes([genome_id]).get(genome_id, (None, None))
+
+    def get_generation(self, experiment_id: int, generation: int):
+        session = self._session()
+        try:
+            return list(self._load(session, experiment_id, generation).values())
+        finally:
+            session.close()
+
+    def generations(self, experiment_id: int):
+        session = self._session()
+        try:
+            rows = session.query(ArchivedGeneration.generation).filter(
+                ArchivedGeneration.experiment_id == experiment_id
+            ).order_by(ArchivedGeneration.generation).all()
+            return [generation for (generation,) in rows]
+        finally:
+            session.close()
+
+    def iter_generations(self, experiment_id: int):
+        """Yield (generation, records) oldest first, decompressing one generation at a time"""
+        for generation in self.generations(experiment_id):
+            session = self._session()
+            try:
+                row = session.query(ArchivedGeneration.payload).filter(
+                    ArchivedGeneration.experiment_id == experiment_id,
+                    ArchivedGeneration.generation == generation
+                ).first()
+            finally:
+                session.close()
+            if row:
+                # Bypass the read cache so a full scan doesn't evict the hot entries
+                yield generation, _decode_generation(row.payload)
+
+    def get_score_summaries(self, experiment_id: int):
+        """Return (scorer version, per-generation summaries) stored when the experiment was archived"""
+        session = self._session()
+        try:
+            rows = session.query(ArchivedScoreSummary).filter(
+                ArchivedScoreSummary.experiment_id == experiment_id
+            ).order_by(ArchivedScoreSummary.generation).all()
+            scorer_version = rows[0].scorer_version if rows else None
+            return scorer_version, [json.loads(row.summary) for row in rows]
+        finally:
+            session.close()
+
+    def stats(self):
+        session = self._session()
+        try:
+            experiment_count, genome_count, stored_bytes = session.query(
+                func.count(func.distinct(ArchivedGeneration.experiment_id)),
+                func.coalesce(func.sum(ArchivedGeneration.genome_count), 0),
+                func.coalesce(func.sum(func.length(ArchivedGeneration.payload)), 0),
+            ).one()
+        finally:
+            session.close()
+        return {
+            "experiments": experiment_count,
+            "genomes": genome_count,
+            "stored_bytes": stored_bytes,
+            "cached_generations": len(self._cache),
+        }
+
+
+store = ArchiveStore()
+
+
+def _chunks(values, size=DELETE_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def archive_experiment(db: Session, experiment_id: int):
+    """
+    Move a completed experiment's genomes and mutations into the archive.
+
+    The archive is written and committed first; the hot rows are only
+    deleted afterwards, so a failure at any point leaves every genome
+    readable from one place or the other. Safe to re-run.
+    """
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise ValueError(f"Experiment {experiment_id} not found")
+    if not experiment.completed:
+        raise ValueError(f"Experiment {experiment_id} has not completed")
+    if experiment.archived_at:
+        return {"experiment_id": experiment_id, "archived_genomes": 0, "already_archived": True}
+
+    links = db.query(models.GenomeExperiment.genome_id, models.GenomeExperiment.generation).filter(
+        models.GenomeExperiment.experiment_id == experiment_id
+    ).all()
+    generation_of = {genome_id: generation for genome_id, generation in links}
+    genome_ids = list(generation_of)
+
+    genomes_by_id = {}
+    mutations_by_genome = {}
+    for chunk in _chunks(genome_ids):
+        for genome in db.query(models.Genome).filter(models.Genome.id.in_(chunk)):
+            genomes_by_id[genome.id] = genome
+        for mutation in db.query(models.Mutation).filter(models.Mutation.genome_id.in_(chunk)).order_by(models.Mutation.id):
+            mutations_by_genome.setdefault(mutation.genome_id, []).append(mutation)
+
+    generations = {}
+    for genome_id, genome in genomes_by_id.items():
+        generations.setdefault(generation_of[genome_id], ([], mutations_by_genome))[0].append(genome)
+
+    # Score analytics can't be recomputed from the hot tables once the genomes are gone
+    from . import genomes, score_breakdowns
+    score_breakdowns.compute_pending(db, experiment_id)
+    store.write_experiment(
+        experiment_id,
+        generations,
+        score_summaries=score_breakdowns.generation_summaries(db, experiment_id),
+        scorer_version=genomes.HEURISTIC_SCORER_VERSION,
+    )
+
+    # The final piece and saved melodies stay hot; everything else goes
+    preserved_ids = {experiment.final_genome_id} if experiment.final_genome_id else set()
+    for chunk in _chunks(genome_ids):
+        preserved_ids.update(
+            genome_id for (genome_id,) in db.query(models.SavedMelody.genome_id).filter(
+                models.SavedMelody.genome_id.in_(chunk)
+            ).distinct()
+        )
+    removed_ids = [genome_id for genome_id in genome_ids if genome_id not in preserved_ids]
+
+    try:
+        # Archived mutations still count towards their authors' contributions
+        contributions = {}
+        for mutations in mutations_by_genome.values():
+            for mutation in mutations:
+                contributions[mutation.user_id] = contributions.get(mutation.user_id, 0) + 1
+        for user_id, count in contributions.items():
+            db.query(models.User).filter(models.User.id == user_id).update(
+                {models.User.archived_contribution_count: func.coalesce(models.User.archived_contribution_count, 0) + count},
+                synchronize_session=False
+            )
+
+        for chunk in _chunks(genome_ids):
+            db.query(models.Mutation).filter(models.Mutation.genome_id.in_(chunk)).delete(synchronize_session=False)
+        payloads.release(db, removed_ids)
+        for chunk in _chunks(removed_ids):
+            db.query(models.GenomeExperiment).filter(
+                models.GenomeExperiment.experiment_id == experiment_id,
+                models.GenomeExperiment.genome_id.in_(chunk)
+            ).delete(synchronize_session=False)
+            db.query(models.Genome).filter(models.Genome.id.in_(chunk)).delete(synchronize_session=False)
+        payloads.collect_garbage(db)
+
+        # The experiment's total_contributions would otherwise drop to what is still hot
+        experiment.archived_contribution_count = (experiment.archived_contribution_count or 0) + sum(contributions.values())
+        experiment.archived_at = datetime.utcnow()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    generation_state.registry.invalidate(experiment_id)
+    print(f"Archived experiment {experiment_id}: {len(genomes_by_id)} genomes in {len(generations)} generations, "
+          f"{len(removed_ids)} removed from hot tables, {len(preserved_ids)} kept")
+    return {
+        "experiment_id": experiment_id,
+        "archived_genomes": len(genomes_by_id),
+        "archived_generations": len(generations),
+        "removed_from_hot": len(removed_ids),
+        "kept_hot": len(preserved_ids),
+    }
+
+
+def archive_due_experiments(db: Session, older_than_hours: float = ARCHIVE_AFTER_HOURS):
+    """Archive every experiment that completed at least older_than_hours ago"""
+    cutoff = datetime.utcnow() - timedelta(hours=older_than_hours)
+    due = db.query(models.Experiment.id).filter(
+        models.Experiment.completed == True,
+        models.Experiment.archived_at == None,
+        func.coalesce(models.Experiment.updated_at, models.Experiment.created_at) <= cutoff
+    ).all()
+
+    results = []
+    for (experiment_id,) in due:
+        try:
+            results.append(archive_experiment(db, experiment_id))
+        except Exception as e:
+            print(f"Error archiving experiment {experiment_id}: {e}")
+            results.append({"experiment_id": experiment_id, "error": str(e)})
+    return results
+
+
+def backfill_contribution_counts(db: Session):
+    """Count the archived mutations of experiments archived before archived_contribution_count existed"""
+    pending = db.query(models.Experiment).filter(
+        models.Experiment.archived_at != None,
+        models.Experiment.archived_contribution_count == None
+    ).all()
+    results = []
+    for experiment in pending:
+        count = sum(
+            len(record.mutations)
+            for _, records in store.iter_generations(experiment.id)
+            for record in records
+        )
+        experiment.archived_contribution_count = count
+        db.commit()
+        results.append({"experiment_id": experiment.id, "archived_contributions": count})
+    return results
+
+
+def find_genome(db: Session, genome_id: int):
+    """Look a genome up in the hot tables, then in the archive"""
+    genome = db.query(models.Genome).filter(models.Genome.id == genome_id).first()
+    if genome:
+        return genome
+    record, _ = store.get_genome(genome_id)
+    return record
+
+
+def find_experiment(db: Session, genome_id: int):
+    """The experiment a (hot or archived) genome belongs to, or None"""
+    genome_exp = db.query(models.GenomeExperiment).filter(
+        models.GenomeExperiment.genome_id == genome_id
+    ).first()
+    if genome_exp:
+        experiment_id = genome_exp.experiment_id
+    else:
+        _, experiment_id = store.get_genome(genome_id)
+        if experiment_id is None:
+            return None
+    return db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+
+
+def restore_genome(db: Session, genome_id: int):
+    """
+    Make sure a genome is in the hot tables, copying it back from the archive
+    if needed (e.g. when a user saves a melody from an archived experiment).
+    Returns the hot genome, or None if it exists nowhere. Does not commit.
+    """
+    genome = db.query(models.Genome).filter(models.Genome.id == genome_id).first()
+    if genome:
+        return genome
+    record, experiment_id = store.get_genome(genome_id)
+    if record is None:
+        return None
+
+    genome = models.Genome(
+        id=record.id,
+        generation=record.generation,
+        data=record.data,
+        score=record.score,
+        user_scored=record.user_scored,
+        parent1_id=record.parent1_id,
+        parent2_id=record.parent2_id,
+        created_at=record.created_at,
+        updated_at=record.updated_at,
+    )
+    db.add(genome)
+    db.add(models.GenomeExperiment(
+        genome_id=record.id,
+        experiment_id=experiment_id,
+        generation=record.generation,
+    ))
+    db.flush()
+    return genome
+
+
+def get_generation_genomes(db: Session, experiment: models.Experiment, generation: int):
+    """All genomes of one generation of an experiment, wherever they are stored"""
+    if experiment.archived_at:
+        return store.get_generation(experiment.id, generation)
+    return db.query(models.Genome).join(
+        models.GenomeExperiment,
+        models.GenomeExperiment.genome_id == models.Genome.id
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment.id,
+        models.GenomeExperiment.generation == generation
+    ).all()
+
+
+def main():
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Move completed experiments into the archive")
+    parser.add_argument("--experiment", type=int, help="archive this experiment now, regardless of age")
+    parser.add_argument("--older-than-hours", type=float, default=ARCHIVE_AFTER_HOURS)
+    parser.add_argument("--backfill-contributions", action="store_true",
+                        help="count the contributions of experiments archived before they were recorded")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.backfill_contributions:
+            results = backfill_contribution_counts(db)
+        elif args.experiment is not None:
+            results = [archive_experiment(db, args.experiment)]
+        else:
+            results = archive_due_experiments(db, args.older_than_hours)
+    finally:
+        db.close()
+    for result in results:
+        print(result)
+    print(store.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,9 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -5,6 +11,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
 
 from . import models, schemas, database
@@ -18,14 +25,57 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Decoded tokens are cached so authenticated requests don't hit the users table every time
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 1024))
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 300))
+
+# bcrypt cost factor (log2 of the number of rounds)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# bcrypt work runs on its own small pool so login bursts can't take over the
+# event loop or the threadpool that serves every other request
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+# Hash/verify jobs allowed to be queued or running before callers get a 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+password_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+def _submit_password_job(fn, *args):
+    """Queue a bcrypt call on the password executor, shedding load when it is saturated"""
+    if not _password_hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent login attempts, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        future = password_hash_executor.submit(fn, *args)
+    except Exception:
+        _password_hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _password_hash_slots.release())
+    return future
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return _submit_password_job(pwd_context.verify, plain_password, hashed_password).result()
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _submit_password_job(pwd_context.hash, password).result()
+
+async def verify_password_async(plain_password, hashed_password):
+    """Like verify_password, but awaits the executor instead of blocking the event loop"""
+    return await asyncio.wrap_future(
+        _submit_password_job(pwd_context.verify, plain_password, hashed_password)
+    )
+
+async def get_password_hash_async(password):
+    """Like get_password_hash, but awaits the executor instead of blocking the event loop"""
+    return await asyncio.wrap_future(_submit_password_job(pwd_context.hash, password))
 
 def get_user(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
@@ -38,6 +88,14 @@ def authenticate_user(db: Session, email: str, password: str):
         return False
     return user
 
+async def authenticate_user_async(db: Session, email: str, password: str):
+    user = get_user(db, email)
+    if not user:
+        return False
+    if not await verify_password_async(password, user.hashed_password):
+        return False
+    return user
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -48,12 +106,139 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+@dataclass(frozen=True)
+class UserPrincipal:
+    """Read-only snapshot of the authenticated user, safe to share between requests"""
+    id: int
+    email: str
+    username: str
+    is_active: bool
+    created_at: datetime
+    contribution_count: int = 0
+
+    @classmethod
+    def from_user(cls, user: models.User):
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            is_active=bool(user.is_active),
+            created_at=user.created_at,
+            contribution_count=user.contribution_count or 0,
+        )
+
+class TokenCache:
+    """
+    Bounded LRU cache of token -> UserPrincipal.
+    
+    Entries expire at the earlier of the token's own expiry and the cache TTL,
+    and can be dropped per user when their credentials or status change.
+    """
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: int = AUTH_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_email = {}  # email -> set of cached tokens
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[UserPrincipal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                self._discard(token)
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: UserPrincipal, token_expires_at: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (principal, expires_at)
+            self._tokens_by_email.setdefault(principal.email, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                oldest_token = next(iter(self._entries))
+                self._discard(oldest_token)
+
+    def invalidate_user(self, email: str):
+        with self._lock:
+            for token in list(self._tokens_by_email.get(email, ())):
+                self._discard(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_email.clear()
+
+    def _discard(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        email = entry[0].email
+        tokens = self._tokens_by_email.get(email)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_email[email]
+
+token_cache = TokenCache()
+
+def invalidate_user(email: str):
+    """Forget cached sessions of a user, e.g. after a password reset or deactivation"""
+    token_cache.invalidate_user(email)
+
+# Cached principals must not outlive a deactivation, deletion or credential change,
+# wherever in the app it happens: collect the affected users at flush, drop them at commit
+
+_CREDENTIAL_FIELDS = ("is_active", "hashed_password", "email")
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    emails = set()
+    for user in session.deleted:
+        if isinstance(user, models.User):
+            emails.add(user.email)
+    for user in session.dirty:
+        if not isinstance(user, models.User):
+            continue
+        attrs = inspect(user).attrs
+        if any(attrs[field].history.has_changes() for field in _CREDENTIAL_FIELDS):
+            emails.add(user.email)
+            emails.update(attrs.email.history.deleted)
+    if emails:
+        session.info.setdefault("auth_invalidate", set()).update(emails)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for email in session.info.pop("auth_invalidate", ()):
+        invalidate_user(email)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("auth_invalidate", None)
+
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+    return resolve_principal(token, db)
+
+def resolve_principal(token: str, db: Session) -> UserPrincipal:
+    """Turn a bearer token into a UserPrincipal, from the cache when possible"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -65,9 +250,33 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user = get_user(db, email=token_data.email)
     if user is None:
         raise credentials_exception
+    
+    principal = UserPrincipal.from_user(user)
+    token_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+def get_current_active_principal(current_user: UserPrincipal = Depends(get_current_principal)):
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+def get_current_user(
+    principal: UserPrincipal = Depends(get_current_principal),
+    db: Session = Depends(database.get_db)
+):
+    """Load the live ORM user, for routes that need to modify it"""
+    user = db.get(models.User, principal.id)
+    if user is None:
+        invalidate_user(principal.email)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 def get_current_active_user(current_user: schemas.User = Depends(get_current_user)):
     if not current_user.is_active:
+        invalidate_user(current_user.email)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
\ No newline at end of file
@@ -1,6 +1,6 @@
 import logging
 from sqlalchemy.orm import Session
-from . import models
+from . import models, payloads, similarity
 
 logger = logging.getLogger(__name__)
 
@@ -83,6 +83,7 @@ def cleanup_orphaned_genomes(db: Session, experiment_id: int):
         orphaned_genomes = [g for g in previous_gen_genomes if g.id not in preserved_genome_ids]
         
         # Delete orphaned genomes
+        payloads.release(db, [genome.id for genome in orphaned_genomes])
         deleted_count = 0
         for genome in orphaned_genomes:
             # First delete any experiment associations
@@ -94,7 +95,9 @@ def cleanup_orphaned_genomes(db: Session, experiment_id: int):
             db.query(models.Genome).filter(models.Genome.id == genome.id).delete(synchronize_session=False)
             deleted_count += 1
         
+        payloads.collect_garbage(db)
         db.commit()
+        similarity.remove_genomes([genome.id for genome in orphaned_genomes])
         
         logger.info(f"Cleanup completed for experiment {experiment_id}. Deleted {deleted_count} orphaned genomes.")
         return {
@@ -0,0 +1,215 @@
+"""
+Population diversity, adaptive mutation and convergence detection.
+
+Diversity is measured once per generation on the pitches of the population,
+one (n, length) array, and stored in generation_diversity. Positions are
+only comparable between genomes of the same length, so the metrics cover
+the genomes of the most common (modal) length; empty or unreadable genomes
+are left out, and "genomes" counts the genomes measured:
+
+- mean pairwise pitch distance: the average over all pairs of genomes of
+  the mean absolute pitch difference (semitones) at each position,
+  computed exactly in O(n log n) per position from the sorted pitches
+  instead of over all n^2 pairs;
+- mean Hamming distance: the fraction of positions at which two genomes
+  play different pitches, averaged over all pairs (from per-position pitch
+  counts: a position contributes every pair except those sharing a pitch);
+- unique ratio: distinct genomes / genomes;
+- positional entropy: the Shannon entropy (bits) of the pitch distribution
+  at each position, averaged over positions.
+
+The adaptive controller (adaptive_mutation) raises the chance that a child
+is mutated and the share of its notes that change when the population
+loses diversity, so human scores aren't spent on near-duplicates. A diverse
+population gets the base MUTATION_RATE / MUTATION_STRENGTH.
+
+An experiment has converged once pitch distance and entropy both fall
+below their thresholds, i.e. nearly every genome plays the same notes.
+Breeding more generations from such a population only shuffles copies of
+one melody, so the experiment completes early instead (from
+CONVERGENCE_MIN_GENERATION on).
+"""
+import json
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Load environment variables
+load_dotenv()
+
+CONVERGENCE_DETECTION = os.getenv("CONVERGENCE_DETECTION", "true").lower() in ("1", "true", "yes")
+CONVERGENCE_PITCH_DISTANCE = float(os.getenv("CONVERGENCE_PITCH_DISTANCE", 1.0))
+CONVERGENCE_ENTROPY_BITS = float(os.getenv("CONVERGENCE_ENTROPY_BITS", 0.5))
+CONVERGENCE_MIN_GENERATION = int(os.getenv("CONVERGENCE_MIN_GENERATION", 3))
+
+# Base mutation: chance that a child is mutated, and the share of its notes that change
+MUTATION_RATE = float(os.getenv("MUTATION_RATE", 0.1))
+MUTATION_STRENGTH = float(os.getenv("MUTATION_STRENGTH", 0.05))
+# Below this mean Hamming distance mutation is scaled up, by at most MUTATION_MAX_SCALE
+DIVERSITY_TARGET_HAMMING = float(os.getenv("DIVERSITY_TARGET_HAMMING", 0.5))
+MUTATION_MAX_SCALE = float(os.getenv("MUTATION_MAX_SCALE", 4.0))
+
+MIDI_PITCHES = 128
+
+# Stored metrics, in column order
+METRICS = ("mean_pairwise_distance", "mean_hamming_distance", "unique_ratio", "positional_entropy")
+
+
+def genome_pitches(genome_data) -> list:
+    """A genome JSON string's pitches; empty if it isn't a readable list of notes"""
+    try:
+        notes = json.loads(genome_data)
+        return [int(note.get("pitch", 60)) for note in notes]
+    except (TypeError, ValueError, AttributeError):
+        return []
+
+
+def pitch_matrix(genome_datas) -> np.ndarray:
+    """
+    Genome JSON strings -> (n, length) int array of the pitches of the
+    non-empty genomes of the modal length (the longer one on a tie)
+    """
+    pitch_lists = [pitches for pitches in map(genome_pitches, genome_datas) if pitches]
+    if not pitch_lists:
+        return np.zeros((0, 0), dtype=np.int64)
+    lengths, frequencies = np.unique([len(pitches) for pitches in pitch_lists], return_counts=True)
+    length = int(lengths[frequencies == frequencies.max()].max())
+    pitch_lists = [pitches for pitches in pitch_lists if len(pitches) == length]
+    return np.array(pitch_lists, dtype=np.int64)
+
+
+def pitch_counts(pitches: np.ndarray) -> np.ndarray:
+    """(length, 128) array: how many genomes play each pitch at each position"""
+    n, length = pitches.shape
+    counts = np.zeros((length, MIDI_PITCHES))
+    np.add.at(counts, (np.broadcast_to(np.arange(length), (n, length)), np.clip(pitches, 0, MIDI_PITCHES - 1)), 1)
+    return counts
+
+
+def mean_pairwise_distance(pitches: np.ndarray) -> float:
+    """Mean |pitch_i - pitch_j| over all pairs i < j and all positions"""
+    n, length = pitches.shape
+    if n < 2 or length == 0:
+        return 0.0
+    ordered = np.sort(pitches, axis=0).astype(np.float64)
+    # With x sorted, sum over i < j of (x_j - x_i) = sum_k x_k * (2k - n + 1)
+    weights = 2 * np.arange(n) - n + 1
+    total = (ordered * weights[:, None]).sum()
+    return float(total / (n * (n - 1) / 2) / length)
+
+
+def mean_hamming_distance(pitches: np.ndarray, counts: np.ndarray = None) -> float:
+    """Mean fraction of positions at which two genomes differ, over all pairs"""
+    n, length = pitches.shape
+    if n < 2 or length == 0:
+        return 0.0
+    counts = pitch_counts(pitches) if counts is None else counts
+    same_pairs = (counts * (counts - 1)).sum() / 2
+    return float(1 - same_pairs / (n * (n - 1) / 2) / length)
+
+
+def positional_entropy(pitches: np.ndarray, counts: np.ndarray = None) -> float:
+    """Mean Shannon entropy (bits) of the pitch distribution at each position"""
+    n, length = pitches.shape
+    if n == 0 or length == 0:
+        return 0.0
+    counts = pitch_counts(pitches) if counts is None else counts
+    probabilities = counts / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(probabilities > 0, probabilities * np.log2(probabilities), 0.0)
+    return max(0.0, float(-terms.sum(axis=1).mean()))
+
+
+def population_diversity(genome_datas) -> dict:
+    genome_datas = list(genome_datas)
+    pitches = pitch_matrix(genome_datas)
+    counts = pitch_counts(pitches)
+    return {
+        "genomes": int(pitches.shape[0]),
+        "mean_pairwise_distance": round(mean_pairwise_distance(pitches), 4),
+        "mean_hamming_distance": round(mean_hamming_distance(pitches, counts), 4),
+        "unique_ratio": round(len(set(genome_datas)) / len(genome_datas), 4) if genome_datas else 0.0,
+        "positional_entropy": round(positional_entropy(pitches, counts), 4),
+    }
+
+
+def mutation_scale(diversity: dict = None) -> float:
+    """
+    How much to scale mutation up for a population with this diversity:
+    target / mean Hamming distance when the population is below the target,
+    times 1 + the share of duplicate genomes, at most MUTATION_MAX_SCALE
+    """
+    if not diversity or diversity["genomes"] < 2:
+        return 1.0
+    scale = max(1.0, DIVERSITY_TARGET_HAMMING / max(diversity["mean_hamming_distance"], 1e-6))
+    scale *= 1 + (1 - diversity["unique_ratio"])
+    return min(scale, MUTATION_MAX_SCALE)
+
+
+def adaptive_mutation(diversity: dict = None) -> dict:
+    """Mutation rate (chance per child) and strength (share of notes) for breeding from this population"""
+    scale = mutation_scale(diversity)
+    return {
+        "mutation_rate": round(min(1.0, MUTATION_RATE * scale), 4),
+        "mutation_strength": round(min(0.5, MUTATION_STRENGTH * scale), 4),
+    }
+
+
+def has_converged(diversity: dict, generation: int) -> bool:
+    """Empty genomes aren't measured, so they can't make a diverse population look converged"""
+    return (
+        CONVERGENCE_DETECTION
+        and generation >= CONVERGENCE_MIN_GENERATION
+        and diversity["genomes"] >= 2
+        and diversity["mean_pairwise_distance"] < CONVERGENCE_PITCH_DISTANCE
+        and diversity["positional_entropy"] < CONVERGENCE_ENTROPY_BITS
+    )
+
+
+def record(db: Session, experiment: models.Experiment, diversity: dict, mutation: dict = None, births: int = None):
+    """Store a generation's diversity and the mutation bred from it (caller commits)"""
+    row = models.GenerationDiversity(
+        experiment_id=experiment.id,
+        generation=experiment.current_generation,
+        steady_state_births=births,
+        genomes=diversity["genomes"],
+        mutation_rate=mutation["mutation_rate"] if mutation else None,
+        mutation_strength=mutation["mutation_strength"] if mutation else None,
+        **{name: diversity[name] for name in METRICS}
+    )
+    db.add(row)
+    return row
+
+
+def latest_mutation(db: Session, experiment_id: int):
+    """The mutation settings last chosen for an experiment, or None"""
+    row = db.query(models.GenerationDiversity).filter(
+        models.GenerationDiversity.experiment_id == experiment_id,
+        models.GenerationDiversity.mutation_rate != None
+    ).order_by(models.GenerationDiversity.id.desc()).first()
+    if row is None:
+        return None
+    return {"mutation_rate": row.mutation_rate, "mutation_strength": row.mutation_strength}
+
+
+def history(db: Session, experiment_id: int):
+    """Every stored diversity measurement of an experiment, oldest first"""
+    rows = db.query(models.GenerationDiversity).filter(
+        models.GenerationDiversity.experiment_id == experiment_id
+    ).order_by(models.GenerationDiversity.id).all()
+    return [
+        {
+            "generation": row.generation,
+            "steady_state_births": row.steady_state_births,
+            "genomes": row.genomes,
+            **{name: getattr(row, name) for name in METRICS},
+            "mutation_rate": row.mutation_rate,
+            "mutation_strength": row.mutation_strength,
+            "computed_at": row.computed_at,
+        }
+        for row in rows
+    ]
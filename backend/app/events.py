@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Events buffered per connection before the oldest ones are dropped for a slow client
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 100))
+# Comment lines sent on idle streams so proxies don't close them
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", 15))
+
+EXPERIMENT_ADVANCED = "experiment_advanced"
+EXPERIMENT_COMPLETED = "experiment_completed"
+BEST_SCORE_CHANGED = "best_score_changed"
+GENOME_REPLACED = "genome_replaced"
+
+
+def format_sse(event_type: str, data: dict) -> str:
+    """Encode an event in the text/event-stream wire format"""
+    payload = json.dumps(data, default=str, separators=(",", ":"))
+    return f"event: {event_type}\ndata: {payload}\n\n"
+
+
+class EventBroker:
+    """
+    In-process pub/sub for experiment events.
+
+    Subscribers are asyncio queues living on the server's event loop. publish()
+    may be called from any thread (request threadpool, scheduler); the message
+    is encoded once and fanned out on the loop, so thousands of idle streams
+    cost one queue each and no extra work per event beyond an append.
+    """
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._loop = None
+        self._subscribers = set()
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def detach_loop(self):
+        self._loop = None
+        self._subscribers.clear()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a new stream; must be called on the event loop"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event_type: str, data: dict):
+        """Broadcast an event to every open stream. Safe to call from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return  # no server loop (scripts, CLI): nobody can be listening
+
+        message = format_sse(event_type, {**data, "timestamp": datetime.utcnow().isoformat()})
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop:
+            self._fan_out(message)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._fan_out, message)
+            except RuntimeError:
+                pass  # loop shut down in the meantime
+
+    def _fan_out(self, message: str):
+        for queue in list(self._subscribers):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block everyone else
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(message)
+
+    async def stream(self, queue: asyncio.Queue, is_disconnected=None):
+        """Yield encoded events for one subscriber, with heartbeats while idle"""
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if is_disconnected is not None and await is_disconnected():
+                        break
+                    message = ": keepalive\n\n"
+                yield message
+        finally:
+            self.unsubscribe(queue)
+
+
+broker = EventBroker()
+
+
+def publish(event_type: str, **data):
+    broker.publish(event_type, data)
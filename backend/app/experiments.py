@@ -2,44 +2,59 @@ from sqlalchemy.orm import Session
 import json
 import random
 from datetime import datetime
-from . import models, genomes
+from . import models, genomes, events, generation_state, similarity, rng_streams, operators, steady_state, advancement, diversity, surrogate
 from sqlalchemy import func
 
-def create_experiment(db: Session, name: str, description: str = None, max_generations: int = 1000):
-    """Create a new experiment with initial random genomes"""
+def create_experiment(db: Session, name: str, description: str = None, max_generations: int = 1000, rng_seed: int = None,
+                      selection_operator: str = operators.DEFAULT_SELECTION, crossover_operator: str = operators.DEFAULT_CROSSOVER,
+                      evolution_mode: str = steady_state.GENERATIONAL):
+    """
+    Create a new experiment with initial random genomes. All of its random
+    choices derive from rng_seed (a fresh one if not given), see rng_streams.
+    Parents are bred with the named operators (see operators.py), a whole
+    generation at a time or continuously (evolution_mode, see steady_state.py).
+    """
+    operators.get_selection(selection_operator)
+    operators.get_crossover(crossover_operator)
+    steady_state.check_mode(evolution_mode)
     # Create the experiment
     experiment = models.Experiment(
         name=name,
         description=description,
         current_generation=0,
-        max_generations=max_generations
+        max_generations=max_generations,
+        rng_seed=rng_seed if rng_seed is not None else rng_streams.new_seed(),
+        selection_operator=selection_operator,
+        crossover_operator=crossover_operator,
+        evolution_mode=evolution_mode
     )
     db.add(experiment)
     db.flush()  # To get the experiment ID
     
     # Create initial genomes for the experiment
     initial_genomes = []
-    for _ in range(genomes.INITIAL_GENOME_COUNT):
-        genome_data = genomes.create_random_genome()
+    population_seed = rng_streams.seed_sequence(experiment, 0, rng_streams.INITIAL_POPULATION)
+    for genome_data in genomes.create_random_genomes(genomes.INITIAL_GENOME_COUNT, seed=population_seed):
         genome = models.Genome(
             generation=0,
             data=genome_data,
             score=0.0
         )
         db.add(genome)
-        db.flush()  # To get the genome ID
-        
-        # Link genome to experiment
-        genome_experiment = models.GenomeExperiment(
+        initial_genomes.append(genome)
+    db.flush()  # To get the genome IDs
+    
+    # Link genomes to experiment
+    for genome in initial_genomes:
+        db.add(models.GenomeExperiment(
             genome_id=genome.id,
             experiment_id=experiment.id,
             generation=0
-        )
-        db.add(genome_experiment)
-        initial_genomes.append(genome)
+        ))
     
     db.commit()
     db.refresh(experiment)
+    similarity.index_genomes(initial_genomes)
     
     return experiment, initial_genomes
 
@@ -67,7 +82,8 @@ def get_all_experiments(db: Session, skip: int = 0, limit: int = 100):
             "completed": exp.completed,
             "final_piece_name": exp.final_piece_name,
             "created_at": exp.created_at,
-            "total_contributions": contributions or 0
+            # Archiving moves an experiment's mutations out of the hot tables
+            "total_contributions": (contributions or 0) + (exp.archived_contribution_count or 0)
         }
         result.append(exp_dict)
     
@@ -96,8 +112,18 @@ def get_experiment(db: Session, experiment_id: int):
         "best_score": experiment.best_score,
         "completed": experiment.completed,
         "final_piece_name": experiment.final_piece_name,
+        "rng_seed": experiment.rng_seed,
+        "selection_operator": experiment.selection_operator or operators.DEFAULT_SELECTION,
+        "crossover_operator": experiment.crossover_operator or operators.DEFAULT_CROSSOVER,
+        "evolution_mode": experiment.evolution_mode or steady_state.GENERATIONAL,
+        "advance_policy": advancement.policy(experiment),
+        "generation_contributions": experiment.generation_contributions or 0,
+        "advance_due_at": experiment.advance_due_at,
+        "dormant_since": experiment.dormant_since,
         "created_at": experiment.created_at,
-        "total_contributions": contributions or 0
+        "updated_at": experiment.updated_at or experiment.created_at,
+        # Archiving moves an experiment's mutations out of the hot tables
+        "total_contributions": (contributions or 0) + (experiment.archived_contribution_count or 0)
     }
 
 def get_random_genome_from_experiment(db: Session, experiment_id: int, generation: int = None):
@@ -106,7 +132,8 @@ def get_random_genome_from_experiment(db: Session, experiment_id: int, generatio
         models.GenomeExperiment,
         models.GenomeExperiment.genome_id == models.Genome.id
     ).filter(
-        models.GenomeExperiment.experiment_id == experiment_id
+        models.GenomeExperiment.experiment_id == experiment_id,
+        models.GenomeExperiment.replaced_at == None
     )
     
     # If generation is specified, filter by that generation
@@ -195,7 +222,8 @@ def advance_experiment_generation(db: Session, experiment_id: int):
             models.GenomeExperiment.genome_id == models.Genome.id
         ).filter(
             models.GenomeExperiment.experiment_id == experiment_id,
-            models.GenomeExperiment.generation == experiment.current_generation  # Add this filter
+            models.GenomeExperiment.generation == experiment.current_generation,  # Add this filter
+            models.GenomeExperiment.replaced_at == None  # steady-state genomes that were replaced
         ).all()
         
         # Calculate scored genomes (those actually scored by users)
@@ -207,63 +235,116 @@ def advance_experiment_generation(db: Session, experiment_id: int):
             print(f"No human-scored genomes in experiment {experiment_id} generation {experiment.current_generation}")
             return {"status": "pending", "message": "Waiting for at least one human contribution"}
         
+        # Unscored genomes compete on their predicted score, from the latest model
+        model = surrogate.ready_model(db, experiment)
+        unscored = [g for g in all_genomes if not g.user_scored]
+        if model is not None and unscored:
+            for genome, predicted in zip(unscored, model.predict(surrogate.features([g.data for g in unscored])).tolist()):
+                genome.predicted_score = predicted
+        
         # Get the highest scored genomes for crossover - sort all genomes by score
         # We can still use all genomes for selection, but require at least one human score to proceed
-        top_genomes = sorted(all_genomes, key=lambda g: g.score, reverse=True)[:genomes.TOP_GENOMES_TO_CROSSOVER]
+        # (ties broken by id, so a replay with the same seed picks the same parents)
+        top_genomes = sorted(all_genomes, key=lambda g: (-surrogate.selection_score(g), g.id))[:genomes.TOP_GENOMES_TO_CROSSOVER]
+        # The final piece and the best score only ever come from human scores
+        best_scored = min(scored_genomes, key=lambda g: (-(g.score or 0), g.id))
         
         if len(top_genomes) < 2:
             return {"status": "error", "message": "Not enough genomes for evolution"}
         
         next_gen = experiment.current_generation + 1
         
+        # Measured once per advance: stored, drives the mutation of the children,
+        # and a population of near-copies of one melody has nothing left to breed
+        population_diversity = diversity.population_diversity([g.data for g in all_genomes])
+        converged = diversity.has_converged(population_diversity, experiment.current_generation)
+        
         # Check if we've reached maximum generations
-        if next_gen >= experiment.max_generations:
+        if next_gen >= experiment.max_generations or converged:
+            diversity.record(db, experiment, population_diversity)
             # Complete the experiment
             experiment.completed = True
-            experiment.final_piece_name = f"{experiment.name} - Evolution Complete"
+            experiment.final_piece_name = f"{experiment.name} - Evolution {'Converged' if converged else 'Complete'}"
             
-            # Use the highest scored genome as the final piece
-            highest_scored = top_genomes[0]
+            # Use the highest human-scored genome as the final piece
+            highest_scored = best_scored
             experiment.final_genome_id = highest_scored.id
+            experiment.advance_due_at = None
             
             db.commit()
-            print(f"Experiment {experiment_id} completed with max generations reached. Final genome: {highest_scored.id}")
+            generation_state.registry.invalidate(experiment_id)
+            surrogate.registry.invalidate(experiment_id)
+            reason = "converged" if converged else "max_generations"
+            print(f"Experiment {experiment_id} completed ({reason}). Final genome: {highest_scored.id}")
+            
+            events.publish(
+                events.EXPERIMENT_COMPLETED,
+                experiment_id=experiment_id,
+                final_genome_id=highest_scored.id,
+                final_score=highest_scored.score,
+                reason=reason
+            )
             
             return {
                 "status": "completed", 
-                "message": "Experiment reached maximum generations and is now complete", 
+                "message": "Experiment population converged and is now complete" if converged
+                else "Experiment reached maximum generations and is now complete", 
+                "reason": reason,
                 "final_genome_id": highest_scored.id,
                 "final_score": highest_scored.score
             }
         
+        mutation = diversity.adaptive_mutation(population_diversity)
+        diversity.record(db, experiment, population_diversity, mutation)
+        mutated_genes = max(1, int(genomes.GENOME_LENGTH * mutation["mutation_strength"]))
+        
         new_genomes = []
+        # This generation's own streams, independent of other experiments and workers
+        rng = rng_streams.python_rng(experiment, next_gen, rng_streams.BREEDING)
+        selection_rng = rng_streams.numpy_rng(experiment, next_gen, rng_streams.SELECTION)
         
-        # Create offspring through crossover of top genomes
-        for _ in range(genomes.INITIAL_GENOME_COUNT):
-            # Select two different parents from top_genomes
-            parent1 = random.choice(top_genomes)
-            parent2_candidates = [g for g in top_genomes if g.id != parent1.id]
-            
-            if not parent2_candidates:
-                temp_genomes = [g for g in top_genomes if g.id != parent1.id]
-                if not temp_genomes:
-                    temp_genomes = all_genomes
-                parent2 = random.choice(temp_genomes)
-            else:
-                parent2 = random.choice(parent2_candidates)
-            
-            # Perform crossover
-            child_data = genomes.crossover(parent1, parent2)
-            
-            # Apply a small chance of mutation to the result (10% chance)
-            if random.random() < 0.1:
-                child_data = genomes.apply_mutation(child_data, num_genes=int(genomes.GENOME_LENGTH * 0.05))
+        # Select parents and cross them over in one batch, with the experiment's operators
+        # (genomes in score order, so operators that look at the top pick the same ones on replay).
+        # With a trained surrogate model, breed a larger pool and keep the most promising children.
+        population = sorted(all_genomes, key=lambda g: (-surrogate.selection_score(g), g.id))
+        pool_size = genomes.INITIAL_GENOME_COUNT * (surrogate.SURROGATE_POOL_FACTOR if model is not None else 1)
+        children, pairs = operators.breed(
+            [g.data for g in population],
+            [surrogate.selection_score(g) for g in population],
+            pool_size,
+            selection_rng,
+            selection=experiment.selection_operator,
+            crossover=experiment.crossover_operator
+        )
+        
+        candidates = []
+        for child_data, parent_indexes in zip(children, pairs.tolist()):
+            # Mutate some of the children (10% of them, 5% of their notes, more when diversity is low)
+            if rng.random() < mutation["mutation_rate"]:
+                child_data = genomes.apply_mutation(child_data, num_genes=mutated_genes, rng=rng)
+            candidates.append((child_data, parent_indexes, None))
+        
+        if model is not None:
+            predictions = model.predict(surrogate.features([data for data, _, _ in candidates]))
+            kept = surrogate.screen(
+                predictions,
+                [data for data, _, _ in candidates],
+                genomes.INITIAL_GENOME_COUNT,
+                rng_streams.numpy_rng(experiment, next_gen, rng_streams.SCREENING)
+            )
+            candidates = [(candidates[i][0], candidates[i][1], float(predictions[i])) for i in kept]
+            print(f"Surrogate model kept {len(candidates)} of {pool_size} children for experiment {experiment_id} "
+                  f"(predicted mean {sum(p for _, _, p in candidates) / len(candidates):.1f} vs {predictions.mean():.1f})")
+        
+        for child_data, (parent1_index, parent2_index), predicted_score in candidates:
+            parent1, parent2 = population[parent1_index], population[parent2_index]
             
-            # Create new genome
+            # Create new genome (competing on its predicted score until a human scores it)
             genome = models.Genome(
                 generation=next_gen,
                 data=child_data,
                 score=0.0,
+                predicted_score=predicted_score,
                 parent1_id=parent1.id,
                 parent2_id=parent2.id
             )
@@ -284,12 +365,29 @@ def advance_experiment_generation(db: Session, experiment_id: int):
         
         # Update experiment current generation
         experiment.current_generation = next_gen
+        advancement.start_generation(experiment)
         
         # Update best score if applicable
-        if top_genomes[0].score > experiment.best_score:
-            experiment.best_score = top_genomes[0].score
+        best_score_changed = best_scored.score > experiment.best_score
+        if best_score_changed:
+            experiment.best_score = best_scored.score
         
         db.commit()
+        generation_state.registry.invalidate(experiment_id)
+        similarity.index_genomes(new_genomes)
+        
+        events.publish(
+            events.EXPERIMENT_ADVANCED,
+            experiment_id=experiment_id,
+            generation=next_gen,
+            genome_count=len(new_genomes)
+        )
+        if best_score_changed:
+            events.publish(
+                events.BEST_SCORE_CHANGED,
+                experiment_id=experiment_id,
+                best_score=experiment.best_score
+            )
         
         print(f"Successfully advanced experiment {experiment_id} to generation {next_gen} with {len(new_genomes)} new genomes. Human contributions: {len(scored_genomes)}")
 
@@ -336,69 +434,65 @@ def diagnose_and_repair_experiments(db: Session):
     print("Running database diagnosis for experiments...")
     experiments_list = db.query(models.Experiment).filter(models.Experiment.completed == False).all()
     
+    # Count genomes per generation for every active experiment in a single grouped query
+    generation_counts = {}
+    rows = db.query(
+        models.GenomeExperiment.experiment_id,
+        models.GenomeExperiment.generation,
+        func.count(models.GenomeExperiment.id)
+    ).join(
+        models.Experiment,
+        models.Experiment.id == models.GenomeExperiment.experiment_id
+    ).filter(
+        models.Experiment.completed == False
+    ).group_by(
+        models.GenomeExperiment.experiment_id,
+        models.GenomeExperiment.generation
+    ).all()
+    for experiment_id, generation, count in rows:
+        generation_counts.setdefault(experiment_id, {})[generation] = count
+    
+    repaired = 0
     for exp in experiments_list:
-        print(f"\nDiagnosing Experiment {exp.id} ({exp.name}):")
-        print(f"  Current generation counter: {exp.current_generation}")
-        
-        # Find all generations that have genomes for this experiment
-        generations_with_genomes = db.query(models.GenomeExperiment.generation)\
-            .filter(models.GenomeExperiment.experiment_id == exp.id)\
-            .distinct()\
-            .order_by(models.GenomeExperiment.generation.desc())\
-            .all()
-        
-        generations = [g[0] for g in generations_with_genomes]
-        print(f"  Generations with genomes: {generations}")
-        
-        # Count genomes per generation
-        for gen in generations:
-            count = db.query(models.GenomeExperiment)\
-                .filter(
-                    models.GenomeExperiment.experiment_id == exp.id,
-                    models.GenomeExperiment.generation == gen
-                ).count()
-            print(f"  - Generation {gen}: {count} genomes")
+        counts = generation_counts.get(exp.id, {})
+        generations = sorted(counts, reverse=True)
         
         if not generations:
-            print(f"  ERROR: No genomes associated with experiment {exp.id}!")
+            print(f"  ERROR: No genomes associated with experiment {exp.id} ({exp.name})!")
             # Create initial genomes
             print(f"  Creating initial genomes for experiment {exp.id}")
             initial_genomes = []
-            for _ in range(genomes.INITIAL_GENOME_COUNT):
-                genome_data = genomes.create_random_genome()
+            population_seed = rng_streams.seed_sequence(exp, 0, rng_streams.INITIAL_POPULATION)
+            for genome_data in genomes.create_random_genomes(genomes.INITIAL_GENOME_COUNT, seed=population_seed):
                 genome = models.Genome(
                     generation=0,
                     data=genome_data,
                     score=0.0
                 )
                 db.add(genome)
-                db.flush()  # To get the genome ID
-                
-                # Link genome to experiment
-                genome_experiment = models.GenomeExperiment(
+                initial_genomes.append(genome)
+            db.flush()  # To get the genome IDs
+            
+            # Link genomes to experiment
+            for genome in initial_genomes:
+                db.add(models.GenomeExperiment(
                     genome_id=genome.id,
                     experiment_id=exp.id,
                     generation=0
-                )
-                db.add(genome_experiment)
-                initial_genomes.append(genome)
+                ))
             
             # Reset experiment counter
             exp.current_generation = 0
+            repaired += 1
             print(f"  Reset experiment {exp.id} to generation 0 with {len(initial_genomes)} new genomes")
         elif max(generations) < exp.current_generation:
             # If there's a mismatch between the highest generation with genomes and the experiment counter
             highest_gen = max(generations)
-            print(f"  Mismatch: Highest generation with genomes is {highest_gen}, but experiment counter is {exp.current_generation}")
+            print(f"  Mismatch in experiment {exp.id} ({exp.name}): highest generation with genomes is {highest_gen}, but experiment counter is {exp.current_generation}")
             
             # Get the latest generation with enough genomes
-            for gen in sorted(generations, reverse=True):
-                count = db.query(models.GenomeExperiment)\
-                    .filter(
-                        models.GenomeExperiment.experiment_id == exp.id,
-                        models.GenomeExperiment.generation == gen
-                    ).count()
-                if count >= 5:  # Minimum threshold for a valid generation
+            for gen in generations:
+                if counts[gen] >= 5:  # Minimum threshold for a valid generation
                     exp.current_generation = gen
                     print(f"  Reset experiment {exp.id} current_generation to {gen}")
                     break
@@ -406,6 +500,9 @@ def diagnose_and_repair_experiments(db: Session):
                 # If no generation has enough genomes, reset to 0
                 exp.current_generation = 0
                 print(f"  Reset experiment {exp.id} current_generation to 0")
+            repaired += 1
     
     db.commit()
-    print("\nDiagnosis and repair completed.")
\ No newline at end of file
+    if repaired:
+        generation_state.registry.clear()
+    print(f"Diagnosis and repair completed: checked {len(experiments_list)} experiments, repaired {repaired}.")
@@ -0,0 +1,451 @@
+"""
+Bulk export of an experiment's full history: every genome, its score and
+lineage, and every mutation users made to it.
+
+Rows are read through a streaming cursor (yield_per) in fixed-size batches,
+so memory stays flat no matter how many generations an experiment has.
+
+Formats:
+    ndjson  one JSON object per line: an "experiment" header, then one
+            "genome" line per genome with its notes and mutations embedded
+    arrow   Arrow IPC stream, one record batch per batch of genomes
+            (needs pyarrow)
+    npz     NumPy archive of flat columns; notes are stored CSR-style
+            (note_offsets[i]:note_offsets[i+1] are genome i's notes)
+
+Usage (from the backend directory):
+    python -m app.export EXPERIMENT_ID --format npz --output history.npz
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models, archive
+from .database import SessionLocal
+
+try:
+    import pyarrow as pa
+    from pyarrow import ipc
+except ImportError:  # optional dependency, the other formats work without it
+    pa = ipc = None
+
+# Load environment variables
+load_dotenv()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+FORMATS = ("ndjson", "arrow", "npz")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "npz": "application/octet-stream",
+}
+EXTENSIONS = {"ndjson": "ndjson", "arrow": "arrow", "npz": "npz"}
+# Best columnar format this install can produce
+COLUMNAR_FORMAT = "arrow" if pa is not None else "npz"
+
+
+class ExportFormatError(ValueError):
+    """The requested format is unknown or its optional dependency is missing"""
+
+
+def check_format(fmt: str) -> str:
+    if fmt == "columnar":
+        return COLUMNAR_FORMAT
+    if fmt not in FORMATS:
+        raise ExportFormatError(f"Unknown export format '{fmt}', expected one of: {', '.join(FORMATS)}")
+    if fmt == "arrow" and pa is None:
+        raise ExportFormatError("Arrow export needs pyarrow, which is not installed; use npz instead")
+    return fmt
+
+
+def _parse_notes(data):
+    try:
+        notes = json.loads(data) if data else []
+    except (TypeError, ValueError):
+        return []
+    return notes if isinstance(notes, list) else []
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def experiment_header(experiment: models.Experiment) -> dict:
+    return {
+        "type": "experiment",
+        "id": experiment.id,
+        "name": experiment.name,
+        "description": experiment.description,
+        "current_generation": experiment.current_generation,
+        "max_generations": experiment.max_generations,
+        "best_score": experiment.best_score,
+        "completed": bool(experiment.completed),
+        "final_piece_name": experiment.final_piece_name,
+        "final_genome_id": experiment.final_genome_id,
+        "created_at": _isoformat(experiment.created_at),
+    }
+
+
+def iter_genome_batches(db: Session, experiment_id: int, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Yield lists of genome records for an experiment, oldest generation first.
+
+    Genome rows come off a server-side cursor batch_size at a time; the
+    mutations of each batch are fetched with one IN query, so a batch is the
+    most that is ever held in memory. Archived experiments are read from the
+    archive one generation at a time instead.
+    """
+    experiment = db.get(models.Experiment, experiment_id)
+    if experiment is not None and experiment.archived_at:
+        yield from _iter_archived_batches(experiment_id)
+        return
+
+    rows = db.query(
+        models.Genome.id,
+        models.GenomeExperiment.generation,
+        models.Genome.score,
+        models.Genome.user_scored,
+        models.Genome.parent1_id,
+        models.Genome.parent2_id,
+        models.Genome.created_at,
+        func.coalesce(models.GenomePayload.data, models.Genome.legacy_data),
+    ).join(
+        models.GenomeExperiment,
+        models.GenomeExperiment.genome_id == models.Genome.id
+    ).outerjoin(
+        models.GenomePayload,
+        models.GenomePayload.hash == models.Genome.payload_hash
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment_id
+    ).order_by(
+        models.GenomeExperiment.generation, models.Genome.id
+    )
+    result = db.execute(rows.statement, execution_options={"yield_per": batch_size})
+
+    for partition in result.partitions():
+        records = {}
+        for genome_id, generation, score, user_scored, parent1_id, parent2_id, created_at, data in partition:
+            records[genome_id] = {
+                "id": genome_id,
+                "generation": generation,
+                "score": score,
+                "user_scored": bool(user_scored),
+                "parent1_id": parent1_id,
+                "parent2_id": parent2_id,
+                "created_at": created_at,
+                "notes": _parse_notes(data),
+                "mutations": [],
+            }
+
+        mutations = db.query(
+            models.Mutation.id,
+            models.Mutation.genome_id,
+            models.Mutation.user_id,
+            models.Mutation.score,
+            models.Mutation.created_at,
+            models.Mutation.mutation_data,
+        ).filter(
+            models.Mutation.genome_id.in_(list(records))
+        ).order_by(models.Mutation.id)
+        for mutation_id, genome_id, user_id, score, created_at, mutation_data in mutations:
+            records[genome_id]["mutations"].append({
+                "id": mutation_id,
+                "user_id": user_id,
+                "score": score,
+                "created_at": created_at,
+                "notes": _parse_notes(mutation_data),
+            })
+
+        yield list(records.values())
+
+
+def _iter_archived_batches(experiment_id: int):
+    for _, records in archive.store.iter_generations(experiment_id):
+        yield [
+            {
+                "id": record.id,
+                "generation": record.generation,
+                "score": record.score,
+                "user_scored": bool(record.user_scored),
+                "parent1_id": record.parent1_id,
+                "parent2_id": record.parent2_id,
+                "created_at": record.created_at,
+                "notes": _parse_notes(record.data),
+                "mutations": [
+                    {
+                        "id": mutation["id"],
+                        "user_id": mutation["user_id"],
+                        "score": mutation["score"],
+                        "created_at": mutation["created_at"],
+                        "notes": _parse_notes(mutation["mutation_data"]),
+                    }
+                    for mutation in record.mutations
+                ],
+            }
+            for record in records
+        ]
+
+
+def iter_ndjson(db: Session, experiment: models.Experiment, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield the export as NDJSON, one encoded chunk per batch"""
+    yield json.dumps(experiment_header(experiment)) + "\n"
+    for batch in iter_genome_batches(db, experiment.id, batch_size):
+        lines = []
+        for record in batch:
+            record["created_at"] = _isoformat(record["created_at"])
+            for mutation in record["mutations"]:
+                mutation["created_at"] = _isoformat(mutation["created_at"])
+            lines.append(json.dumps({"type": "genome", **record}, separators=(",", ":")))
+        yield "\n".join(lines) + "\n"
+
+
+def _arrow_schema():
+    note = pa.struct([
+        ("pitch", pa.int16()),
+        ("duration", pa.float32()),
+        ("velocity", pa.int16()),
+    ])
+    return pa.schema([
+        ("id", pa.int64()),
+        ("generation", pa.int32()),
+        ("score", pa.float64()),
+        ("user_scored", pa.bool_()),
+        ("parent1_id", pa.int64()),
+        ("parent2_id", pa.int64()),
+        ("created_at", pa.timestamp("us")),
+        ("notes", pa.list_(note)),
+        ("mutations", pa.list_(pa.struct([
+            ("id", pa.int64()),
+            ("user_id", pa.int64()),
+            ("score", pa.float64()),
+            ("created_at", pa.timestamp("us")),
+            ("notes", pa.list_(note)),
+        ]))),
+    ], metadata={"format": "tunebreeder-experiment-export"})
+
+
+class _ChunkSink:
+    """File-like object that hands written bytes back out in chunks"""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_arrow(db: Session, experiment: models.Experiment, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield the export as an Arrow IPC stream, one record batch per batch of genomes"""
+    check_format("arrow")
+    schema = _arrow_schema().with_metadata({
+        "format": "tunebreeder-experiment-export",
+        "experiment": json.dumps(experiment_header(experiment)),
+    })
+    sink = _ChunkSink()
+    writer = ipc.new_stream(sink, schema)
+    yield sink.drain()
+    for batch in iter_genome_batches(db, experiment.id, batch_size):
+        writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+class _ColumnSpool:
+    """Appends one column to a raw temp file so its length needn't be known up front"""
+
+    def __init__(self, directory: str, name: str, dtype):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.path = os.path.join(directory, f"{name}.bin")
+        self.file = open(self.path, "wb")
+        self.length = 0
+
+    def append(self, values):
+        array = np.asarray(values, dtype=self.dtype)
+        array.tofile(self.file)
+        self.length += len(array)
+
+    def write_npy(self, archive: zipfile.ZipFile):
+        """Copy the spooled column into the archive as NAME.npy"""
+        self.file.close()
+        header = {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (self.length,),
+        }
+        with archive.open(f"{self.name}.npy", "w", force_zip64=True) as member:
+            np.lib.format.write_array_header_1_0(member, header)
+            with open(self.path, "rb") as raw:
+                shutil.copyfileobj(raw, member)
+
+
+NPZ_COLUMNS = {
+    "genome_id": np.int64,
+    "generation": np.int32,
+    "score": np.float64,
+    "user_scored": np.bool_,
+    "parent1_id": np.int64,  # -1 when the genome has no such parent
+    "parent2_id": np.int64,
+    "created_at": "datetime64[us]",
+    "note_offsets": np.int64,
+    "note_pitch": np.int16,
+    "note_duration": np.float32,
+    "note_velocity": np.int16,
+    "mutation_id": np.int64,
+    "mutation_genome_id": np.int64,
+    "mutation_user_id": np.int64,
+    "mutation_score": np.float64,
+    "mutation_created_at": "datetime64[us]",
+}
+
+
+def write_npz(db: Session, experiment: models.Experiment, path: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Write the export as a NumPy .npz archive of flat columns.
+
+    Each column is spooled to its own temp file batch by batch and then
+    copied into the archive, so the arrays are never assembled in memory.
+    Mutation note payloads are left out; use ndjson or arrow for those.
+    """
+    with tempfile.TemporaryDirectory(prefix="tunebreeder_export_") as spool_dir:
+        columns = {name: _ColumnSpool(spool_dir, name, dtype) for name, dtype in NPZ_COLUMNS.items()}
+        try:
+            columns["note_offsets"].append([0])
+            note_count = 0
+            for batch in iter_genome_batches(db, experiment.id, batch_size):
+                columns["genome_id"].append([r["id"] for r in batch])
+                columns["generation"].append([r["generation"] or 0 for r in batch])
+                columns["score"].append([r["score"] if r["score"] is not None else np.nan for r in batch])
+                columns["user_scored"].append([r["user_scored"] for r in batch])
+                columns["parent1_id"].append([r["parent1_id"] or -1 for r in batch])
+                columns["parent2_id"].append([r["parent2_id"] or -1 for r in batch])
+                columns["created_at"].append([r["created_at"] for r in batch])
+
+                offsets, pitches, durations, velocities = [], [], [], []
+                for record in batch:
+                    for note in record["notes"]:
+                        pitches.append(note.get("pitch", 0))
+                        durations.append(note.get("duration", 0))
+                        velocities.append(note.get("velocity", 0))
+                    note_count += len(record["notes"])
+                    offsets.append(note_count)
+                columns["note_offsets"].append(offsets)
+                columns["note_pitch"].append(pitches)
+                columns["note_duration"].append(durations)
+                columns["note_velocity"].append(velocities)
+
+                mutations = [(r["id"], m) for r in batch for m in r["mutations"]]
+                columns["mutation_id"].append([m["id"] for _, m in mutations])
+                columns["mutation_genome_id"].append([genome_id for genome_id, _ in mutations])
+                columns["mutation_user_id"].append([m["user_id"] or -1 for _, m in mutations])
+                columns["mutation_score"].append(
+                    [m["score"] if m["score"] is not None else np.nan for _, m in mutations]
+                )
+                columns["mutation_created_at"].append([m["created_at"] for _, m in mutations])
+
+            with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("experiment.json", json.dumps(experiment_header(experiment)))
+                for column in columns.values():
+                    column.write_npy(archive)
+        finally:
+            for column in columns.values():
+                column.file.close()
+
+
+def iter_file_chunks(path: str, chunk_size: int = 1024 * 1024, remove: bool = True):
+    """Stream a file in chunks, deleting it afterwards"""
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+    finally:
+        if remove:
+            os.remove(path)
+
+
+def stream_export(experiment_id: int, fmt: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Yield an ndjson or arrow export from its own session.
+
+    Used for HTTP responses: the request's session is closed before a
+    streamed body is sent, so the generator can't borrow it.
+    """
+    db = SessionLocal()
+    try:
+        experiment = db.get(models.Experiment, experiment_id)
+        if fmt == "ndjson":
+            for chunk in iter_ndjson(db, experiment, batch_size):
+                yield chunk.encode("utf-8")
+        else:
+            yield from iter_arrow(db, experiment, batch_size)
+    finally:
+        db.close()
+
+
+def export_experiment(db: Session, experiment: models.Experiment, fmt: str, output, batch_size: int = EXPORT_BATCH_SIZE):
+    """Write an experiment export to a path (npz) or binary file object (ndjson, arrow)"""
+    fmt = check_format(fmt)
+    if fmt == "npz":
+        write_npz(db, experiment, output, batch_size)
+        return
+    with open(output, "wb") as f:
+        if fmt == "ndjson":
+            for chunk in iter_ndjson(db, experiment, batch_size):
+                f.write(chunk.encode("utf-8"))
+        else:
+            for chunk in iter_arrow(db, experiment, batch_size):
+                f.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an experiment's full evolutionary history")
+    parser.add_argument("experiment_id", type=int)
+    parser.add_argument("--format", default="ndjson", help=f"{', '.join(FORMATS)} or columnar (best available)")
+    parser.add_argument("--output", help="output file (default: experiment_<id>.<format>)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        fmt = check_format(args.format)
+    except ExportFormatError as e:
+        parser.error(str(e))
+    output = args.output or f"experiment_{args.experiment_id}.{EXTENSIONS[fmt]}"
+
+    db = SessionLocal()
+    try:
+        experiment = db.get(models.Experiment, args.experiment_id)
+        if not experiment:
+            print(f"Experiment {args.experiment_id} not found", file=sys.stderr)
+            sys.exit(1)
+        export_experiment(db, experiment, fmt, output, args.batch_size)
+    finally:
+        db.close()
+    print(f"Exported experiment {args.experiment_id} ({fmt}) to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from . import models, hibernation
+
+# Load environment variables
+load_dotenv()
+
+# How long a handed-out genome stays reserved for the user it was assigned to
+ASSIGNMENT_LEASE_SECONDS = int(os.getenv("ASSIGNMENT_LEASE_SECONDS", 300))
+
+
+class GenerationState:
+    """
+    In-memory view of an experiment's current generation: which genomes it
+    holds, which of them humans have scored and which users have already
+    contributed. Loaded once per generation and then kept up to date by the
+    mutation path, so the hot user flow doesn't have to re-query it.
+    """
+
+    def __init__(self, experiment: models.Experiment, genome_ids, scored_ids, contributors):
+        self.experiment_id = experiment.id
+        self.experiment_name = experiment.name
+        self.generation = experiment.current_generation
+        self.completed = bool(experiment.completed)
+        # Steady-state populations never advance, so a contribution doesn't lock a user out
+        self.steady_state = experiment.evolution_mode == "steady_state"
+        self.genome_ids = list(genome_ids)
+        self.scored_ids = set(scored_ids)
+        self.contributors = set(contributors)
+        self.loaded_at = datetime.utcnow()
+        self.lock = threading.Lock()
+        # Assignment bookkeeping: how often each genome was handed out, and
+        # which users currently hold it (genome_id -> {user_id: lease expiry})
+        self.assignment_counts = {genome_id: 0 for genome_id in self.genome_ids}
+        self.leases = {}
+
+    def has_contributed(self, user_id: int) -> bool:
+        return not self.steady_state and user_id in self.contributors
+
+    def record_contribution(self, user_id: int, genome_id: int):
+        with self.lock:
+            self.contributors.add(user_id)
+            self.scored_ids.add(genome_id)
+            holders = self.leases.get(genome_id)
+            if holders is not None:
+                holders.pop(user_id, None)
+                if not holders:
+                    del self.leases[genome_id]
+
+    def replace_genome(self, old_genome_id: int, new_genome_id: int):
+        """A steady-state child took old_genome_id's place in the population"""
+        with self.lock:
+            if old_genome_id in self.genome_ids:
+                self.genome_ids.remove(old_genome_id)
+            self.scored_ids.discard(old_genome_id)
+            self.leases.pop(old_genome_id, None)
+            self.assignment_counts.pop(old_genome_id, None)
+            self.genome_ids.append(new_genome_id)
+            self.assignment_counts[new_genome_id] = 0
+
+    def _expire_leases(self, now: float):
+        for genome_id in list(self.leases):
+            holders = self.leases[genome_id]
+            for user_id, expires_at in list(holders.items()):
+                if expires_at <= now:
+                    del holders[user_id]
+            if not holders:
+                del self.leases[genome_id]
+
+    def outstanding_work(self) -> int:
+        """Unscored genomes that nobody currently holds a lease on"""
+        with self.lock:
+            self._expire_leases(time.time())
+            return sum(
+                1 for genome_id in self.genome_ids
+                if genome_id not in self.scored_ids and genome_id not in self.leases
+            )
+
+    def leased_genome(self, user_id: int):
+        """The genome currently leased to this user, if any"""
+        now = time.time()
+        with self.lock:
+            for genome_id, holders in self.leases.items():
+                if holders.get(user_id, 0) > now:
+                    return genome_id
+        return None
+
+    def assign_genome(self, user_id: int):
+        """
+        Pick the genome this user should score next and lease it to them.
+        
+        Prefers unscored genomes, and among those the ones with the fewest
+        live leases and fewest past assignments, so a generation gets covered
+        as fast as users come in instead of by random collisions. A user
+        asking again while their lease is live gets the same genome back.
+        """
+        if not self.genome_ids:
+            return None
+
+        with self.lock:
+            return self._assign_locked(user_id, time.time())
+
+    def claim(self, user_id: int):
+        """
+        Atomically check whether the user may still contribute and, if so,
+        assign them a genome (see assign_genome). Returns (has_contributed,
+        genome_id). A user who already contributed gets a genome to look at
+        but no lease, so they don't hold back anyone else's work.
+        """
+        with self.lock:
+            if self.has_contributed(user_id):
+                return True, random.choice(self.genome_ids) if self.genome_ids else None
+            if not self.genome_ids:
+                return False, None
+            return False, self._assign_locked(user_id, time.time())
+
+    def _assign_locked(self, user_id: int, now: float):
+        """assign_genome's work; the caller holds self.lock"""
+        self._expire_leases(now)
+
+        for genome_id, holders in self.leases.items():
+            if user_id in holders:
+                holders[user_id] = now + ASSIGNMENT_LEASE_SECONDS
+                return genome_id
+
+        candidates = [g for g in self.genome_ids if g not in self.scored_ids] or self.genome_ids
+
+        def load(genome_id):
+            return (len(self.leases.get(genome_id, ())), self.assignment_counts.get(genome_id, 0))
+
+        lowest = min(load(genome_id) for genome_id in candidates)
+        genome_id = random.choice([g for g in candidates if load(g) == lowest])
+
+        self.leases.setdefault(genome_id, {})[user_id] = now + ASSIGNMENT_LEASE_SECONDS
+        self.assignment_counts[genome_id] = self.assignment_counts.get(genome_id, 0) + 1
+        return genome_id
+
+
+def load_generation_state(db: Session, experiment: models.Experiment) -> GenerationState:
+    rows = db.query(models.Genome.id, models.Genome.user_scored).join(
+        models.GenomeExperiment,
+        models.GenomeExperiment.genome_id == models.Genome.id
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment.id,
+        models.GenomeExperiment.generation == experiment.current_generation,
+        models.GenomeExperiment.replaced_at == None
+    ).all()
+
+    contributors = db.query(models.Mutation.user_id).join(
+        models.GenomeExperiment,
+        models.Mutation.genome_id == models.GenomeExperiment.genome_id
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment.id,
+        models.GenomeExperiment.generation == experiment.current_generation
+    ).distinct().all()
+
+    return GenerationState(
+        experiment,
+        genome_ids=[genome_id for genome_id, _ in rows],
+        scored_ids=[genome_id for genome_id, user_scored in rows if user_scored],
+        contributors=[user_id for (user_id,) in contributors],
+    )
+
+
+class GenerationStateRegistry:
+    """Process-wide cache of GenerationState, one entry per experiment"""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, experiment_id: int):
+        """
+        Return the current generation state, loading it on first use. None if
+        the experiment doesn't exist. Loading a dormant experiment wakes it;
+        the wake-up is flushed, and committing it is up to the caller.
+        """
+        state = self._states.get(experiment_id)
+        if state is not None:
+            return state
+
+        experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+        if not experiment:
+            return None
+        if experiment.dormant_since is not None:
+            # Someone is asking for its genomes again
+            hibernation.touch(experiment)
+            db.flush()
+        state = load_generation_state(db, experiment)
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep the first one
+            return self._states.setdefault(experiment_id, state)
+
+    def peek(self, experiment_id: int):
+        """Return the cached state without loading it"""
+        return self._states.get(experiment_id)
+
+    def record_contribution(self, experiment_id: int, generation: int, user_id: int, genome_id: int):
+        state = self._states.get(experiment_id)
+        if state is not None and state.generation == generation:
+            state.record_contribution(user_id, genome_id)
+
+    def replace_genome(self, experiment_id: int, generation: int, old_genome_id: int, new_genome_id: int):
+        state = self._states.get(experiment_id)
+        if state is not None and state.generation == generation:
+            state.replace_genome(old_genome_id, new_genome_id)
+
+    def invalidate(self, experiment_id: int):
+        """Forget an experiment's state, e.g. after its generation was advanced"""
+        with self._lock:
+            self._states.pop(experiment_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+
+registry = GenerationStateRegistry()
@@ -2,8 +2,9 @@ from sqlalchemy.orm import Session
 import json
 import random
 import os
+import numpy as np
 from dotenv import load_dotenv
-from . import models
+from . import models, archive, payloads, score_cache
 
 # Load environment variables
 load_dotenv()
@@ -13,24 +14,55 @@ INITIAL_GENOME_COUNT = int(os.getenv("INITIAL_GENOME_COUNT", 10))
 TOP_GENOMES_TO_CROSSOVER = int(os.getenv("TOP_GENOMES_TO_CROSSOVER", 20))
 GENES_TO_MUTATE = int(os.getenv("GENES_TO_MUTATE", 1))
 
+# Bump whenever heuristic_score changes, so cached scores are recomputed
+HEURISTIC_SCORER_VERSION = 1
+HEURISTIC_COMPONENTS = ("pitch", "rhythm", "contour", "phrase", "interval")
+
+def genome_content_hash(genome_data: str):
+    """
+    Content hash of a genome's notes, independent of JSON formatting, so
+    identical melodies share derived artifacts (renders, scores)
+    """
+    return payloads.content_hash(genome_data)
+
+# Common musical scales (C major, A minor, etc) random genomes are drawn from
+SCALES = {
+    'c_major': [36, 38, 40, 41, 43, 45, 47, 48, 50, 52, 53, 55, 57, 59, 60, 62, 64, 65, 67, 69, 71, 72, 74, 76, 77, 79, 81, 83, 84],
+    'a_minor': [33, 35, 36, 38, 40, 41, 43, 45, 47, 48, 50, 52, 53, 55, 57, 59, 60, 62, 64, 65, 67, 69, 71, 72, 74, 76, 77, 79, 81],
+    'g_major': [31, 33, 35, 36, 38, 40, 42, 43, 45, 47, 48, 50, 52, 54, 55, 57, 59, 60, 62, 64, 66, 67, 69, 71, 72, 74, 76, 78, 79],
+    'pentatonic': [36, 38, 43, 45, 47, 48, 50, 55, 57, 59, 60, 62, 67, 69, 71, 72, 74, 79, 81, 83, 84]
+}
+# Common note durations in 4/4 time (quarter = 1), weighted toward common values
+NOTE_DURATIONS = [0.25, 0.5, 0.5, 0.5, 0.5, 0.75, 1, 1, 1, 1.5, 2]
+# The last note of a phrase prefers longer durations
+PHRASE_END_DURATIONS = [0.5, 1, 1, 1.5, 2]
+PHRASE_LENGTH = 16  # 4 measures of quarter notes
+# Root notes a melody may end on; scales not listed use the G roots
+SCALE_ROOTS = {
+    'c_major': [36, 48, 60, 72, 84],
+    'a_minor': [33, 45, 57, 69, 81],
+}
+DEFAULT_ROOTS = [31, 43, 55, 67, 79]
+PATTERN_TYPES = ['ascending', 'descending', 'arpeggios', 'stable', 'wave']
+# Scale-index steps and their weights for each phrase pattern ('wave' alternates up and down)
+PATTERN_STEPS = {
+    'ascending': ([-1, 0, 1, 2], [1, 3, 5, 1]),
+    'descending': ([-2, -1, 0, 1], [1, 5, 3, 1]),
+    'arpeggios': ([-4, -2, 0, 2, 4], [1, 1, 1, 1, 1]),
+    'stable': ([-1, 0, 0, 0, 1], [1, 3, 3, 3, 1]),
+}
+
 def create_random_genome():
     """Create a random musical genome with more realistic musical properties"""
-    # Define common musical scales (C major, A minor, etc)
-    scales = {
-        'c_major': [36, 38, 40, 41, 43, 45, 47, 48, 50, 52, 53, 55, 57, 59, 60, 62, 64, 65, 67, 69, 71, 72, 74, 76, 77, 79, 81, 83, 84],
-        'a_minor': [33, 35, 36, 38, 40, 41, 43, 45, 47, 48, 50, 52, 53, 55, 57, 59, 60, 62, 64, 65, 67, 69, 71, 72, 74, 76, 77, 79, 81],
-        'g_major': [31, 33, 35, 36, 38, 40, 42, 43, 45, 47, 48, 50, 52, 54, 55, 57, 59, 60, 62, 64, 66, 67, 69, 71, 72, 74, 76, 78, 79],
-        'pentatonic': [36, 38, 43, 45, 47, 48, 50, 55, 57, 59, 60, 62, 67, 69, 71, 72, 74, 79, 81, 83, 84]
-    }
-    
     # Choose a random scale
-    chosen_scale = random.choice(list(scales.values()))
+    scale_name = random.choice(list(SCALES))
+    chosen_scale = SCALES[scale_name]
     
     # Common note durations in 4/4 time (quarter = 1)
-    durations = [0.25, 0.5, 0.5, 0.5, 0.5, 0.75, 1, 1, 1, 1.5, 2]  # Weighted toward common values
+    durations = NOTE_DURATIONS
     
     # Segment the melody into phrases (typically 4 measures in 4/4 time)
-    phrase_length = 16  # 4 measures of quarter notes
+    phrase_length = PHRASE_LENGTH
     num_phrases = GENOME_LENGTH // phrase_length
     remainder = GENOME_LENGTH % phrase_length
     
@@ -40,7 +72,7 @@ def create_random_genome():
     # Create each phrase with some musical coherence
     for phrase in range(num_phrases + (1 if remainder > 0 else 0)):
         # For each phrase, decide a melodic pattern
-        pattern_type = random.choice(['ascending', 'descending', 'arpeggios', 'stable', 'wave'])
+        pattern_type = random.choice(PATTERN_TYPES)
         
         # Start with velocity in a reasonable range
         current_velocity = random.randint(70, 85)
@@ -50,22 +82,13 @@ def create_random_genome():
         
         # Create notes for this phrase
         for i in range(current_phrase_length):
-            # Adjust pitch based on pattern
-            if pattern_type == 'ascending':
-                # Generally trending upward
-                step = random.choices([-1, 0, 1, 2], weights=[1, 3, 5, 1])[0]
-            elif pattern_type == 'descending':
-                # Generally trending downward
-                step = random.choices([-2, -1, 0, 1], weights=[1, 5, 3, 1])[0]
-            elif pattern_type == 'arpeggios':
-                # Bigger jumps (arpeggios)
-                step = random.choice([-4, -2, 0, 2, 4])
-            elif pattern_type == 'stable':
-                # Mostly staying in place
-                step = random.choices([-1, 0, 0, 0, 1], weights=[1, 3, 3, 3, 1])[0]
-            else:  # 'wave'
+            # Adjust pitch based on pattern (trending up or down, arpeggio jumps, mostly in place)
+            if pattern_type == 'wave':
                 # Alternating up and down
                 step = 1 if i % 2 == 0 else -1
+            else:
+                steps, weights = PATTERN_STEPS[pattern_type]
+                step = random.choices(steps, weights=weights)[0]
             
             # Adjust the pitch index but keep within scale bounds
             current_pitch_index = max(0, min(len(chosen_scale) - 1, current_pitch_index + step))
@@ -85,7 +108,7 @@ def create_random_genome():
             
             # For the final note of each phrase, prefer longer durations
             if i == current_phrase_length - 1:
-                duration = random.choice([0.5, 1, 1, 1.5, 2])  # Weight toward longer notes
+                duration = random.choice(PHRASE_END_DURATIONS)  # Weight toward longer notes
             else:
                 duration = random.choice(durations)
                 
@@ -102,21 +125,119 @@ def create_random_genome():
                 genome[-1]["duration"] = 2  # End with a longer note
                 # Try to end on a root note (C, A, G depending on scale)
                 if random.random() < 0.7:  # 70% chance
-                    root_candidates = [36, 48, 60, 72, 84] if chosen_scale == scales['c_major'] else \
-                                     [33, 45, 57, 69, 81] if chosen_scale == scales['a_minor'] else \
-                                     [31, 43, 55, 67, 79]  # G major
+                    root_candidates = SCALE_ROOTS.get(scale_name, DEFAULT_ROOTS)
                     # Find closest root note
                     closest_root = min(root_candidates, key=lambda x: abs(x - pitch))
                     genome[-1]["pitch"] = closest_root
     
     return json.dumps(genome)
 
+def create_random_population(count: int, length: int = GENOME_LENGTH, seed=None):
+    """
+    Vectorized create_random_genome for a whole population at once.
+    
+    Draws from the same scales, phrase patterns, duration weights and phrase
+    endings as create_random_genome, but walks the scale indexes of every
+    genome in parallel with NumPy, one note position at a time. seed is
+    anything np.random.default_rng accepts (an int, a SeedSequence or a
+    Generator), so a population can be reproduced exactly.
+    
+    Returns (pitches, durations, velocities), each of shape (count, length).
+    """
+    rng = np.random.default_rng(seed)
+    scale_names = list(SCALES)
+    scale_sizes = np.array([len(SCALES[name]) for name in scale_names])
+    scale_table = np.zeros((len(scale_names), scale_sizes.max()), dtype=np.int64)
+    for i, name in enumerate(scale_names):
+        scale_table[i, :scale_sizes[i]] = SCALES[name]
+    root_table = np.array([SCALE_ROOTS.get(name, DEFAULT_ROOTS) for name in scale_names])
+    
+    # Phrase layout, shared by every genome: full phrases plus a shorter last one
+    num_phrases, remainder = divmod(length, PHRASE_LENGTH)
+    positions = np.arange(length)
+    phrase_of = positions // PHRASE_LENGTH
+    offset = positions % PHRASE_LENGTH
+    phrase_size = np.where(phrase_of < num_phrases, PHRASE_LENGTH, remainder)
+    
+    scale_ids = rng.integers(len(scale_names), size=count)
+    sizes = scale_sizes[scale_ids]
+    # Arrays below are (length, count): each note position is a contiguous row
+    patterns = rng.integers(len(PATTERN_TYPES), size=(num_phrases + (1 if remainder else 0), count))[phrase_of]
+    
+    # Scale-index step of every note, drawn from its phrase's pattern: each
+    # pattern's weighted steps are spread over a row of equally likely slots
+    slots = int(np.lcm.reduce([sum(weights) for _, weights in PATTERN_STEPS.values()]))
+    step_table = np.zeros((len(PATTERN_TYPES), slots), dtype=np.int64)
+    for pattern, (values, weights) in PATTERN_STEPS.items():
+        step_table[PATTERN_TYPES.index(pattern)] = np.repeat(values, np.asarray(weights) * slots // sum(weights))
+    steps = step_table[patterns, rng.integers(slots, size=(length, count))]
+    wave = np.where(offset % 2 == 0, 1, -1)[:, None]
+    steps = np.where(patterns == PATTERN_TYPES.index('wave'), wave, steps)
+    
+    # Velocity: stronger at phrase beginnings, softer at phrase endings
+    low = np.where(offset == 0, 0, np.where(offset >= phrase_size - 2, -5, -2))
+    high = np.where(offset == 0, 5, np.where(offset >= phrase_size - 2, -1, 2))
+    velocity_changes = rng.integers(low[:, None], high[:, None] + 1, size=(length, count))
+    phrase_velocities = rng.integers(70, 86, size=(num_phrases + 1, count))
+    
+    # Clamped walks can't be a plain cumsum, so step all genomes together note by note
+    pitch_index = np.empty((length, count), dtype=np.int64)
+    velocities = np.empty((length, count), dtype=np.int64)
+    index = rng.integers(0, sizes - 9)  # start in a reasonable range
+    top = sizes - 1
+    velocity = np.zeros(count, dtype=np.int64)
+    for i in range(length):
+        index = np.minimum(np.maximum(index + steps[i], 0, out=index), top, out=index)
+        pitch_index[i] = index
+        if offset[i] == 0:
+            velocity = phrase_velocities[phrase_of[i]].copy()
+        velocity += velocity_changes[i]
+        np.minimum(np.maximum(velocity, 60, out=velocity), 95, out=velocity)
+        velocities[i] = velocity
+    pitches = scale_table[scale_ids, pitch_index].T
+    velocities = velocities.T
+    
+    durations = np.asarray(NOTE_DURATIONS, dtype=np.float64)[rng.integers(len(NOTE_DURATIONS), size=(count, length))]
+    phrase_ends = offset == phrase_size - 1
+    durations[:, phrase_ends] = np.asarray(PHRASE_END_DURATIONS, dtype=np.float64)[
+        rng.integers(len(PHRASE_END_DURATIONS), size=(count, int(phrase_ends.sum())))
+    ]
+    
+    # Like create_random_genome, only a trailing partial phrase gets the special final note
+    if remainder and length:
+        durations[:, -1] = 2
+        roots = root_table[scale_ids]
+        closest_root = roots[np.arange(count), np.abs(roots - pitches[:, -1:]).argmin(axis=1)]
+        pitches[:, -1] = np.where(rng.random(count) < 0.7, closest_root, pitches[:, -1])
+    
+    return pitches, durations, velocities
+
+def population_to_json(pitches, durations, velocities):
+    """Serialize (count, length) pitch, duration and velocity arrays into genome JSON strings"""
+    # Same text json.dumps would produce for create_random_genome's notes (1, not 1.0)
+    duration_text = {value: json.dumps(value) for value in NOTE_DURATIONS + PHRASE_END_DURATIONS}
+    for value in np.unique(durations).tolist():
+        if value not in duration_text:
+            duration_text[value] = json.dumps(int(value) if value.is_integer() else value)
+    return [
+        "[" + ", ".join(
+            f'{{"pitch": {pitch}, "duration": {duration_text[duration]}, "velocity": {velocity}}}'
+            for pitch, duration, velocity in zip(genome_pitches, genome_durations, genome_velocities)
+        ) + "]"
+        for genome_pitches, genome_durations, genome_velocities in zip(
+            pitches.tolist(), durations.tolist(), velocities.tolist()
+        )
+    ]
+
+def create_random_genomes(count: int, seed=None):
+    """count random genomes as JSON strings, generated in one vectorized batch"""
+    return population_to_json(*create_random_population(count, seed=seed))
+
 
 def initialize_genomes(db: Session):
     """Create initial random genomes for the first generation"""
     new_genomes = []
-    for _ in range(INITIAL_GENOME_COUNT):
-        genome_data = create_random_genome()
+    for genome_data in create_random_genomes(INITIAL_GENOME_COUNT):
         genome = models.Genome(
             generation=0,
             data=genome_data,
@@ -153,8 +274,12 @@ def crossover(parent1: models.Genome, parent2: models.Genome):
 
 # Update the create_next_generation function with a more conservative mutation approach
 
-def create_next_generation(db: Session, current_generation: int):
-    """Create the next generation of genomes through crossover with very conservative mutations"""
+def create_next_generation(db: Session, current_generation: int, rng=random, gene_mutation_rate: float = 0.001):
+    """
+    Create the next generation of genomes through crossover with very conservative mutations.
+    rng is the random.Random to draw from (see rng_streams); the global one by default.
+    gene_mutation_rate is the chance that each note is mutated.
+    """
     top_genomes = get_top_genomes(db, current_generation)
     
     if len(top_genomes) < 2:
@@ -167,45 +292,44 @@ def create_next_generation(db: Session, current_generation: int):
     # Create offspring through crossover of top genomes
     for i in range(INITIAL_GENOME_COUNT):
         # Select two different parents from the top genomes
-        parent1 = random.choice(top_genomes)
+        parent1 = rng.choice(top_genomes)
         parent2_candidates = [g for g in top_genomes if g.id != parent1.id]
         
         # Ensure we have a distinct parent2
         if not parent2_candidates:
             temp_genomes = [g for g in top_genomes if g.id != parent1.id]
-            parent2 = random.choice(temp_genomes) if temp_genomes else random.choice(top_genomes)
+            parent2 = rng.choice(temp_genomes) if temp_genomes else rng.choice(top_genomes)
         else:
-            parent2 = random.choice(parent2_candidates)
+            parent2 = rng.choice(parent2_candidates)
         
         # Perform crossover to create child
         child_data = crossover(parent1, parent2)
         
-        # Apply a very low chance of mutation (0.1% chance per gene)
+        # Apply a very low chance of mutation (0.1% chance per gene by default)
         # This is the key change - using a per-gene mutation probability instead of whole genome
         child_genome = json.loads(child_data)
         for gene_idx in range(len(child_genome)):
-            # 0.1% chance to mutate each gene (note)
-            if random.random() < 0.001:  # 0.1% probability
+            if rng.random() < gene_mutation_rate:
                 # If a gene is selected for mutation, apply a very small change
                 gene = child_genome[gene_idx]
                 
                 # Pitch: change by at most 1-2 semitones
-                if random.random() < 0.33:  # One third chance to mutate pitch
-                    pitch_change = random.choice([-2, -1, 1, 2])
+                if rng.random() < 0.33:  # One third chance to mutate pitch
+                    pitch_change = rng.choice([-2, -1, 1, 2])
                     new_pitch = gene["pitch"] + pitch_change
                     # Keep within reasonable range
                     gene["pitch"] = max(36, min(84, new_pitch))
                 
                 # Duration: only change between adjacent values
-                elif random.random() < 0.66:  # One third chance to mutate duration
+                elif rng.random() < 0.66:  # One third chance to mutate duration
                     durations = [0.25, 0.5, 1, 2]
                     current_idx = durations.index(gene["duration"]) if gene["duration"] in durations else 1
-                    new_idx = max(0, min(len(durations) - 1, current_idx + random.choice([-1, 1])))
+                    new_idx = max(0, min(len(durations) - 1, current_idx + rng.choice([-1, 1])))
                     gene["duration"] = durations[new_idx]
                 
                 # Velocity: change by at most 5
                 else:  # One third chance to mutate velocity
-                    velocity_change = random.choice([-5, -4, -3, -2, -1, 1, 2, 3, 4, 5])
+                    velocity_change = rng.choice([-5, -4, -3, -2, -1, 1, 2, 3, 4, 5])
                     new_velocity = gene["velocity"] + velocity_change
                     # Keep within reasonable range
                     gene["velocity"] = max(60, min(100, new_velocity))
@@ -232,7 +356,7 @@ def create_next_generation(db: Session, current_generation: int):
 
 # Make the apply_mutation function more conservative
 
-def apply_mutation(genome_data: str, num_genes: int = GENES_TO_MUTATE, conservative: bool = True):
+def apply_mutation(genome_data: str, num_genes: int = GENES_TO_MUTATE, conservative: bool = True, rng=random):
     """
     Apply random mutations to a genome
     
@@ -240,42 +364,80 @@ def apply_mutation(genome_data: str, num_genes: int = GENES_TO_MUTATE, conservat
         genome_data: JSON string representation of the genome
         num_genes: Number of genes to mutate
         conservative: If True, apply very small mutations
+        rng: random.Random to draw from (see rng_streams); the global one by default
     """
     genome = json.loads(genome_data)
     
     # Choose random genes to mutate
-    genes_to_mutate = random.sample(range(len(genome)), min(num_genes, len(genome)))
+    genes_to_mutate = rng.sample(range(len(genome)), min(num_genes, len(genome)))
     
     for gene_idx in genes_to_mutate:
-        gene = genome[gene_idx]
+        genome[gene_idx] = mutate_gene(genome[gene_idx], conservative, rng)
+    
+    return json.dumps(genome)
+
+def mutate_gene(gene: dict, conservative: bool = True, rng=random):
+    """Return a mutated copy of a single note (see apply_mutation)"""
+    gene = dict(gene)
+    
+    if conservative:
+        # Conservative mutations
+        # Pitch: change by at most 1-2 semitones
+        if rng.random() < 0.33:
+            pitch_change = rng.choice([-2, -1, 1, 2])
+            new_pitch = gene.get("pitch", 60) + pitch_change
+            gene["pitch"] = max(36, min(84, new_pitch))
         
-        if conservative:
-            # Conservative mutations
-            # Pitch: change by at most 1-2 semitones
-            if random.random() < 0.33:
-                pitch_change = random.choice([-2, -1, 1, 2])
-                new_pitch = gene.get("pitch", 60) + pitch_change
-                genome[gene_idx]["pitch"] = max(36, min(84, new_pitch))
-            
-            # Duration: only change between adjacent values
-            elif random.random() < 0.66:
-                durations = [0.25, 0.5, 1, 2]
-                current_idx = durations.index(gene.get("duration", 0.5)) if gene.get("duration") in durations else 1
-                new_idx = max(0, min(len(durations) - 1, current_idx + random.choice([-1, 1])))
-                genome[gene_idx]["duration"] = durations[new_idx]
-            
-            # Velocity: change by at most 5
-            else:
-                velocity_change = random.choice([-5, -4, -3, -2, -1, 1, 2, 3, 4, 5])
-                new_velocity = gene.get("velocity", 80) + velocity_change
-                genome[gene_idx]["velocity"] = max(60, min(100, new_velocity))
+        # Duration: only change between adjacent values
+        elif rng.random() < 0.66:
+            durations = [0.25, 0.5, 1, 2]
+            current_idx = durations.index(gene.get("duration", 0.5)) if gene.get("duration") in durations else 1
+            new_idx = max(0, min(len(durations) - 1, current_idx + rng.choice([-1, 1])))
+            gene["duration"] = durations[new_idx]
+        
+        # Velocity: change by at most 5
         else:
-            # Original behavior for non-conservative mutations
-            genome[gene_idx]["pitch"] = random.randint(36, 84)
-            genome[gene_idx]["duration"] = random.choice([0.25, 0.5, 1, 2])
-            genome[gene_idx]["velocity"] = random.randint(60, 100)
+            velocity_change = rng.choice([-5, -4, -3, -2, -1, 1, 2, 3, 4, 5])
+            new_velocity = gene.get("velocity", 80) + velocity_change
+            gene["velocity"] = max(60, min(100, new_velocity))
+    else:
+        # Original behavior for non-conservative mutations
+        gene["pitch"] = rng.randint(36, 84)
+        gene["duration"] = rng.choice([0.25, 0.5, 1, 2])
+        gene["velocity"] = rng.randint(60, 100)
     
-    return json.dumps(genome)
+    return gene
+
+def get_genomes_by_ids(db: Session, genome_ids):
+    """
+    Load several genomes together with their experiment in one joined query.
+    
+    Returns a dict of genome_id -> (genome, experiment or None). Genomes of
+    archived experiments come back as archive.GenomeRecord.
+    """
+    rows = db.query(models.Genome, models.Experiment).outerjoin(
+        models.GenomeExperiment,
+        models.GenomeExperiment.genome_id == models.Genome.id
+    ).outerjoin(
+        models.Experiment,
+        models.Experiment.id == models.GenomeExperiment.experiment_id
+    ).filter(
+        models.Genome.id.in_(set(genome_ids))
+    ).all()
+    
+    found = {genome.id: (genome, experiment) for genome, experiment in rows}
+    
+    missing_ids = set(genome_ids) - set(found)
+    if missing_ids:
+        archived = archive.store.get_genomes(missing_ids)
+        experiment_ids = {experiment_id for _, experiment_id in archived.values()}
+        experiments_by_id = {
+            experiment.id: experiment
+            for experiment in db.query(models.Experiment).filter(models.Experiment.id.in_(experiment_ids))
+        } if experiment_ids else {}
+        for genome_id, (record, experiment_id) in archived.items():
+            found[genome_id] = (record, experiments_by_id.get(experiment_id))
+    return found
 
 def get_genome_for_user(db: Session, generation: int):
     """Assign a genome to a user for mutation"""
@@ -292,6 +454,11 @@ def get_genome_for_user(db: Session, generation: int):
     return random.choice(genomes_list) if genomes_list else None
 
 
+def cached_heuristic_score(genome: models.Genome):
+    """heuristic_score of a genome, computed once per distinct set of notes and scorer version (see score_cache)"""
+    payload = getattr(genome, "payload", None)  # archived genomes have none
+    return score_cache.cache.score(genome.data, payload)
+
 # Replace the existing heuristic_score function with this enhanced version
 
 def heuristic_score(genome_data: str):
@@ -305,14 +472,34 @@ def heuristic_score(genome_data: str):
     
     Returns a score from 0-100, with higher being better.
     """
+    components = heuristic_components(genome_data)
+    if components is None:
+        return 50.0  # default if error parsing, or for empty or single-note genomes
+    return combine_heuristic_components(components)
+
+def combine_heuristic_components(components):
+    """Add up the component scores of heuristic_components into the 0-100 score"""
+    # Combine all scores (all components equally weighted)
+    final_score = (components["pitch"] + components["rhythm"] + components["contour"] +
+                   components["phrase"] + components["interval"])
+    
+    # Normalize to 0-100
+    return min(100, max(0, final_score))
+
+def heuristic_components(genome_data: str):
+    """
+    The component scores heuristic_score adds up, as a dict keyed by
+    HEURISTIC_COMPONENTS, or None where heuristic_score falls back to its
+    default (unparseable, empty or single-note genomes).
+    """
     try:
         notes = json.loads(genome_data)
     except Exception as e:
         print(f"Error parsing genome data: {e}")
-        return 50.0  # default if error parsing
+        return None
 
     if not notes or len(notes) < 2:
-        return 50.0  # default for empty or single-note genomes
+        return None
     
     # Initialize scores for each component (0-20 points each)
     pitch_score = 0
@@ -406,10 +593,10 @@ def heuristic_score(genome_data: str):
     else:
         interval_score = 20 * (1 - abs(consonant_ratio - 0.6) / 0.6)
     
-    # Combine all scores (all components equally weighted)
-    final_score = (pitch_score + rhythm_score + contour_score + phrase_score + interval_score)
-    
-    # Normalize to 0-100
-    normalized_score = min(100, max(0, final_score))
-    
-    return normalized_score
\ No newline at end of file
+    return {
+        "pitch": pitch_score,
+        "rhythm": rhythm_score,
+        "contour": contour_score,
+        "phrase": phrase_score,
+        "interval": interval_score,
+    }
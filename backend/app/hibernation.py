@@ -0,0 +1,55 @@
+"""
+Hibernation of idle experiments.
+
+An active experiment without contributions for HIBERNATE_AFTER_HOURS is
+marked dormant (Experiment.dormant_since): its in-memory generation state,
+steady-state index and surrogate model are dropped, the scheduler and the
+random-genome flow skip it, and nothing about it is loaded until someone
+asks for it again. Loading its generation state (fetching or claiming a genome of the
+current generation) or contributing to it wakes it up.
+"""
+import os
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Load environment variables
+load_dotenv()
+
+HIBERNATE_AFTER_HOURS = float(os.getenv("HIBERNATE_AFTER_HOURS", 24))
+HIBERNATION_CHECK_MINUTES = int(os.getenv("HIBERNATION_CHECK_MINUTES", 10))
+
+
+def touch(experiment: models.Experiment):
+    """Record activity on the experiment, waking it if it was dormant (caller commits)"""
+    if experiment.dormant_since is not None:
+        print(f"Waking dormant experiment {experiment.id}")
+    experiment.dormant_since = None
+    experiment.last_active_at = datetime.utcnow()
+
+
+def hibernate_idle(db: Session, now: datetime = None):
+    """Mark every active experiment idle for HIBERNATE_AFTER_HOURS dormant; returns their ids"""
+    from . import generation_state, steady_state, surrogate
+
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=HIBERNATE_AFTER_HOURS)
+    idle = db.query(models.Experiment).filter(
+        models.Experiment.completed == False,
+        models.Experiment.dormant_since == None,
+        func.coalesce(models.Experiment.last_active_at, models.Experiment.created_at) < cutoff
+    ).all()
+
+    for experiment in idle:
+        experiment.dormant_since = now
+    db.commit()
+
+    for experiment in idle:
+        generation_state.registry.invalidate(experiment.id)
+        steady_state.registry.invalidate(experiment.id)
+        surrogate.registry.invalidate(experiment.id)
+    return [experiment.id for experiment in idle]
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from dotenv import load_dotenv
+
+from . import models
+
+# Load environment variables
+load_dotenv()
+
+# How long a client may reuse a representation that can never change again
+IMMUTABLE_MAX_AGE = int(os.getenv("IMMUTABLE_MAX_AGE", 31536000))  # one year
+
+# Every cached response is behind auth: private, so shared proxies never hand it to another user
+IMMUTABLE_CACHE_CONTROL = f"private, max-age={IMMUTABLE_MAX_AGE}, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(body) -> str:
+    """Build a strong ETag from the canonical JSON encoding of a response body"""
+    encoded = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def is_genome_immutable(genome: models.Genome, experiment: Optional[models.Experiment]) -> bool:
+    """
+    A genome can no longer be mutated once its experiment has moved past its
+    generation or the experiment has been completed.
+    """
+    if experiment is None:
+        return False
+    return bool(experiment.completed) or genome.generation < experiment.current_generation
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # Weak comparison, as required for If-None-Match
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since is None:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have a resolution of one second
+    return last_modified.replace(microsecond=0) <= since
+
+
+def cached_json_response(
+    request: Request,
+    payload,
+    immutable: bool = False,
+    last_modified: Optional[datetime] = None,
+) -> Response:
+    """
+    Return payload as JSON with ETag/Last-Modified validators, answering
+    304 Not Modified when the client's conditional headers still match.
+    """
+    body = jsonable_encoder(payload)
+    etag = make_etag(body)
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        "Vary": "Authorization",
+    }
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110, section 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif last_modified is not None:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and _not_modified_since(if_modified_since, last_modified):
+            return Response(status_code=304, headers=headers)
+
+    return JSONResponse(content=body, headers=headers)
@@ -0,0 +1,283 @@
+import asyncio
+import os
+import random
+from dataclasses import dataclass
+from typing import List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# "mailersend" delivers through the MailerSend API, "console" just prints (development)
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "mailersend")
+# Point this at a local stand-in server to exercise the real transport in tests
+MAILERSEND_API_URL = os.getenv("MAILERSEND_API_URL", "https://api.mailersend.com/v1")
+MAILERSEND_API_KEY = os.getenv("MAILERSEND_API_KEY", "mlsn.73508ecd9eaf7f1a64c59cb054cdada396fd733e836342748c73064db8da2bbe")
+MAILERSEND_FROM_EMAIL = os.getenv("MAILERSEND_FROM_EMAIL", "info@tunebreeder.com")
+MAILERSEND_FROM_NAME = os.getenv("MAILERSEND_FROM_NAME", "TuneBreeder Support")
+
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", 1000))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 50))  # MailerSend bulk-email accepts up to 500
+MAIL_BATCH_WINDOW = float(os.getenv("MAIL_BATCH_WINDOW", 0.5))  # seconds to wait for a batch to fill
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", 5))
+MAIL_RETRY_BASE_DELAY = float(os.getenv("MAIL_RETRY_BASE_DELAY", 1.0))
+MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", 4))
+
+
+@dataclass
+class OutgoingEmail:
+    to: str
+    subject: str
+    text: str
+    html: Optional[str] = None
+
+
+class MailDeliveryError(Exception):
+    """Delivery failed and retrying will not help (bad request, bad credentials...)"""
+
+
+class TransientMailError(MailDeliveryError):
+    """Delivery failed but may succeed later (rate limit, server error, network)"""
+
+
+class MailTransport:
+    """Interface for anything that can deliver a batch of emails"""
+
+    async def send(self, messages: List[OutgoingEmail]):
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class ConsoleTransport(MailTransport):
+    """Prints emails instead of sending them; used in development and as a last resort"""
+
+    async def send(self, messages: List[OutgoingEmail]):
+        for message in messages:
+            print("\n====== OUTGOING EMAIL ======")
+            print(f"To: {message.to}")
+            print(f"Subject: {message.subject}")
+            print(message.text.strip())
+            print("============================\n")
+
+
+class MailerSendTransport(MailTransport):
+    """MailerSend API client over a persistent, pooled HTTPS connection"""
+
+    def __init__(
+        self,
+        api_key: str = MAILERSEND_API_KEY,
+        base_url: str = MAILERSEND_API_URL,
+        from_email: str = MAILERSEND_FROM_EMAIL,
+        from_name: str = MAILERSEND_FROM_NAME,
+        pool_size: int = MAIL_POOL_SIZE,
+        timeout: float = 10.0,
+    ):
+        self.from_email = from_email
+        self.from_name = from_name
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "X-Requested-With": "XMLHttpRequest",
+            },
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=timeout,
+        )
+
+    def _payload(self, message: OutgoingEmail):
+        payload = {
+            "from": {"email": self.from_email, "name": self.from_name},
+            "to": [{"email": message.to}],
+            "subject": message.subject,
+            "text": message.text,
+        }
+        if message.html:
+            payload["html"] = message.html
+        return payload
+
+    async def send(self, messages: List[OutgoingEmail]):
+        # A single email goes to /email, several are submitted in one /bulk-email call
+        if len(messages) == 1:
+            path, body = "/email", self._payload(messages[0])
+        else:
+            path, body = "/bulk-email", [self._payload(m) for m in messages]
+
+        try:
+            response = await self.client.post(path, json=body)
+        except httpx.HTTPError as e:
+            raise TransientMailError(f"MailerSend request failed: {e}") from e
+
+        if response.status_code in (200, 202):
+            return
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientMailError(f"MailerSend returned {response.status_code}: {response.text}")
+        raise MailDeliveryError(f"MailerSend returned {response.status_code}: {response.text}")
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def create_transport(name: str = MAIL_TRANSPORT) -> MailTransport:
+    if name == "console":
+        return ConsoleTransport()
+    if name == "mailersend":
+        return MailerSendTransport()
+    raise ValueError(f"Unknown mail transport: {name}")
+
+
+class MailDispatcher:
+    """
+    Delivers queued emails from a background task on the event loop.
+
+    Messages wait in a bounded queue and are grouped into batches. A batch
+    that fails transiently is retried with exponential backoff from its own
+    delayed task, so the worker goes on delivering the rest of the queue
+    meanwhile. Batches that still fail are handed to the fallback transport
+    so nothing is silently lost.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[MailTransport] = None,
+        fallback: Optional[MailTransport] = None,
+        queue_size: int = MAIL_QUEUE_SIZE,
+        batch_size: int = MAIL_BATCH_SIZE,
+        batch_window: float = MAIL_BATCH_WINDOW,
+        max_retries: int = MAIL_MAX_RETRIES,
+        retry_base_delay: float = MAIL_RETRY_BASE_DELAY,
+    ):
+        self.transport = transport
+        self.fallback = fallback or ConsoleTransport()
+        self.queue_size = queue_size
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.queue = None
+        self._worker = None
+        self._retries = set()  # delayed retry tasks
+        self.sent_count = 0
+        self.failed_count = 0
+        self.dropped_count = 0
+
+    @property
+    def running(self):
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self):
+        if self.running:
+            return
+        if self.transport is None:
+            self.transport = create_transport()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Flush what is already queued (up to timeout), then close the transport"""
+        if self._worker is None:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Mail dispatcher stopped with {self.queue.qsize()} emails still queued")
+        if self._retries:
+            # Retries still backing off get until the deadline, then go to the fallback
+            await asyncio.wait(set(self._retries), timeout=max(0.0, deadline - loop.time()))
+            for task in list(self._retries):
+                task.cancel()
+            await asyncio.gather(*self._retries, return_exceptions=True)
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        await self.transport.aclose()
+        self.transport = None
+
+    def enqueue(self, message: OutgoingEmail) -> bool:
+        """
+        Queue an email for delivery. Must be called from the event loop thread.
+        Returns False when the queue is full and the email was dropped.
+        """
+        if not self.running:
+            raise RuntimeError("Mail dispatcher is not running")
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped_count += 1
+            print(f"Mail queue full, dropping email to {message.to}")
+            return False
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _deliver(self, batch, attempt: int = 0):
+        try:
+            await self.transport.send(batch)
+            self.sent_count += len(batch)
+            return
+        except TransientMailError as e:
+            if attempt < self.max_retries:
+                delay = self.retry_base_delay * (2 ** attempt)
+                delay += random.uniform(0, delay / 2)  # jitter so retries don't synchronise
+                print(f"Mail delivery failed ({e}), retrying in {delay:.1f}s")
+                self._schedule_retry(batch, attempt + 1, delay)
+                return
+            print(f"Giving up on {len(batch)} emails after {attempt + 1} attempts: {e}")
+        except MailDeliveryError as e:
+            print(f"Mail delivery rejected: {e}")
+        except Exception as e:
+            print(f"Unexpected error delivering mail: {e}")
+        await self._give_up(batch)
+
+    def _schedule_retry(self, batch, attempt: int, delay: float):
+        task = asyncio.create_task(self._retry(batch, attempt, delay))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _retry(self, batch, attempt: int, delay: float):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            # The dispatcher is stopping: don't lose the batch
+            await self._give_up(batch)
+            raise
+        await self._deliver(batch, attempt)
+
+    async def _give_up(self, batch):
+        self.failed_count += len(batch)
+        try:
+            await self.fallback.send(batch)
+        except Exception as e:
+            print(f"Fallback mail transport failed: {e}")
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._deliver(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+
+dispatcher = MailDispatcher()
@@ -1,10 +1,16 @@
+from contextlib import asynccontextmanager
+import asyncio
+import threading
 from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from datetime import timedelta
 import json
 import os
+import random
+import tempfile
 from dotenv import load_dotenv
 # Add these imports at the top
 from sqlalchemy import func, desc
@@ -12,18 +18,17 @@ from datetime import datetime, timedelta
 import pytz
 from authlib.integrations.starlette_client import OAuth
 from starlette.config import Config
-from starlette.responses import RedirectResponse
+from starlette.responses import RedirectResponse, StreamingResponse, Response
 # Add this import for SessionMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
-from . import models, schemas, auth, database, genomes
+from . import models, schemas, auth, database, genomes, http_cache, mailer, events, generation_state, midi, export, archive, payloads, similarity, score_cache, score_breakdowns, operators, steady_state, advancement, hibernation, diversity, surrogate
 from .database import engine
 from . import experiments
 # Import the cleanup function at the top of the file
 from .database_cleanup import cleanup_orphaned_genomes
 
 # Add these imports at the top
-from fastapi import BackgroundTasks
 import secrets
 from datetime import datetime, timedelta
 from email.message import EmailMessage
@@ -33,10 +38,38 @@ from pydantic import EmailStr
 # Load environment variables
 load_dotenv()
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Defer the experiment repair pass to a background thread so the server starts accepting requests immediately
+FAST_START = os.getenv("FAST_START", "false").lower() in ("1", "true", "yes")
+# Turn off to run without the periodic generation update (e.g. in tests or one-off scripts)
+ENABLE_SCHEDULER = os.getenv("ENABLE_SCHEDULER", "true").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifecycle: nothing touches the database or starts threads at import time"""
+    # Create database tables
+    await run_in_threadpool(models.Base.metadata.create_all, bind=engine)
+    
+    if FAST_START:
+        repair_thread = threading.Thread(target=startup_event, name="experiment-repair", daemon=True)
+        repair_thread.start()
+    else:
+        await run_in_threadpool(startup_event)
+    
+    events.broker.attach_loop(asyncio.get_running_loop())
+    if ENABLE_SCHEDULER:
+        start_scheduler()
+    await mailer.dispatcher.start()
+    try:
+        yield
+    finally:
+        events.broker.detach_loop()
+        stop_scheduler()
+        await mailer.dispatcher.stop()
+        midi.cache.shutdown()
+        await run_in_threadpool(similarity.save_snapshot)
+        auth.password_hash_executor.shutdown(wait=False)
 
-app = FastAPI(title="TuneBreeder API")
+app = FastAPI(title="TuneBreeder API", lifespan=lifespan)
 
 # Add SessionMiddleware (must be before other middleware)
 app.add_middleware(
@@ -76,13 +109,8 @@ oauth.register(
     }
 )
 
-# Dependency
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Dependency (the same one auth uses, so overriding it covers authentication too)
+get_db = database.get_db
 
 # Authentication endpoints
 @app.post("/api/register", response_model=schemas.User)
@@ -126,7 +154,7 @@ def read_users_me(current_user: models.User = Depends(auth.get_current_active_us
 @app.get("/api/genome/current")
 def get_current_genome(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Get a genome for the user to mutate from the current active generation"""
     # Find the current active generation (highest generation number)
@@ -149,8 +177,13 @@ def get_current_genome(
 
 # Modify the existing mutate_genome endpoint
 
-# Store the next scheduled update time
-next_scheduled_update = datetime.now(pytz.utc) + timedelta(minutes=schedule_time)
+def advance_progress(db: Session, experiment):
+    """next_update and contributions_until_advance of an experiment's current generation"""
+    # Only an already loaded state: reporting progress mustn't load (and wake) an experiment
+    state = generation_state.registry.peek(experiment.id) if experiment is not None else None
+    if state is None or state.generation != experiment.current_generation:
+        return advancement.progress(experiment)
+    return advancement.progress(experiment, scored=len(state.scored_ids), population=len(state.genome_ids))
 
 @app.post("/api/genome/{genome_id}/mutate")
 def mutate_genome(
@@ -172,8 +205,24 @@ def mutate_genome(
     
     if not genome_exp:
         raise HTTPException(status_code=404, detail="Genome not associated with any experiment")
+    
+    # Genomes of finalized generations are immutable (and cached as such by clients)
+    experiment = db.query(models.Experiment).filter(
+        models.Experiment.id == genome_exp.experiment_id
+    ).first()
+    if experiment and (http_cache.is_genome_immutable(genome, experiment) or genome_exp.replaced_at is not None):
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "This generation has already been advanced",
+                **advance_progress(db, experiment),
+                "experiment_id": genome_exp.experiment_id,
+                "generation": genome_exp.generation
+            }
+        )
         
     # Check if user has already contributed to this experiment's generation
+    # (steady-state populations never advance: there, once per genome)
     existing_contribution = db.query(models.Mutation).join(
         models.GenomeExperiment, 
         models.Mutation.genome_id == models.GenomeExperiment.genome_id
@@ -181,7 +230,10 @@ def mutate_genome(
         models.Mutation.user_id == current_user.id,
         models.GenomeExperiment.experiment_id == genome_exp.experiment_id,
         models.GenomeExperiment.generation == genome_exp.generation
-    ).first()
+    )
+    if experiment and steady_state.is_steady_state(experiment):
+        existing_contribution = existing_contribution.filter(models.Mutation.genome_id == genome_id)
+    existing_contribution = existing_contribution.first()
     
     if existing_contribution:
         # Return a specific error code and response for already contributed
@@ -189,7 +241,7 @@ def mutate_genome(
             status_code=409, 
             detail={
                 "message": "You have already contributed to this experiment's generation",
-                "next_update": next_scheduled_update.isoformat(),
+                **advance_progress(db, experiment),
                 "experiment_id": genome_exp.experiment_id,
                 "generation": genome_exp.generation
             }
@@ -213,6 +265,8 @@ def mutate_genome(
     current_user.contribution_count += 1
     
     # Find which experiment this genome belongs to and check if we need to advance the generation
+    best_score_changed = False
+    replacement = None
     genome_exp = db.query(models.GenomeExperiment).filter(
         models.GenomeExperiment.genome_id == genome_id
     ).first()
@@ -223,46 +277,86 @@ def mutate_genome(
         ).first()
         
         if experiment:
+            hibernation.touch(experiment)
+            # Before anything flushes the mutation, so a freshly loaded model doesn't count it twice
+            try:
+                surrogate.learn(db, experiment, mutation.mutation_data, mutation.score)
+            except Exception as e:
+                # The model is only an aid to breeding: never lose a score over it
+                print(f"Surrogate model for experiment {experiment.id} couldn't learn a score: {e}")
+            
             # Update best score if applicable
             if mutation.score > experiment.best_score:
                 experiment.best_score = mutation.score
+                best_score_changed = True
             
-            # Check if all genomes in current generation have been scored
-            all_scored = db.query(
-                ~db.query(models.GenomeExperiment)
-                .join(models.Genome)
-                .filter(
-                    models.GenomeExperiment.experiment_id == experiment.id,
-                    models.GenomeExperiment.generation == experiment.current_generation,
-                    models.Genome.user_scored == 0  # Changed from score == 0
-                ).exists()
-            ).scalar()
-
-            
-            # If all genomes are scored, automatically advance to next generation
-            if all_scored:
-                experiments.advance_experiment_generation(db, experiment.id)
+            if steady_state.is_steady_state(experiment):
+                # Breed one child right away, replacing the worst unsaved genome
+                replacement = steady_state.contribute(db, experiment, genome)
+            else:
+                # Count the contribution; advance right away once the experiment's policy is met
+                state = generation_state.registry.get(db, experiment.id)
+                scored = len(state.scored_ids | {genome_id}) if state else 0
+                population = len(state.genome_ids) if state else 0
+                if advancement.record_contribution(db, experiment, scored, population):
+                    experiments.advance_experiment_generation(db, experiment.id)
                 
     
     db.commit()
     db.refresh(db_mutation)
+    similarity.index_genomes([genome])
+    
+    generation_state.registry.record_contribution(
+        genome_exp.experiment_id, genome_exp.generation, current_user.id, genome_id
+    )
+    
+    if replacement and replacement["status"] == "replaced":
+        child = replacement["genome"]
+        generation_state.registry.replace_genome(
+            genome_exp.experiment_id, genome_exp.generation, replacement["replaced_genome_id"], child.id
+        )
+        similarity.index_genomes([child])
+        events.publish(
+            events.GENOME_REPLACED,
+            experiment_id=experiment.id,
+            genome_id=child.id,
+            replaced_genome_id=replacement["replaced_genome_id"],
+            births=replacement["births"]
+        )
+    completion = replacement.get("completion") if replacement else None
+    if completion:
+        generation_state.registry.invalidate(experiment.id)
+        events.publish(
+            events.EXPERIMENT_COMPLETED,
+            experiment_id=experiment.id,
+            final_genome_id=completion["final_genome_id"],
+            final_score=completion["final_score"],
+            reason=completion["reason"]
+        )
+    
+    if best_score_changed:
+        events.publish(
+            events.BEST_SCORE_CHANGED,
+            experiment_id=experiment.id,
+            best_score=experiment.best_score
+        )
     
     # Return the next scheduled update time along with the success message
     return {
         "message": "Mutation submitted successfully", 
         "mutation_id": db_mutation.id,
-        "next_update": next_scheduled_update.isoformat()
+        **advance_progress(db, experiment)
     }
 
 @app.post("/api/melody/save")
 def save_melody(
     melody: schemas.SavedMelodyCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Save a melody (genome) to user's collection"""
-    # Verify genome exists
-    genome = db.query(models.Genome).filter(models.Genome.id == melody.genome_id).first()
+    # Verify genome exists; saved melodies always live in the hot tables
+    genome = archive.restore_genome(db, melody.genome_id)
     if not genome:
         raise HTTPException(status_code=404, detail="Genome not found")
     
@@ -276,13 +370,14 @@ def save_melody(
     db.add(saved_melody)
     db.commit()
     db.refresh(saved_melody)
+    steady_state.registry.protect(melody.genome_id)
     
     return {"message": "Melody saved successfully", "melody_id": saved_melody.id}
 
 @app.get("/api/melody/saved")
 def get_saved_melodies(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Get all melodies saved by the current user"""
     saved_melodies = db.query(models.SavedMelody).\
@@ -312,15 +407,19 @@ def get_saved_melodies(
 @app.post("/api/admin/generation/next")
 def create_next_generation(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Create the next generation of genomes"""
     # Find current generation
     latest_gen = db.query(models.Genome.generation).order_by(models.Genome.generation.desc()).first()
     current_gen = latest_gen[0] if latest_gen else -1
     
+    # Per-gene mutation scaled up like experiments' mutation when the generation lacks diversity
+    generation_datas = [g.data for g in db.query(models.Genome).filter(models.Genome.generation == current_gen).all()]
+    scale = diversity.mutation_scale(diversity.population_diversity(generation_datas) if generation_datas else None)
+    
     # Generate new genomes
-    new_gen = genomes.create_next_generation(db, current_gen)
+    new_gen = genomes.create_next_generation(db, current_gen, gene_mutation_rate=0.001 * scale)
     
     return {
         "message": f"Created generation {current_gen + 1} with {len(new_gen)} genomes",
@@ -330,7 +429,7 @@ def create_next_generation(
 @app.get("/api/admin/generations")
 def get_generations(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Get statistics about all generations"""
     generations = db.query(models.Genome.generation).\
@@ -357,20 +456,137 @@ def get_generations(
     
     return results
 
+@app.post("/api/admin/experiments/{experiment_id}/archive")
+def archive_experiment_now(
+    experiment_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Move a completed experiment into cold storage without waiting for ARCHIVE_AFTER_HOURS"""
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    if not experiment.completed:
+        raise HTTPException(status_code=409, detail="Only completed experiments can be archived")
+    return archive.archive_experiment(db, experiment_id)
+
+@app.put("/api/admin/experiments/{experiment_id}/operators")
+def set_experiment_operators(
+    experiment_id: int,
+    settings: schemas.ExperimentOperators,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Choose the selection and crossover operators used from the experiment's next generation on"""
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    try:
+        if settings.selection_operator is not None:
+            operators.get_selection(settings.selection_operator)
+            experiment.selection_operator = settings.selection_operator
+        if settings.crossover_operator is not None:
+            operators.get_crossover(settings.crossover_operator)
+            experiment.crossover_operator = settings.crossover_operator
+    except operators.UnknownOperatorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    return {
+        "experiment_id": experiment.id,
+        "selection_operator": experiment.selection_operator or operators.DEFAULT_SELECTION,
+        "crossover_operator": experiment.crossover_operator or operators.DEFAULT_CROSSOVER,
+        "available_selection_operators": list(operators.SELECTION_OPERATORS),
+        "available_crossover_operators": list(operators.CROSSOVER_OPERATORS),
+    }
+
+@app.put("/api/admin/experiments/{experiment_id}/evolution-mode")
+def set_experiment_evolution_mode(
+    experiment_id: int,
+    settings: schemas.ExperimentEvolutionMode,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Switch an experiment between generational and steady-state evolution"""
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    try:
+        experiment.evolution_mode = steady_state.check_mode(settings.evolution_mode)
+    except steady_state.UnknownEvolutionModeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Generational counting starts over from the switch
+    advancement.start_generation(experiment)
+    db.commit()
+    generation_state.registry.invalidate(experiment_id)
+    steady_state.registry.invalidate(experiment_id)
+    return {
+        "experiment_id": experiment.id,
+        "evolution_mode": experiment.evolution_mode,
+        "steady_state_births": experiment.steady_state_births or 0,
+    }
+
+@app.put("/api/admin/experiments/{experiment_id}/advance-policy")
+def set_experiment_advance_policy(
+    experiment_id: int,
+    settings: schemas.ExperimentAdvancePolicy,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Choose when the experiment's generations advance; omitted settings are left unchanged"""
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    try:
+        advancement.check_policy(
+            settings.advance_after_scores, settings.advance_after_fraction, settings.advance_max_wait_seconds
+        )
+    except advancement.InvalidPolicyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if settings.advance_after_scores is not None:
+        experiment.advance_after_scores = settings.advance_after_scores
+    if settings.advance_after_fraction is not None:
+        experiment.advance_after_fraction = settings.advance_after_fraction
+    if settings.advance_max_wait_seconds is not None:
+        experiment.advance_max_wait_seconds = settings.advance_max_wait_seconds
+        # Re-armed from the new wait by the next contribution
+        experiment.advance_due_at = None
+    db.commit()
+    return {
+        "experiment_id": experiment.id,
+        **advancement.policy(experiment),
+        "generation_contributions": experiment.generation_contributions or 0,
+        "advance_due_at": experiment.advance_due_at,
+    }
+
+@app.get("/api/admin/archive")
+def get_archive_stats(
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Size of the cold-storage archive"""
+    return archive.store.stats()
+
+@app.get("/api/admin/score-cache")
+def get_score_cache_stats(
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Hit/miss counters of the heuristic score cache"""
+    return score_cache.cache.stats()
+
 # Add these new endpoints
 
 @app.get("/api/leaderboard")
 def get_leaderboard(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal),
     limit: int = 20
 ):
     """Get top users ranked by their contribution count (number of mutations)"""
-    # Get users with their mutation counts
+    # Get users with their mutation counts, including mutations that were archived
     user_contributions = db.query(
         models.User.id, 
         models.User.username,
-        func.count(models.Mutation.id).label('contribution_count')
+        (func.count(models.Mutation.id) +
+         func.coalesce(models.User.archived_contribution_count, 0)).label('contribution_count')
     ).outerjoin(
         models.Mutation, 
         models.User.id == models.Mutation.user_id
@@ -394,7 +610,7 @@ def get_leaderboard(
 @app.get("/api/melody/latest")
 def get_latest_playlist(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal),
     limit: int = 20
 ):
     """Get the latest saved melodies from all users"""
@@ -434,7 +650,7 @@ def get_latest_playlist(
 @app.get("/api/experiments")
 def get_experiments(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal),
     skip: int = 0, 
     limit: int = 100
 ):
@@ -444,21 +660,31 @@ def get_experiments(
 @app.get("/api/experiments/{experiment_id}")
 def get_experiment(
     experiment_id: int,
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Get a specific experiment by ID"""
     experiment = experiments.get_experiment(db, experiment_id)
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
-    return experiment
+    
+    # Completed experiments never change again. Active ones keep collecting
+    # contributions without touching updated_at, so only the ETag is reliable.
+    completed = experiment["completed"]
+    return http_cache.cached_json_response(
+        request,
+        experiment,
+        immutable=completed,
+        last_modified=experiment["updated_at"] if completed else None
+    )
 
 @app.get("/api/experiments/{experiment_id}/generation/{generation}")
 def get_genome_from_experiment(
     experiment_id: int,
     generation: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Get a random genome from specified experiment and generation"""
     # First check if the experiment exists
@@ -470,8 +696,21 @@ def get_genome_from_experiment(
     if generation < 0 or generation > experiment.current_generation:
         raise HTTPException(status_code=400, detail=f"Invalid generation. Current generation is {experiment.current_generation}")
     
-    # Get a random genome
-    genome = experiments.get_random_genome_from_experiment(db, experiment_id, generation)
+    genome = None
+    if generation == experiment.current_generation:
+        # Hand out genomes of the live generation through the assignment scheduler
+        state = generation_state.registry.get(db, experiment_id)
+        db.commit()  # in case loading the state woke the experiment
+        genome_id = state.assign_genome(current_user.id) if state and state.generation == generation else None
+        if genome_id is not None:
+            genome = db.get(models.Genome, genome_id)
+    
+    if not genome:
+        # Get a random genome
+        genome = experiments.get_random_genome_from_experiment(db, experiment_id, generation)
+    if not genome and experiment.archived_at:
+        archived_genomes = archive.store.get_generation(experiment_id, generation)
+        genome = random.choice(archived_genomes) if archived_genomes else None
     if not genome:
         raise HTTPException(status_code=404, detail="No genomes available for this experiment and generation")
     
@@ -487,52 +726,131 @@ def get_genome_from_experiment(
     
     return genome_dict
 
-import random
+@app.post("/api/experiments/{experiment_id}/generation/{generation}/claim")
+def claim_contribution_slot(
+    experiment_id: int,
+    generation: int,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """
+    Check whether the user may still contribute to this generation and hand
+    out a genome for it in one call. Replaces the contribution check followed
+    by a separate genome fetch.
+    """
+    state = generation_state.registry.get(db, experiment_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    db.commit()  # in case loading the state woke the experiment
+    
+    if generation != state.generation:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": f"Generation {generation} is not the current generation",
+                "current_generation": state.generation,
+                "experiment_id": experiment_id
+            }
+        )
+    
+    # One locked step: users who already contributed get a genome to look at, but no lease
+    has_contributed, genome_id = state.claim(current_user.id)
+    
+    if genome_id is None:
+        raise HTTPException(status_code=404, detail="No genomes available for this experiment and generation")
+    
+    genome = db.get(models.Genome, genome_id)
+    if not genome:
+        # The generation changed under us (e.g. cleanup); reload on the next claim
+        generation_state.registry.invalidate(experiment_id)
+        raise HTTPException(status_code=409, detail="Generation state changed, please retry")
+    
+    response = {
+        "id": genome.id,
+        "generation": genome.generation,
+        "data": json.loads(genome.data),
+        "score": genome.score,
+        "experiment_id": experiment_id,
+        "experiment_name": state.experiment_name,
+        "has_contributed": has_contributed
+    }
+    if has_contributed:
+        response.update(advance_progress(db, db.get(models.Experiment, experiment_id)))
+    
+    return response
+
 @app.get("/api/genome/random")
 def get_random_genome(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Get a random genome from any active experiment"""
     print(f"User {current_user.id} ({current_user.username}) requesting random genome")
     
-    # Get all active experiments
-    active_experiments = db.query(models.Experiment).filter(models.Experiment.completed == False).all()
-    
-    if not active_experiments:
-        raise HTTPException(status_code=404, detail="No active experiments found")
+    # Get all active experiments; dormant ones aren't loaded unless nothing else is left
+    active_experiments = db.query(models.Experiment).filter(
+        models.Experiment.completed == False,
+        models.Experiment.dormant_since == None
+    ).all()
     
     # Filter to experiments where the user hasn't contributed to current generation
-    available_experiments = []
+    available = []
     for experiment in active_experiments:
-        # Check if user has already contributed to this experiment's generation
-        existing_contribution = db.query(models.Mutation).join(
-            models.GenomeExperiment, 
-            models.Mutation.genome_id == models.GenomeExperiment.genome_id
-        ).filter(
-            models.GenomeExperiment.experiment_id == experiment.id,
-            models.GenomeExperiment.generation == experiment.current_generation,
-            models.Mutation.user_id == current_user.id
-        ).first()
-        
-        if not existing_contribution:
-            available_experiments.append(experiment)
+        state = generation_state.registry.get(db, experiment.id)
+        if state is None or state.generation != experiment.current_generation:
+            continue
+        if not state.has_contributed(current_user.id):
+            available.append((experiment, state))
+    
+    if not available:
+        # Wake a single dormant experiment this user may still contribute to. Eligibility
+        # is checked in the database, so the experiments passed over stay asleep.
+        dormant = db.query(models.Experiment).filter(
+            models.Experiment.completed == False,
+            models.Experiment.dormant_since != None
+        ).all()
+        random.shuffle(dormant)
+        for experiment in dormant:
+            contributed = experiment.evolution_mode != steady_state.STEADY_STATE and db.query(models.Mutation.id).join(
+                models.GenomeExperiment,
+                models.Mutation.genome_id == models.GenomeExperiment.genome_id
+            ).filter(
+                models.Mutation.user_id == current_user.id,
+                models.GenomeExperiment.experiment_id == experiment.id,
+                models.GenomeExperiment.generation == experiment.current_generation
+            ).first() is not None
+            if contributed:
+                continue
+            state = generation_state.registry.get(db, experiment.id)  # wakes it
+            db.commit()
+            if state is not None:
+                available.append((experiment, state))
+            break
+    
+    if not active_experiments and not available:
+        raise HTTPException(status_code=404, detail="No active experiments found")
     
-    if not available_experiments:
+    if not available:
         raise HTTPException(
             status_code=404, 
             detail="You've already contributed to all available experiments in their current generation"
         )
     
-    # Select random experiment from available ones
-    selected_experiment = random.choice(available_experiments)
+    # A user who already holds a genome keeps it; otherwise balance users across
+    # experiments by sending them where the most genomes still wait for a first
+    # score, picking randomly among equally needy experiments
+    holding = [(exp, state) for exp, state in available if state.leased_genome(current_user.id) is not None]
+    if holding:
+        selected_experiment, selected_state = holding[0]
+    else:
+        most_work = max(state.outstanding_work() for _, state in available)
+        selected_experiment, selected_state = random.choice(
+            [(exp, state) for exp, state in available if state.outstanding_work() == most_work]
+        )
     
     # Get genome from selected experiment
-    genome = experiments.get_random_genome_from_experiment(
-        db, 
-        selected_experiment.id, 
-        selected_experiment.current_generation
-    )
+    genome_id = selected_state.assign_genome(current_user.id)
+    genome = db.get(models.Genome, genome_id) if genome_id is not None else None
     
     if not genome:
         raise HTTPException(status_code=404, detail="No genomes available from selected experiment")
@@ -559,12 +877,13 @@ def get_random_genome(
 @app.get("/api/genome/{genome_id}/ancestry")
 def get_genome_ancestry(
     genome_id: int,
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Get a focused ancestry tree for a genome (highest scoring branch only)"""
     # First check if the genome exists
-    genome = db.query(models.Genome).filter(models.Genome.id == genome_id).first()
+    genome = archive.find_genome(db, genome_id)
     if not genome:
         raise HTTPException(status_code=404, detail="Genome not found")
     
@@ -603,10 +922,10 @@ def get_genome_ancestry(
         parent2 = None
         
         if current_genome.parent1_id:
-            parent1 = db.query(models.Genome).filter(models.Genome.id == current_genome.parent1_id).first()
+            parent1 = archive.find_genome(db, current_genome.parent1_id)
         
         if current_genome.parent2_id:
-            parent2 = db.query(models.Genome).filter(models.Genome.id == current_genome.parent2_id).first()
+            parent2 = archive.find_genome(db, current_genome.parent2_id)
         
         # Determine which parent has higher score
         higher_parent = None
@@ -657,10 +976,18 @@ def get_genome_ancestry(
     # Start adding ancestors from the requested genome
     add_highest_scoring_ancestor(genome)
     
-    return ancestry
+    # Ancestors always belong to earlier generations, so the tree is frozen
+    # as soon as the requested genome itself is
+    experiment = archive.find_experiment(db, genome.id)
+    
+    return http_cache.cached_json_response(
+        request,
+        ancestry,
+        immutable=http_cache.is_genome_immutable(genome, experiment),
+        last_modified=genome.updated_at or genome.created_at
+    )
 
 # Initialize database with genomes if empty
-@app.on_event("startup")
 def startup_event():
     db = database.SessionLocal()
     try:
@@ -685,16 +1012,17 @@ def startup_event():
 def get_common_ancestry(
     id1: int,
     id2: int,
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Find the lowest common ancestor between two genomes if it exists"""
     print(f"\n----- Looking for common ancestor between genomes {id1} and {id2} -----")
     
     try:
         # Get both genomes first
-        genome1 = db.query(models.Genome).filter(models.Genome.id == id1).first()
-        genome2 = db.query(models.Genome).filter(models.Genome.id == id2).first()
+        genome1 = archive.find_genome(db, id1)
+        genome2 = archive.find_genome(db, id2)
         
         print(f"Genome1 found: {genome1 is not None}, Genome2 found: {genome2 is not None}")
         
@@ -704,13 +1032,8 @@ def get_common_ancestry(
             raise HTTPException(status_code=404, detail=f"Genome with ID {missing_id} not found")
         
         # Check if they're from the same experiment
-        genome1_experiment = db.query(models.GenomeExperiment).filter(
-            models.GenomeExperiment.genome_id == genome1.id
-        ).first()
-        
-        genome2_experiment = db.query(models.GenomeExperiment).filter(
-            models.GenomeExperiment.genome_id == genome2.id
-        ).first()
+        genome1_experiment = archive.find_experiment(db, genome1.id)
+        genome2_experiment = archive.find_experiment(db, genome2.id)
         
         print(f"Genome1 experiment: {genome1_experiment is not None}, Genome2 experiment: {genome2_experiment is not None}")
         
@@ -722,13 +1045,20 @@ def get_common_ancestry(
                 "message": "These melodies are from different experiments or populations."
             }
             
-        if (genome1_experiment.experiment_id != genome2_experiment.experiment_id):
-            print(f"Genomes are from different experiments: {genome1_experiment.experiment_id} vs {genome2_experiment.experiment_id}")
+        if (genome1_experiment.id != genome2_experiment.id):
+            print(f"Genomes are from different experiments: {genome1_experiment.id} vs {genome2_experiment.id}")
             return {
                 "hasCommonAncestor": False,
                 "message": "These melodies are from different experiments or populations."
             }
         
+        # The answer only depends on the two genomes and their (older, frozen) ancestors
+        experiment = genome1_experiment
+        immutable = (http_cache.is_genome_immutable(genome1, experiment) and
+                     http_cache.is_genome_immutable(genome2, experiment))
+        last_modified = max(genome1.updated_at or genome1.created_at,
+                            genome2.updated_at or genome2.created_at)
+        
         # For first genome, track both ancestors and path to each ancestor
         ancestors_set1 = set()
         paths_to_ancestors = {}  # Dict mapping ancestor_id -> path from genome1
@@ -738,14 +1068,14 @@ def get_common_ancestry(
             if current_path is None:
                 current_path = []
                 
-            genome = db.query(models.Genome).filter(models.Genome.id == genome_id).first()
+            genome = archive.find_genome(db, genome_id)
             if not genome:
                 return
             
             # For each parent, record path and continue recursion
             for parent_attr, parent_id in [('parent1_id', genome.parent1_id), ('parent2_id', genome.parent2_id)]:
                 if parent_id:
-                    parent = db.query(models.Genome).filter(models.Genome.id == parent_id).first()
+                    parent = archive.find_genome(db, parent_id)
                     if parent:
                         ancestors_set.add(parent_id)
                         
@@ -778,7 +1108,7 @@ def get_common_ancestry(
                 
             if genome_id in ancestors_set1:
                 # This is a common ancestor
-                genome = db.query(models.Genome).filter(models.Genome.id == genome_id).first()
+                genome = archive.find_genome(db, genome_id)
                 if genome:
                     ancestor_info = {
                         "id": genome.id,
@@ -793,14 +1123,14 @@ def get_common_ancestry(
                     paths_from_genome2[genome_id] = path_from_genome2
             
             # Continue traversing up
-            genome = db.query(models.Genome).filter(models.Genome.id == genome_id).first()
+            genome = archive.find_genome(db, genome_id)
             if not genome:
                 return
             
             # For each parent, record path and continue recursion
             for parent_attr, parent_id in [('parent1_id', genome.parent1_id), ('parent2_id', genome.parent2_id)]:
                 if parent_id:
-                    parent = db.query(models.Genome).filter(models.Genome.id == parent_id).first()
+                    parent = archive.find_genome(db, parent_id)
                     if parent:
                         # Create path entry for this parent
                         parent_path = current_path.copy()
@@ -846,7 +1176,7 @@ def get_common_ancestry(
             print(f"Path length from genome1 to LCA: {len(path1_to_lca)}")
             print(f"Path length from genome2 to LCA: {len(path2_to_lca)}")
             
-            return {
+            result = {
                 "hasCommonAncestor": True,
                 "commonAncestor": lca,
                 "allCommonAncestors": common_ancestors,
@@ -858,10 +1188,14 @@ def get_common_ancestry(
                 "secondPath": path2_to_lca  # Path from genome2 to LCA (excluding endpoints)
             }
         else:
-            return {
+            result = {
                 "hasCommonAncestor": False,
                 "message": "These melodies share the same experiment but have no common ancestor."
             }
+        
+        return http_cache.cached_json_response(
+            request, result, immutable=immutable, last_modified=last_modified
+        )
     except Exception as e:
         print(f"Exception in common ancestry endpoint: {str(e)}")
         import traceback
@@ -870,15 +1204,339 @@ def get_common_ancestry(
 
 
 
+# Largest number of genomes that can be requested in one batch
+MAX_BATCH_GENOMES = 100
+GENOME_BATCH_FIELDS = {"data", "lineage", "experiment"}
+
+@app.get("/api/genomes")
+def get_genomes_batch(
+    ids: str,
+    request: Request,
+    fields: str = "data,lineage,experiment",
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """
+    Get several genomes at once, e.g. /api/genomes?ids=4,8,15&fields=data,experiment
+    
+    Results come back in request order; ids that don't exist are listed in missing_ids.
+    """
+    try:
+        genome_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not genome_ids:
+        raise HTTPException(status_code=400, detail="No genome ids given")
+    if len(genome_ids) > MAX_BATCH_GENOMES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_GENOMES} genomes can be requested at once")
+    
+    selected_fields = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown_fields = selected_fields - GENOME_BATCH_FIELDS
+    if unknown_fields:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown_fields))}")
+    
+    found = genomes.get_genomes_by_ids(db, genome_ids)
+    
+    results = []
+    missing_ids = []
+    immutable = True
+    last_modified = None
+    for genome_id in genome_ids:
+        if genome_id not in found:
+            missing_ids.append(genome_id)
+            continue
+        genome, experiment = found[genome_id]
+        
+        genome_dict = {
+            "id": genome.id,
+            "generation": genome.generation,
+            "score": genome.score,
+        }
+        if "data" in selected_fields:
+            try:
+                genome_dict["data"] = json.loads(genome.data)
+            except json.JSONDecodeError as e:
+                print(f"Error decoding genome data for genome {genome.id}: {e}")
+                raise HTTPException(status_code=500, detail=f"Invalid genome data format for genome {genome.id}: {str(e)}")
+        if "lineage" in selected_fields:
+            genome_dict["parent1_id"] = genome.parent1_id
+            genome_dict["parent2_id"] = genome.parent2_id
+        if "experiment" in selected_fields and experiment:
+            genome_dict["experiment_id"] = experiment.id
+            genome_dict["experiment_name"] = experiment.name
+        results.append(genome_dict)
+        
+        immutable = immutable and http_cache.is_genome_immutable(genome, experiment)
+        modified = genome.updated_at or genome.created_at
+        if last_modified is None or modified > last_modified:
+            last_modified = modified
+    
+    return http_cache.cached_json_response(
+        request,
+        {"genomes": results, "missing_ids": missing_ids},
+        immutable=immutable and not missing_ids,
+        last_modified=last_modified
+    )
+
+@app.get("/api/genome/{genome_id}/midi")
+def get_genome_midi(
+    genome_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Download a genome as a Standard MIDI File"""
+    genome = archive.find_genome(db, genome_id)
+    if not genome:
+        raise HTTPException(status_code=404, detail=f"Genome with ID {genome_id} not found")
+    
+    # The render is a pure function of the notes (and the renderer), so their hash is a perfect ETag
+    etag = f'"{getattr(genome, "payload_hash", None) or genomes.genome_content_hash(genome.data)}-v{midi.MIDI_RENDER_VERSION}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": http_cache.REVALIDATE_CACHE_CONTROL,
+        "Vary": "Authorization",
+        "Content-Disposition": f'attachment; filename="genome_{genome_id}.mid"'
+    }
+    experiment = archive.find_experiment(db, genome.id)
+    if experiment and http_cache.is_genome_immutable(genome, experiment):
+        headers["Cache-Control"] = http_cache.IMMUTABLE_CACHE_CONTROL
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and http_cache._etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        data = midi.cache.get(genome.data)
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"Error rendering genome {genome_id} to MIDI: {e}")
+        raise HTTPException(status_code=500, detail=f"Invalid genome data format for genome {genome_id}: {str(e)}")
+    
+    return Response(content=data, media_type="audio/midi", headers=headers)
+
+@app.get("/api/melody/saved/midi")
+def export_saved_melodies_midi(
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Download all of the current user's saved melodies as a zip of MIDI files"""
+    rows = db.query(models.SavedMelody, models.Genome).join(
+        models.Genome,
+        models.Genome.id == models.SavedMelody.genome_id
+    ).filter(
+        models.SavedMelody.user_id == current_user.id
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="No saved melodies to export")
+    
+    renders = midi.cache.get_many([genome.data for _, genome in rows])
+    entries = [
+        (f"{melody.id}_{midi.safe_filename(melody.name)}.mid", data)
+        for (melody, _), data in zip(rows, renders)
+    ]
+    return Response(
+        content=midi.build_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="tunebreeder_saved_melodies.zip"'}
+    )
+
+@app.get("/api/experiments/{experiment_id}/midi")
+def export_experiment_midi(
+    experiment_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Download a completed experiment's final piece and final generation as a zip of MIDI files"""
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    if not experiment.completed:
+        raise HTTPException(status_code=409, detail="Experiment has not completed yet")
+    
+    final_generation = sorted(
+        archive.get_generation_genomes(db, experiment, experiment.current_generation),
+        key=lambda genome: genome.score or 0,
+        reverse=True
+    )
+    
+    pieces = []
+    final_genome = db.get(models.Genome, experiment.final_genome_id) if experiment.final_genome_id else None
+    if final_genome:
+        pieces.append((f"final_{midi.safe_filename(experiment.final_piece_name)}.mid", final_genome))
+    for rank, genome in enumerate(final_generation, start=1):
+        pieces.append((f"generation_{genome.generation}/{rank:03d}_genome_{genome.id}.mid", genome))
+    
+    renders = midi.cache.get_many([genome.data for _, genome in pieces])
+    entries = [(filename, data) for (filename, _), data in zip(pieces, renders)]
+    return Response(
+        content=midi.build_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{midi.safe_filename(experiment.name)}.zip"'}
+    )
+
+@app.get("/api/experiments/{experiment_id}/dedup")
+def get_experiment_dedup_stats(
+    experiment_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """How many of an experiment's genomes share note payloads, overall and per generation"""
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    return payloads.dedup_stats(db, experiment_id)
+
+@app.get("/api/experiments/{experiment_id}/score-breakdown")
+def get_experiment_score_breakdown(
+    experiment_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Mean/min/max of each heuristic score component per generation, and how each trends over generations"""
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    return score_breakdowns.experiment_breakdown(db, experiment)
+
+@app.get("/api/experiments/{experiment_id}/generation/{generation}/score-breakdown")
+def get_generation_score_breakdown(
+    experiment_id: int,
+    generation: int,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Mean/min/max of each heuristic score component in one generation"""
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    result = score_breakdowns.generation_breakdown(db, experiment, generation)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No genomes found for generation {generation}")
+    return result
+
+@app.get("/api/experiments/{experiment_id}/diversity")
+def get_experiment_diversity(
+    experiment_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """Population diversity per generation, with the mutation rate and strength it led to"""
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    return {
+        "experiment_id": experiment_id,
+        "metrics": list(diversity.METRICS),
+        "generations": diversity.history(db, experiment_id),
+    }
+
+@app.get("/api/experiments/{experiment_id}/export")
+def export_experiment_history(
+    experiment_id: int,
+    format: str = "ndjson",
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """
+    Stream an experiment's full history (genomes, scores, lineage, mutations).
+    
+    format is ndjson, arrow (needs pyarrow), npz, or columnar for the best
+    columnar format available. Rows are read in batches, so the size of the
+    experiment doesn't affect memory use.
+    """
+    experiment = db.query(models.Experiment).filter(models.Experiment.id == experiment_id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    try:
+        fmt = export.check_format(format)
+    except export.ExportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    headers = {
+        "Content-Disposition": f'attachment; filename="{midi.safe_filename(experiment.name)}_history.{export.EXTENSIONS[fmt]}"'
+    }
+    if fmt == "npz":
+        # npz needs every column's length in its header, so it is built in a temp file first
+        fd, path = tempfile.mkstemp(suffix=".npz")
+        os.close(fd)
+        try:
+            export.write_npz(db, experiment, path)
+        except Exception:
+            os.remove(path)
+            raise
+        body = export.iter_file_chunks(path)
+    else:
+        body = export.stream_export(experiment_id, fmt)
+    return StreamingResponse(body, media_type=export.MEDIA_TYPES[fmt], headers=headers)
+
+MAX_SIMILAR_RESULTS = 50
+
+@app.get("/api/genome/{genome_id}/similar")
+def get_similar_genomes(
+    genome_id: int,
+    limit: int = 10,
+    scope: str = "all",
+    db: Session = Depends(get_db),
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
+):
+    """
+    Melodies that sound most like this one, by cosine similarity of their
+    interval, rhythm, contour and phrase-shape features (key independent).
+    
+    scope is "all" (every experiment) or "saved" (melodies users saved).
+    """
+    if scope not in ("all", "saved"):
+        raise HTTPException(status_code=400, detail="scope must be 'all' or 'saved'")
+    limit = max(1, min(limit, MAX_SIMILAR_RESULTS))
+    
+    genome = archive.find_genome(db, genome_id)
+    if not genome:
+        raise HTTPException(status_code=404, detail=f"Genome with ID {genome_id} not found")
+    
+    index = similarity.ensure_index(db)
+    vector = index.vector(genome_id)
+    if vector is None:
+        vector = similarity.melody_features(genome.data)
+    
+    allowed_ids = None
+    if scope == "saved":
+        allowed_ids = [saved_id for (saved_id,) in db.query(models.SavedMelody.genome_id).distinct()]
+    
+    # Ask for a few extra in case some matches were deleted since they were indexed
+    matches = index.query(vector, k=limit * 2, exclude_ids=[genome_id], allowed_ids=allowed_ids)
+    found = genomes.get_genomes_by_ids(db, [match_id for match_id, _ in matches])
+    stale_ids = [match_id for match_id, _ in matches if match_id not in found]
+    if stale_ids:
+        similarity.remove_genomes(stale_ids)
+    
+    results = []
+    for match_id, score in matches:
+        if match_id not in found:
+            continue
+        match, experiment = found[match_id]
+        results.append({
+            "id": match.id,
+            "similarity": score,
+            "generation": match.generation,
+            "score": match.score,
+            "experiment_id": experiment.id if experiment else None,
+            "experiment_name": experiment.name if experiment else None,
+        })
+        if len(results) == limit:
+            break
+    
+    return {"genome_id": genome_id, "scope": scope, "results": results}
+
 @app.get("/api/genome/{genome_id}")
 def get_genome_by_id(
     genome_id: int,
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Get a specific genome by ID"""
     # First check if the genome exists
-    genome = db.query(models.Genome).filter(models.Genome.id == genome_id).first()
+    genome = archive.find_genome(db, genome_id)
     if not genome:
         raise HTTPException(status_code=404, detail=f"Genome with ID {genome_id} not found")
     
@@ -896,19 +1554,17 @@ def get_genome_by_id(
         }
         
         # Get experiment info if available
-        genome_exp = db.query(models.GenomeExperiment).filter(
-            models.GenomeExperiment.genome_id == genome.id
-        ).first()
-        
-        if genome_exp:
-            experiment = db.query(models.Experiment).filter(
-                models.Experiment.id == genome_exp.experiment_id
-            ).first()
-            if experiment:
-                genome_dict["experiment_id"] = experiment.id
-                genome_dict["experiment_name"] = experiment.name
+        experiment = archive.find_experiment(db, genome.id)
+        if experiment:
+            genome_dict["experiment_id"] = experiment.id
+            genome_dict["experiment_name"] = experiment.name
         
-        return genome_dict
+        return http_cache.cached_json_response(
+            request,
+            genome_dict,
+            immutable=http_cache.is_genome_immutable(genome, experiment),
+            last_modified=genome.updated_at or genome.created_at
+        )
     except json.JSONDecodeError as e:
         print(f"Error decoding genome data for genome {genome_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Invalid genome data format for genome {genome_id}: {str(e)}")
@@ -923,21 +1579,32 @@ from datetime import datetime, timedelta
 import pytz
 
 def periodic_generation_update():
-    global next_scheduled_update
-    
-    print(f"Running periodic generation update at {datetime.now(pytz.utc)}")
-
+    """
+    Advance the experiments whose max wait is over (see advancement.py).
+    Experiments without contributions in their current generation aren't
+    due, so they aren't even loaded.
+    """
     # Obtain a session from the dependency generator
     db = next(get_db())
     try:
-        experiments_list = db.query(models.Experiment).filter(models.Experiment.completed == False).all()
-        print(f"Found {len(experiments_list)} active experiments")
-        
+        due = advancement.due_experiments(db)
+        if due:
+            print(f"Running periodic generation update at {datetime.now(pytz.utc)}: {len(due)} experiments due")
 
-        for exp in experiments_list:
+        for exp in due:
+            if steady_state.is_steady_state(exp):
+                # Evolves with every contribution (see steady_state.py)
+                exp.advance_due_at = None
+                db.commit()
+                continue
             print(f"Processing experiment {exp.id} (generation {exp.current_generation})")
             
             result = experiments.advance_experiment_generation(db, exp.id)
+            if not result or result.get("status") not in ("success", "completed"):
+                # Nothing to advance with; the next contribution arms it again
+                db.refresh(exp)
+                exp.advance_due_at = None
+                db.commit()
             
             cleanup_result = cleanup_orphaned_genomes(db, exp.id)
             if cleanup_result and "deleted_count" in cleanup_result:
@@ -951,23 +1618,96 @@ def periodic_generation_update():
     finally:
         db.close()
 
-# Set up the scheduler to run every n minutes
-scheduler = BackgroundScheduler()
-scheduler.add_job(periodic_generation_update, 'interval', minutes=schedule_time)
-scheduler.start()
+def periodic_archive():
+    """Move experiments that completed a while ago into cold storage"""
+    db = next(get_db())
+    try:
+        for archive_result in archive.archive_due_experiments(db):
+            print(f"Archive result: {archive_result}")
+    except Exception as e:
+        print("Error in periodic_archive:", e)
+        traceback.print_exc()
+    finally:
+        db.close()
+
+# The scheduler is created by the application lifespan, not at import time
+scheduler = None
+
+def start_scheduler():
+    """Set up the scheduler to run every n minutes"""
+    global scheduler
+    
+    if scheduler is not None:
+        return scheduler
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(periodic_generation_update, 'interval', seconds=advancement.ADVANCE_CHECK_SECONDS)
+    scheduler.add_job(periodic_archive, 'interval', minutes=schedule_time)
+    scheduler.add_job(periodic_hibernation, 'interval', minutes=hibernation.HIBERNATION_CHECK_MINUTES)
+    scheduler.add_job(score_breakdowns.run_batch_job, 'interval', seconds=score_breakdowns.SCORE_BREAKDOWN_INTERVAL_SECONDS)
+    scheduler.start()
+    return scheduler
+
+def periodic_hibernation():
+    """Put experiments nobody contributed to for a while to sleep"""
+    db = next(get_db())
+    try:
+        dormant = hibernation.hibernate_idle(db)
+        if dormant:
+            print(f"Hibernated idle experiments: {dormant}")
+    except Exception as e:
+        print("Error in periodic_hibernation:", e)
+        traceback.print_exc()
+    finally:
+        db.close()
+
+def stop_scheduler():
+    global scheduler
+    
+    if scheduler is not None:
+        scheduler.shutdown()
+        scheduler = None
 
-@app.on_event("shutdown")
-def shutdown_event():
-    scheduler.shutdown()
+@app.get("/api/events")
+async def experiment_events(request: Request, token: str):
+    """
+    Server-Sent Events stream of experiment_advanced, experiment_completed
+    and best_score_changed events. The token is passed as a query parameter
+    because EventSource cannot send an Authorization header.
+    """
+    # Authenticate up front with a short-lived session; the stream itself holds no DB connection
+    db = database.SessionLocal()
+    try:
+        principal = auth.resolve_principal(token, db)
+    finally:
+        db.close()
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    
+    queue = events.broker.subscribe()
+    return StreamingResponse(
+        events.broker.stream(queue, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/experiments/{experiment_id}/generation/{generation}/contribution")
 def check_user_contribution(
     experiment_id: int,
     generation: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.UserPrincipal = Depends(auth.get_current_active_principal)
 ):
     """Check if the current user has already contributed to this experiment's generation"""
+    # The in-memory state answers for the current generation without touching the database
+    state = generation_state.registry.peek(experiment_id)
+    if state is not None and state.generation == generation:
+        if state.has_contributed(current_user.id):
+            return {
+                "has_contributed": True,
+                **advance_progress(db, db.get(models.Experiment, experiment_id))
+            }
+        return {"has_contributed": False}
+    
     # Check for existing contribution
     existing_contribution = db.query(models.Mutation).join(
         models.GenomeExperiment, 
@@ -981,7 +1721,7 @@ def check_user_contribution(
     if existing_contribution:
         return {
             "has_contributed": True,
-            "next_update": next_scheduled_update.isoformat()
+            **advance_progress(db, db.get(models.Experiment, experiment_id))
         }
     
     return {"has_contributed": False}
@@ -1005,7 +1745,7 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
             db_user = models.User(
                 email=user_info['email'],
                 username=user_info.get('name', user_info['email'].split('@')[0]),
-                hashed_password=auth.get_password_hash(os.urandom(24).hex())  # Random secure password
+                hashed_password=await auth.get_password_hash_async(os.urandom(24).hex())  # Random secure password
             )
             db.add(db_user)
             db.commit()
@@ -1029,7 +1769,6 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
 @app.post("/auth/forgot-password")
 async def forgot_password(
     email_data: schemas.PasswordResetRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Generate a password reset token and send a reset email"""
@@ -1051,43 +1790,19 @@ async def forgot_password(
     user.reset_token_expires = expires
     db.commit()
     
-    # Send the reset email as a background task
-    background_tasks.add_task(
-        send_password_reset_email, 
-        email_data.email, 
-        reset_token
-    )
+    # Hand the reset email to the mail dispatcher; delivery happens in the background
+    await send_password_reset_email(email_data.email, reset_token)
     
     return {"message": "If your email is registered, you will receive a password reset link"}
 
-def send_password_reset_email(email: str, token: str):
-    """Send password reset email with token using MailerSend API directly"""
+async def send_password_reset_email(email: str, token: str):
+    """Queue the password reset email on the mail dispatcher"""
     reset_url = f"http://localhost:3000/reset-password?token={token}"
     
-    try:
-        import requests
-        import json
-        
-        # MailerSend credentials - store these in environment variables
-        mailersend_api_key = os.getenv("MAILERSEND_API_KEY", "mlsn.73508ecd9eaf7f1a64c59cb054cdada396fd733e836342748c73064db8da2bbe")
-        mailersend_from_email = os.getenv("MAILERSEND_FROM_EMAIL", "info@tunebreeder.com")
-        
-        # MailerSend API endpoint
-        url = "https://api.mailersend.com/v1/email"
-        
-        # Email content
-        payload = {
-            "from": {
-                "email": mailersend_from_email,
-                "name": "TuneBreeder Support"
-            },
-            "to": [
-                {
-                    "email": email
-                }
-            ],
-            "subject": "TuneBreeder Password Reset",
-            "text": f"""
+    message = mailer.OutgoingEmail(
+        to=email,
+        subject="TuneBreeder Password Reset",
+        text=f"""
 Hello,
 
 You requested a password reset for your TuneBreeder account.
@@ -1101,7 +1816,7 @@ If you did not request a password reset, please ignore this email.
 Regards,
 TuneBreeder Team
             """,
-            "html": f"""
+        html=f"""
 <html>
     <body>
         <h2>TuneBreeder Password Reset</h2>
@@ -1115,33 +1830,12 @@ TuneBreeder Team
     </body>
 </html>
             """
-        }
-        
-        # Headers
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {mailersend_api_key}",
-            "X-Requested-With": "XMLHttpRequest"
-        }
-        
-        # Send the request
-        response = requests.post(url, headers=headers, json=payload)
-        
-        # Check response
-        if response.status_code == 202:
-            print(f"Password reset email sent to {email}, status code: {response.status_code}")
-        else:
-            print(f"Failed to send email. Status code: {response.status_code}, Response: {response.text}")
-            
-    except Exception as e:
-        print(f"Failed to send email: {str(e)}")
-        
-        # For development purposes, print the reset token to console
-        print("\n====== PASSWORD RESET ======")
-        print(f"Email: {email}")
-        print(f"Reset URL: {reset_url}")
-        print(f"Token: {token}")
-        print("============================\n")
+    )
+    
+    if not mailer.dispatcher.running:
+        await mailer.dispatcher.start()
+    if not mailer.dispatcher.enqueue(message):
+        print(f"Failed to queue password reset email for {email}")
 
 @app.post("/auth/reset-password")
 async def reset_password(
@@ -1159,7 +1853,7 @@ async def reset_password(
         raise HTTPException(status_code=400, detail="Invalid or expired token")
     
     # Update the password
-    user.hashed_password = auth.get_password_hash(reset_data.new_password)
+    user.hashed_password = await auth.get_password_hash_async(reset_data.new_password)
     
     # Clear the reset token
     user.reset_token = None
@@ -1167,4 +1861,7 @@ async def reset_password(
     
     db.commit()
     
+    # Drop any cached sessions for this account
+    auth.invalidate_user(user.email)
+    
     return {"message": "Password updated successfully"}
\ No newline at end of file
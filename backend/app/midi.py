@@ -0,0 +1,215 @@
+import io
+import json
+import os
+import struct
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+from . import genomes
+
+# Load environment variables
+load_dotenv()
+
+MIDI_CACHE_DIR = os.getenv("MIDI_CACHE_DIR", "./midi_cache")
+MIDI_CACHE_MAX_BYTES = int(os.getenv("MIDI_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+MIDI_RENDER_WORKERS = int(os.getenv("MIDI_RENDER_WORKERS", 2))
+MIDI_TEMPO_BPM = int(os.getenv("MIDI_TEMPO_BPM", 120))
+
+TICKS_PER_BEAT = 480
+# Bump whenever render_midi's output changes, so cached renders and ETags go stale
+MIDI_RENDER_VERSION = 2
+
+
+def _variable_length(value: int) -> bytes:
+    """Encode a MIDI variable-length quantity"""
+    buffer = [value & 0x7F]
+    value >>= 7
+    while value:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(buffer))
+
+
+def render_midi(genome_data: str, tempo_bpm: int = MIDI_TEMPO_BPM) -> bytes:
+    """
+    Render a genome (JSON list of {pitch, duration, velocity}) as a
+    single-track Standard MIDI File. Durations are in seconds, as the app
+    plays them; the tempo only sets the tick grid they are converted to.
+    """
+    notes = json.loads(genome_data)
+
+    track = bytearray()
+    # Tempo: microseconds per quarter note
+    track += _variable_length(0) + b"\xff\x51\x03" + struct.pack(">I", 60000000 // tempo_bpm)[1:]
+    # Acoustic grand piano on channel 0
+    track += _variable_length(0) + b"\xc0\x00"
+
+    ticks_per_second = tempo_bpm / 60 * TICKS_PER_BEAT
+    for note in notes:
+        pitch = max(0, min(127, int(note.get("pitch", 60))))
+        velocity = max(1, min(127, int(note.get("velocity", 80))))
+        ticks = max(1, int(round(float(note.get("duration", 0.5)) * ticks_per_second)))
+        track += _variable_length(0) + bytes([0x90, pitch, velocity])
+        track += _variable_length(ticks) + bytes([0x80, pitch, 0])
+
+    track += _variable_length(0) + b"\xff\x2f\x00"  # end of track
+
+    header = b"MThd" + struct.pack(">IHHH", 6, 0, 1, TICKS_PER_BEAT)
+    return header + b"MTrk" + struct.pack(">I", len(track)) + bytes(track)
+
+
+class MidiCache:
+    """
+    On-disk MIDI renders keyed by the genome's content hash.
+
+    Renders run in a process pool. Identical melodies (and finalized genomes,
+    which never change) are rendered once; concurrent requests for the same
+    content share one render. When the cache grows past its size limit the
+    least recently used files are evicted (file mtime is bumped on every hit).
+    """
+
+    def __init__(self, directory: str = MIDI_CACHE_DIR, max_bytes: int = MIDI_CACHE_MAX_BYTES,
+                 workers: int = MIDI_RENDER_WORKERS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._executor = None
+        self._inflight = {}
+        self._size = None
+        self._lock = threading.RLock()
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash[:2], f"{content_hash}.v{MIDI_RENDER_VERSION}.mid")
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _read_hit(self, path: str):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mark as recently used
+        return data
+
+    def _store(self, content_hash: str, data: bytes):
+        path = self._path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # atomic, readers never see partial files
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            over_limit = self._size > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def _cache_files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".mid"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_mtime, stat.st_size
+
+    def _scan_size(self):
+        return sum(size for _, _, size in self._cache_files())
+
+    def _evict(self):
+        """Drop least recently used renders until the cache is back under 90% of its limit"""
+        files = sorted(self._cache_files(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in files)
+        target = self.max_bytes * 0.9
+        for path, _, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._size = total
+
+    def get(self, genome_data: str) -> bytes:
+        """Return the MIDI render of a genome, rendering it at most once per content hash"""
+        content_hash = genomes.genome_content_hash(genome_data)
+        data = self._read_hit(self._path(content_hash))
+        if data is not None:
+            return data
+
+        with self._lock:
+            future = self._inflight.get(content_hash)
+            owner = future is None
+            if owner:
+                future = self._get_executor().submit(render_midi, genome_data)
+                self._inflight[content_hash] = future
+
+        try:
+            data = future.result()
+            if owner:
+                self._store(content_hash, data)
+            return data
+        finally:
+            if owner:
+                with self._lock:
+                    self._inflight.pop(content_hash, None)
+
+    def get_many(self, genome_datas):
+        """Render several genomes, sending all cache misses to the pool at once"""
+        results = [None] * len(genome_datas)
+        misses = {}
+        for i, genome_data in enumerate(genome_datas):
+            content_hash = genomes.genome_content_hash(genome_data)
+            data = self._read_hit(self._path(content_hash))
+            if data is not None:
+                results[i] = data
+            else:
+                misses.setdefault(content_hash, (genome_data, []))[1].append(i)
+
+        if misses:
+            hashes = list(misses)
+            rendered = self._get_executor().map(render_midi, [misses[h][0] for h in hashes])
+            for content_hash, data in zip(hashes, rendered):
+                self._store(content_hash, data)
+                for i in misses[content_hash][1]:
+                    results[i] = data
+        return results
+
+
+def build_zip(entries) -> bytes:
+    """Zip (filename, midi bytes) pairs into one archive"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, data in entries:
+            archive.writestr(filename, data)
+    return buffer.getvalue()
+
+
+def safe_filename(name: str) -> str:
+    cleaned = "".join(c if c.isalnum() or c in "-_ " else "_" for c in (name or "")).strip()
+    return cleaned or "melody"
+
+
+cache = MidiCache()
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, JSON, Text
+from sqlalchemy import BigInteger, Boolean, Column, ForeignKey, Integer, String, Float, DateTime, JSON, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -15,6 +15,8 @@ class User(Base):
     
     # Add this to track user statistics
     contribution_count = Column(Integer, default=0)
+    # Mutations that were moved to the archive along with their experiment
+    archived_contribution_count = Column(Integer, default=0)
     
     # Relationships
     mutations = relationship("Mutation", back_populates="user")
@@ -22,22 +24,68 @@ class User(Base):
     reset_token = Column(String, nullable=True)
     reset_token_expires = Column(DateTime, nullable=True)
 
+class GenomePayload(Base):
+    """Note data shared by every genome with the same notes, keyed by content hash"""
+    __tablename__ = "genome_payloads"
+
+    hash = Column(String(64), primary_key=True)
+    data = Column(Text, nullable=False)  # JSON string representation of the notes
+    ref_count = Column(Integer, default=0, nullable=False)  # genomes pointing at this payload
+    heuristic_score = Column(Float, nullable=True)  # cached genomes.heuristic_score of the notes
+    heuristic_score_version = Column(Integer, nullable=True)  # HEURISTIC_SCORER_VERSION it was computed with
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class HeuristicBreakdown(Base):
+    """heuristic_score split into its components, per distinct set of notes (see score_breakdowns.py)"""
+    __tablename__ = "heuristic_breakdowns"
+
+    hash = Column(String(64), ForeignKey("genome_payloads.hash"), primary_key=True)
+    scorer_version = Column(Integer, nullable=False, index=True)  # HEURISTIC_SCORER_VERSION it was computed with
+    pitch = Column(Float, nullable=True)
+    rhythm = Column(Float, nullable=True)
+    contour = Column(Float, nullable=True)
+    phrase = Column(Float, nullable=True)
+    interval = Column(Float, nullable=True)
+    total = Column(Float, nullable=False, index=True)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
 class Genome(Base):
     __tablename__ = "genomes"
 
     id = Column(Integer, primary_key=True, index=True)
     generation = Column(Integer)
-    data = Column(Text)  # JSON string representation of the genome
+    legacy_data = Column("data", Text, nullable=True)  # only rows written before payload dedup
+    payload_hash = Column(String(64), ForeignKey("genome_payloads.hash"), nullable=True, index=True)
     score = Column(Float, default=50.0)
     user_scored = Column(Boolean, default=False)  # True if user scored, False if heuristic
+    predicted_score = Column(Float, nullable=True)  # surrogate model's estimate, for selection only (see surrogate.py)
     parent1_id = Column(Integer, ForeignKey("genomes.id"), nullable=True)
     parent2_id = Column(Integer, ForeignKey("genomes.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
+    payload = relationship("GenomePayload", lazy="joined")
     mutations = relationship("Mutation", back_populates="genome")
     saved_by = relationship("SavedMelody", back_populates="genome")
 
+    @property
+    def data(self):
+        """JSON string representation of the genome"""
+        pending = self.__dict__.get("_pending_data")
+        if pending is not None:
+            return pending
+        if self.payload is not None:
+            return self.payload.data
+        return self.legacy_data
+
+    @data.setter
+    def data(self, value):
+        # Interned into genome_payloads on flush (see payloads.py); touching
+        # legacy_data marks the genome dirty so the flush hook sees it
+        self._pending_data = value
+        self.legacy_data = None
+
 
 class Mutation(Base):
     __tablename__ = "mutations"
@@ -82,10 +130,50 @@ class Experiment(Base):
     final_piece_name = Column(String, nullable=True)
     final_genome_id = Column(Integer, ForeignKey("genomes.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    archived_at = Column(DateTime, nullable=True)  # set once its genomes moved to cold storage
+    # Mutations that were moved to the archive; NULL for an experiment archived before this was recorded
+    archived_contribution_count = Column(Integer, default=0, nullable=True)
+    rng_seed = Column(BigInteger, nullable=True)  # root of the experiment's random streams (see rng_streams.py)
+    # Breeding operators, names from operators.SELECTION_OPERATORS / CROSSOVER_OPERATORS
+    selection_operator = Column(String, default="elitist", nullable=True)
+    crossover_operator = Column(String, default="midpoint", nullable=True)
+    # "generational" or "steady_state" (see steady_state.py)
+    evolution_mode = Column(String, default="generational", nullable=True)
+    steady_state_births = Column(Integer, default=0, nullable=True)  # children bred in steady-state mode
+    # Advance policy, NULL = environment default (see advancement.py)
+    advance_after_scores = Column(Integer, nullable=True)
+    advance_after_fraction = Column(Float, nullable=True)
+    advance_max_wait_seconds = Column(Integer, nullable=True)
+    # Current generation's contribution counter and max-wait deadline (NULL until its first contribution)
+    generation_contributions = Column(Integer, default=0, nullable=True)
+    generation_started_at = Column(DateTime, default=datetime.utcnow, nullable=True)
+    advance_due_at = Column(DateTime, nullable=True, index=True)
+    # Hibernation (see hibernation.py): last contribution or wake-up, and since when it has been dormant
+    last_active_at = Column(DateTime, nullable=True)
+    dormant_since = Column(DateTime, nullable=True, index=True)
     
     # Link genomes to experiments
     genomes = relationship("GenomeExperiment", back_populates="experiment")
 
+class GenerationDiversity(Base):
+    """Diversity of an experiment's population, measured when it was bred from (see diversity.py)"""
+    __tablename__ = "generation_diversity"
+
+    id = Column(Integer, primary_key=True, index=True)
+    experiment_id = Column(Integer, ForeignKey("experiments.id"), nullable=False, index=True)
+    generation = Column(Integer, nullable=False)
+    steady_state_births = Column(Integer, nullable=True)  # steady-state snapshots: children bred so far
+    genomes = Column(Integer, nullable=False)
+    mean_pairwise_distance = Column(Float, nullable=False)
+    mean_hamming_distance = Column(Float, nullable=False)
+    unique_ratio = Column(Float, nullable=False)
+    positional_entropy = Column(Float, nullable=False)
+    # Mutation the adaptive controller chose for the children (NULL when none were bred)
+    mutation_rate = Column(Float, nullable=True)
+    mutation_strength = Column(Float, nullable=True)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
 class GenomeExperiment(Base):
     __tablename__ = "genome_experiments"
     
@@ -93,7 +181,11 @@ class GenomeExperiment(Base):
     genome_id = Column(Integer, ForeignKey("genomes.id"))
     experiment_id = Column(Integer, ForeignKey("experiments.id"))
     generation = Column(Integer)
+    replaced_at = Column(DateTime, nullable=True)  # set when a steady-state child took its place
     
     # Relationships
     genome = relationship("Genome")
-    experiment = relationship("Experiment", back_populates="genomes")
\ No newline at end of file
+    experiment = relationship("Experiment", back_populates="genomes")
+
+# Registers the flush hook that stores Genome.data in genome_payloads
+from . import payloads  # noqa: E402,F401
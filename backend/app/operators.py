@@ -0,0 +1,306 @@
+"""
+Selection and crossover operators, selectable per experiment.
+
+Operators work on whole batches with NumPy:
+
+- a selection operator takes the population's fitness (one score per
+  genome) and returns an (n_pairs, 2) array of parent indexes, two
+  different parents per row whenever the population has two genomes;
+- a crossover operator takes two (n_pairs, length, NOTE_FIELDS) arrays of
+  parents and returns the children in one array of the same shape.
+
+Experiment.selection_operator and Experiment.crossover_operator name entries
+of SELECTION_OPERATORS and CROSSOVER_OPERATORS. The defaults, elitist and
+midpoint, are the original breeding scheme: parents drawn uniformly from the
+top TOP_GENOMES_TO_CROSSOVER genomes, first half of one plus second half of
+the other.
+
+Microbenchmarks: python -m benchmarks.bench_operators
+"""
+import json
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+from . import genomes
+
+# Load environment variables
+load_dotenv()
+
+TOURNAMENT_SIZE = int(os.getenv("TOURNAMENT_SIZE", 3))
+# Linear ranking: the best genome is this many times as likely to be picked as the median one
+RANK_SELECTION_PRESSURE = float(os.getenv("RANK_SELECTION_PRESSURE", 1.5))
+
+DEFAULT_SELECTION = "elitist"
+DEFAULT_CROSSOVER = "midpoint"
+
+# Note fields, in array order
+NOTE_FIELDS = ("pitch", "duration", "velocity")
+NOTE_DEFAULTS = (60, 0.5, 80)
+# Redraws of a second parent that collided with the first before forcing a different one
+MAX_REDRAWS = 8
+
+
+class UnknownOperatorError(ValueError):
+    pass
+
+
+# Encoding
+
+def encode_genome(genome_data: str) -> np.ndarray:
+    """Genome JSON string -> float array (length, NOTE_FIELDS)"""
+    notes = json.loads(genome_data)
+    encoded = np.empty((len(notes), len(NOTE_FIELDS)), dtype=np.float64)
+    for j, (field, default) in enumerate(zip(NOTE_FIELDS, NOTE_DEFAULTS)):
+        encoded[:, j] = [note.get(field, default) for note in notes]
+    return encoded
+
+
+def encode_genomes(genome_datas) -> np.ndarray:
+    """
+    Genome JSON strings of one length -> float array (n, length, NOTE_FIELDS).
+    Melodies of other lengths are cut to the shortest: only for batches known
+    to share a length (breeding goes through crossover_pairs, which doesn't cut).
+    """
+    encoded = [encode_genome(genome_data) for genome_data in genome_datas]
+    length = min((len(notes) for notes in encoded), default=0)
+    batch = np.empty((len(encoded), length, len(NOTE_FIELDS)), dtype=np.float64)
+    for i, notes in enumerate(encoded):
+        batch[i] = notes[:length]
+    return batch
+
+
+def decode_genomes(encoded: np.ndarray):
+    """Inverse of encode_genomes: one genome JSON string per row"""
+    return genomes.population_to_json(
+        encoded[:, :, 0].astype(np.int64),
+        encoded[:, :, 1],
+        encoded[:, :, 2].astype(np.int64),
+    )
+
+
+# Selection
+
+def _alias_table(weights: np.ndarray):
+    """Vose's alias method: O(n) setup, then O(1) per sample"""
+    n = len(weights)
+    total = weights.sum()
+    scaled = weights * n / total if total > 0 else np.ones(n)
+    probability = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1.0]
+    large = [i for i in range(n) if scaled[i] >= 1.0]
+    while small and large:
+        low, high = small.pop(), large.pop()
+        probability[low] = scaled[low]
+        alias[low] = high
+        scaled[high] -= 1.0 - scaled[low]
+        (small if scaled[high] < 1.0 else large).append(high)
+    return probability, alias
+
+
+def _alias_sample(table, size, rng: np.random.Generator):
+    probability, alias = table
+    column = rng.integers(len(probability), size=size)
+    return np.where(rng.random(size) < probability[column], column, alias[column])
+
+
+def _pair_up(draw, n: int, n_pairs: int, rng: np.random.Generator):
+    """Two draws per pair from draw(size), redrawing second parents that equal the first"""
+    first = draw(n_pairs)
+    second = draw(n_pairs)
+    if n < 2:
+        return np.stack([first, second], axis=1)
+    for _ in range(MAX_REDRAWS):
+        clash = first == second
+        if not clash.any():
+            break
+        second[clash] = draw(int(clash.sum()))
+    # Degenerate distributions (all weight on one genome): any other genome, uniformly
+    clash = first == second
+    second[clash] = (first[clash] + rng.integers(1, n, size=int(clash.sum()))) % n
+    return np.stack([first, second], axis=1)
+
+
+def elitist_selection(fitness: np.ndarray, n_pairs: int, rng: np.random.Generator,
+                      top: int = genomes.TOP_GENOMES_TO_CROSSOVER):
+    """Parents uniformly from the `top` fittest genomes (the original scheme)"""
+    order = np.argsort(-fitness, kind="stable")[:top]
+    k = len(order)
+    first = rng.integers(k, size=n_pairs)
+    # A different elite for the second parent in O(1): shift by 1..k-1
+    second = (first + rng.integers(1, k, size=n_pairs)) % k if k > 1 else first
+    return order[np.stack([first, second], axis=1)]
+
+
+def tournament_selection(fitness: np.ndarray, n_pairs: int, rng: np.random.Generator,
+                         size: int = TOURNAMENT_SIZE):
+    """Each parent is the fittest of `size` genomes drawn at random"""
+    n = len(fitness)
+
+    def draw(count):
+        entrants = rng.integers(n, size=(count, size))
+        return entrants[np.arange(count), np.argmax(fitness[entrants], axis=1)]
+
+    return _pair_up(draw, n, n_pairs, rng)
+
+
+def fitness_proportional_selection(fitness: np.ndarray, n_pairs: int, rng: np.random.Generator):
+    """Roulette wheel: probability proportional to fitness (shifted to be non-negative)"""
+    weights = fitness - min(0.0, fitness.min()) if len(fitness) else fitness
+    table = _alias_table(np.asarray(weights, dtype=np.float64))
+    return _pair_up(lambda count: _alias_sample(table, count, rng), len(fitness), n_pairs, rng)
+
+
+def rank_selection(fitness: np.ndarray, n_pairs: int, rng: np.random.Generator,
+                   pressure: float = RANK_SELECTION_PRESSURE):
+    """Linear ranking: probability depends on rank only, so outlier scores don't dominate"""
+    n = len(fitness)
+    ranks = np.empty(n)
+    ranks[np.argsort(fitness, kind="stable")] = np.arange(n)  # 0 = worst
+    # Weights from 2 - pressure (worst) to pressure (best)
+    weights = (2 - pressure) + 2 * (pressure - 1) * ranks / max(1, n - 1)
+    table = _alias_table(np.maximum(weights, 0.0))
+    return _pair_up(lambda count: _alias_sample(table, count, rng), n, n_pairs, rng)
+
+
+# Crossover
+
+def _combine(first: np.ndarray, second: np.ndarray, from_first: np.ndarray):
+    """Children taking each note from the first parent where from_first is set"""
+    return np.where(from_first[:, :, None], first, second)
+
+
+def midpoint_crossover(first: np.ndarray, second: np.ndarray, rng: np.random.Generator):
+    """First half of one parent, second half of the other (the original genomes.crossover)"""
+    length = first.shape[1]
+    return _combine(first, second, np.broadcast_to(np.arange(length) < length // 2, first.shape[:2]))
+
+
+def one_point_crossover(first: np.ndarray, second: np.ndarray, rng: np.random.Generator):
+    n_pairs, length = first.shape[:2]
+    cut = rng.integers(1, max(2, length), size=n_pairs)
+    return _combine(first, second, np.arange(length) < cut[:, None])
+
+
+def two_point_crossover(first: np.ndarray, second: np.ndarray, rng: np.random.Generator):
+    """The second parent's notes between two cut points, the first parent's elsewhere"""
+    n_pairs, length = first.shape[:2]
+    cuts = np.sort(rng.integers(0, length + 1, size=(n_pairs, 2)), axis=1)
+    positions = np.arange(length)
+    inside = (positions >= cuts[:, :1]) & (positions < cuts[:, 1:])
+    return _combine(first, second, ~inside)
+
+
+def uniform_crossover(first: np.ndarray, second: np.ndarray, rng: np.random.Generator):
+    """Every note from either parent with equal probability"""
+    return _combine(first, second, rng.random(first.shape[:2]) < 0.5)
+
+
+def phrase_aligned_crossover(first: np.ndarray, second: np.ndarray, rng: np.random.Generator):
+    """Whole phrases (genomes.PHRASE_LENGTH notes) from either parent, so no phrase is cut in two"""
+    n_pairs, length = first.shape[:2]
+    phrases = -(-length // genomes.PHRASE_LENGTH)
+    if phrases < 2:
+        return midpoint_crossover(first, second, rng)
+    from_first = rng.random((n_pairs, phrases)) < 0.5
+    # At least one phrase from each parent
+    same = from_first.all(axis=1) | ~from_first.any(axis=1)
+    flip = rng.integers(phrases, size=n_pairs)
+    from_first[same, flip[same]] = ~from_first[same, flip[same]]
+    return _combine(first, second, np.repeat(from_first, genomes.PHRASE_LENGTH, axis=1)[:, :length])
+
+
+SELECTION_OPERATORS = {
+    "elitist": elitist_selection,
+    "tournament": tournament_selection,
+    "fitness_proportional": fitness_proportional_selection,
+    "rank": rank_selection,
+}
+
+CROSSOVER_OPERATORS = {
+    "midpoint": midpoint_crossover,
+    "one_point": one_point_crossover,
+    "two_point": two_point_crossover,
+    "uniform": uniform_crossover,
+    "phrase_aligned": phrase_aligned_crossover,
+}
+
+
+def get_selection(name: str = None):
+    try:
+        return SELECTION_OPERATORS[name or DEFAULT_SELECTION]
+    except KeyError:
+        raise UnknownOperatorError(
+            f"Unknown selection operator '{name}'. Expected one of: {', '.join(SELECTION_OPERATORS)}"
+        )
+
+
+def get_crossover(name: str = None):
+    try:
+        return CROSSOVER_OPERATORS[name or DEFAULT_CROSSOVER]
+    except KeyError:
+        raise UnknownOperatorError(
+            f"Unknown crossover operator '{name}'. Expected one of: {', '.join(CROSSOVER_OPERATORS)}"
+        )
+
+
+def _cross_unequal(cross, first: np.ndarray, second: np.ndarray, rng: np.random.Generator):
+    """
+    One pair of parents of different lengths: crossover over the notes both
+    have, then the rest of the longer parent, so a short parent doesn't cut
+    the child short (like the original per-pair crossover, where the longer
+    second parent's notes carried on)
+    """
+    common = min(len(first), len(second))
+    child = cross(first[None, :common], second[None, :common], rng)[0]
+    longer = first if len(first) > len(second) else second
+    return np.concatenate([child, longer[common:]])
+
+
+def crossover_pairs(parent_datas, pairs: np.ndarray, rng: np.random.Generator, crossover: str = None):
+    """
+    Cross over parent pairs ((n, 2) indexes into parent_datas); returns one
+    child genome JSON string per pair.
+
+    Pairs whose parents have the same length are crossed in one batch per
+    length (one batch when, as usual, the whole experiment shares a length).
+    Pairs of parents of different lengths are crossed one by one.
+    """
+    cross = get_crossover(crossover)
+    pairs = np.asarray(pairs).reshape(-1, 2)
+    # Only parse the genomes that were actually selected
+    selected, rows = np.unique(pairs, return_inverse=True)
+    rows = rows.reshape(pairs.shape)
+    encoded = [encode_genome(parent_datas[i]) for i in selected.tolist()]
+    lengths = np.array([len(notes) for notes in encoded], dtype=np.int64)
+    first_lengths, second_lengths = lengths[rows[:, 0]], lengths[rows[:, 1]]
+
+    children = [None] * len(pairs)
+    same = first_lengths == second_lengths
+    for length in np.unique(first_lengths[same]).tolist():
+        group = np.flatnonzero(same & (first_lengths == length))
+        members = np.flatnonzero(lengths == length)
+        position = np.zeros(len(encoded), dtype=np.int64)  # selected parent -> row of stacked
+        position[members] = np.arange(len(members))
+        stacked = np.stack([encoded[i] for i in members.tolist()])
+        first, second = stacked[position[rows[group, 0]]], stacked[position[rows[group, 1]]]
+        for i, child in zip(group.tolist(), decode_genomes(cross(first, second, rng))):
+            children[i] = child
+    for i in np.flatnonzero(~same).tolist():
+        child = _cross_unequal(cross, encoded[rows[i, 0]], encoded[rows[i, 1]], rng)
+        children[i] = decode_genomes(child[None])[0]
+    return children
+
+
+def breed(parent_datas, fitness, n_children: int, rng: np.random.Generator,
+          selection: str = None, crossover: str = None):
+    """
+    Select n_children parent pairs from a population and cross them over.
+
+    Returns (children as genome JSON strings, (n_children, 2) parent indexes
+    into parent_datas).
+    """
+    pairs = get_selection(selection)(np.asarray(fitness, dtype=np.float64), n_children, rng)
+    return crossover_pairs(parent_datas, pairs, rng, crossover), pairs
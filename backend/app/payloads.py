@@ -0,0 +1,220 @@
+"""
+Content-addressed storage of genome notes.
+
+Genome.data is not stored on the genome row: on flush its notes are hashed
+and interned into genome_payloads, and the genome keeps only the hash.
+Identical children (and the many duplicates in a converged population)
+share one row, along with anything derived from the notes and cached on
+it, e.g. the heuristic score or the MIDI render keyed by the same hash.
+
+Each payload counts the genomes pointing at it. The flush hook keeps the
+count right for ORM inserts, updates and deletes; code that deletes genomes
+with a bulk query.delete() must call release() for them first.
+"""
+import hashlib
+import json
+
+from sqlalchemy import String, cast, event, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+
+def content_hash(genome_data: str) -> str:
+    """SHA-256 of the notes as canonical JSON, so formatting differences don't matter"""
+    try:
+        canonical = json.dumps(json.loads(genome_data), sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        canonical = genome_data or ""
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _insert_payloads(session, rows):
+    """
+    Insert payload rows unless they exist. Another session may insert the
+    same notes at the same time; its row wins and ours is skipped instead of
+    failing the flush with an IntegrityError.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        for chunk in _chunks(rows, CHUNK_SIZE // len(rows[0])):
+            session.execute(upsert(models.GenomePayload).values(chunk).on_conflict_do_nothing(index_elements=["hash"]))
+        return
+    for row in rows:
+        try:
+            with session.begin_nested():
+                session.execute(insert(models.GenomePayload).values(**row))
+        except IntegrityError:
+            pass
+
+
+@event.listens_for(Session, "before_flush")
+def intern_genome_payloads(session, flush_context, instances):
+    """Point new and re-written genomes at a shared payload and keep reference counts up to date"""
+    pending = [
+        genome for genome in list(session.new) + list(session.dirty)
+        if isinstance(genome, models.Genome) and genome.__dict__.get("_pending_data") is not None
+    ]
+    deleted = [genome for genome in session.deleted if isinstance(genome, models.Genome)]
+    if not pending and not deleted:
+        return
+
+    deltas = {}
+    hashes = {}
+    for genome in pending:
+        hashes[genome] = content_hash(genome.__dict__["_pending_data"])
+        deltas[hashes[genome]] = deltas.get(hashes[genome], 0) + 1
+        if genome.payload_hash is not None:
+            deltas[genome.payload_hash] = deltas.get(genome.payload_hash, 0) - 1
+    for genome in deleted:
+        if genome.payload_hash is not None:
+            deltas[genome.payload_hash] = deltas.get(genome.payload_hash, 0) - 1
+
+    def load_existing():
+        found = {}
+        for chunk in _chunks(deltas):
+            for payload in session.query(models.GenomePayload).filter(models.GenomePayload.hash.in_(chunk)):
+                found[payload.hash] = payload
+        return found
+
+    with session.no_autoflush:
+        existing = load_existing()
+        missing = {}
+        for genome in pending:
+            if hashes[genome] not in existing:
+                missing.setdefault(hashes[genome], genome.__dict__["_pending_data"])
+        if missing:
+            _insert_payloads(session, [
+                {"hash": payload_hash, "data": data, "ref_count": 0} for payload_hash, data in missing.items()
+            ])
+            existing = load_existing()
+
+        for genome in pending:
+            genome.payload = existing[hashes[genome]]
+            del genome.__dict__["_pending_data"]
+
+    for payload_hash, delta in deltas.items():
+        payload = existing.get(payload_hash)
+        if payload is None or delta == 0:
+            continue
+        # Relative update, so concurrent sessions don't overwrite each other's counts
+        payload.ref_count = models.GenomePayload.ref_count + delta
+
+
+def release(db: Session, genome_ids):
+    """
+    Drop the references held by genomes that are about to be bulk-deleted.
+    Does not commit; call collect_garbage() once the genomes are gone.
+    """
+    released = {}
+    for chunk in _chunks(genome_ids):
+        rows = db.query(models.Genome.payload_hash, func.count(models.Genome.id)).filter(
+            models.Genome.id.in_(chunk),
+            models.Genome.payload_hash != None
+        ).group_by(models.Genome.payload_hash).all()
+        for payload_hash, count in rows:
+            released[payload_hash] = released.get(payload_hash, 0) + count
+
+    for payload_hash, count in released.items():
+        db.query(models.GenomePayload).filter(models.GenomePayload.hash == payload_hash).update(
+            {models.GenomePayload.ref_count: models.GenomePayload.ref_count - count},
+            synchronize_session=False
+        )
+    return released
+
+
+def collect_garbage(db: Session):
+    """Delete payloads that no genome references. Call after the genomes are gone."""
+    unreferenced = db.query(models.GenomePayload.hash).filter(models.GenomePayload.ref_count <= 0)
+    db.query(models.HeuristicBreakdown).filter(
+        models.HeuristicBreakdown.hash.in_(unreferenced)
+    ).delete(synchronize_session=False)
+    return db.query(models.GenomePayload).filter(
+        models.GenomePayload.ref_count <= 0
+    ).delete(synchronize_session=False)
+
+
+def dedup_stats(db: Session, experiment_id: int):
+    """How much storage payload sharing saves in one experiment, overall and per generation"""
+    # Genomes from before deduplication have no payload; each counts as its own copy
+    payload_key = func.coalesce(models.Genome.payload_hash, "legacy:" + cast(models.Genome.id, String))
+    data_length = func.length(func.coalesce(models.GenomePayload.data, models.Genome.legacy_data))
+
+    rows = db.query(
+        models.GenomeExperiment.generation,
+        func.count(models.Genome.id),
+        func.count(func.distinct(payload_key)),
+    ).join(
+        models.Genome,
+        models.Genome.id == models.GenomeExperiment.genome_id
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment_id
+    ).group_by(
+        models.GenomeExperiment.generation
+    ).order_by(
+        models.GenomeExperiment.generation
+    ).all()
+
+    genome_count, unique_count, logical_bytes = db.query(
+        func.count(models.Genome.id),
+        func.count(func.distinct(payload_key)),
+        func.coalesce(func.sum(data_length), 0),
+    ).select_from(models.GenomeExperiment).join(
+        models.Genome,
+        models.Genome.id == models.GenomeExperiment.genome_id
+    ).outerjoin(
+        models.GenomePayload,
+        models.GenomePayload.hash == models.Genome.payload_hash
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment_id
+    ).one()
+
+    # Bytes actually stored: each distinct payload once, plus legacy rows
+    distinct_payloads = db.query(models.Genome.payload_hash).join(
+        models.GenomeExperiment,
+        models.GenomeExperiment.genome_id == models.Genome.id
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment_id,
+        models.Genome.payload_hash != None
+    ).distinct().subquery()
+    payload_bytes = db.query(func.coalesce(func.sum(func.length(models.GenomePayload.data)), 0)).filter(
+        models.GenomePayload.hash.in_(db.query(distinct_payloads.c.payload_hash))
+    ).scalar()
+    legacy_bytes = db.query(func.coalesce(func.sum(func.length(models.Genome.legacy_data)), 0)).join(
+        models.GenomeExperiment,
+        models.GenomeExperiment.genome_id == models.Genome.id
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment_id,
+        models.Genome.payload_hash == None
+    ).scalar()
+    stored_bytes = payload_bytes + legacy_bytes
+
+    return {
+        "experiment_id": experiment_id,
+        "genomes": genome_count,
+        "unique_payloads": unique_count,
+        "dedup_ratio": round(genome_count / unique_count, 3) if unique_count else 1.0,
+        "logical_bytes": logical_bytes,
+        "stored_bytes": stored_bytes,
+        "generations": [
+            {
+                "generation": generation,
+                "genomes": count,
+                "unique_payloads": unique,
+                "dedup_ratio": round(count / unique, 3) if unique else 1.0,
+            }
+            for generation, count, unique in rows
+        ],
+    }
@@ -0,0 +1,60 @@
+"""
+Per-experiment random number streams.
+
+Every experiment stores a root seed (Experiment.rng_seed). Each random
+decision of its evolution draws from a stream derived from that seed, the
+generation and what the stream is for, via NumPy's SeedSequence spawn keys:
+
+    SeedSequence(entropy=rng_seed, spawn_key=(generation, stream))
+
+Streams don't depend on the global random state, on each other, or on the
+order in which experiments are processed. Replaying an experiment with the
+same seed and the same human scores reproduces it exactly, and parallel
+workers advancing different experiments (or generations) never share state.
+"""
+import random
+import secrets
+
+import numpy as np
+
+from . import models
+
+# What a stream is used for (the second spawn-key component)
+INITIAL_POPULATION = 0
+BREEDING = 1
+SELECTION = 2
+# Steady-state experiments: the first spawn-key component is the birth number instead
+STEADY_STATE_SELECTION = 3
+STEADY_STATE_BREEDING = 4
+# Generational experiments: which surrogate-screened candidates are kept at random
+SCREENING = 5
+
+
+def new_seed() -> int:
+    """A fresh root seed; 63 bits so it fits a signed BIGINT column"""
+    return secrets.randbits(63)
+
+
+def ensure_seed(experiment: models.Experiment) -> int:
+    """The experiment's root seed, assigning one to experiments created before seeding (caller commits)"""
+    if experiment.rng_seed is None:
+        experiment.rng_seed = new_seed()
+    return experiment.rng_seed
+
+
+def seed_sequence(experiment: models.Experiment, generation: int, stream: int) -> np.random.SeedSequence:
+    return np.random.SeedSequence(entropy=ensure_seed(experiment), spawn_key=(generation, stream))
+
+
+def numpy_rng(experiment: models.Experiment, generation: int, stream: int) -> np.random.Generator:
+    """NumPy Generator for one stream of one generation"""
+    return np.random.default_rng(seed_sequence(experiment, generation, stream))
+
+
+def python_rng(experiment: models.Experiment, generation: int, stream: int) -> random.Random:
+    """
+    random.Random for one stream of one generation, for code written against
+    the stdlib API (choice, sample, ...) whose results go into JSON
+    """
+    state = seed_sequence(experiment, generation, stream).generate_state(4, np.uint32)
+    return random.Random(int.from_bytes(state.tobytes(), "little"))
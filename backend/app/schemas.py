@@ -100,6 +100,21 @@ class ExperimentUpdate(BaseModel):
     final_piece_name: Optional[str] = None
     final_genome_id: Optional[int] = None
 
+class ExperimentOperators(BaseModel):
+    """Breeding operators of an experiment; omitted fields are left unchanged"""
+    selection_operator: Optional[str] = None
+    crossover_operator: Optional[str] = None
+
+class ExperimentEvolutionMode(BaseModel):
+    """generational (the default) or steady_state"""
+    evolution_mode: str
+
+class ExperimentAdvancePolicy(BaseModel):
+    """When a generation advances; omitted fields are left unchanged, 0 turns a trigger off"""
+    advance_after_scores: Optional[int] = None
+    advance_after_fraction: Optional[float] = None
+    advance_max_wait_seconds: Optional[int] = None
+
 class ExperimentInDB(ExperimentBase):
     id: int
     current_generation: int
@@ -107,6 +122,10 @@ class ExperimentInDB(ExperimentBase):
     completed: bool
     final_piece_name: Optional[str] = None
     final_genome_id: Optional[int] = None
+    rng_seed: Optional[int] = None
+    selection_operator: Optional[str] = None
+    crossover_operator: Optional[str] = None
+    evolution_mode: Optional[str] = None
     created_at: datetime
 
     class Config:
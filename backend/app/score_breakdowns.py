@@ -0,0 +1,212 @@
+"""
+Heuristic score components stored for analytics.
+
+heuristic_score adds up five components (pitch, rhythm, contour, phrase,
+interval). A background job (run_batch_job, scheduled by main) computes them
+once per distinct set of notes and stores them in heuristic_breakdowns next
+to the genome's payload, tagged with HEURISTIC_SCORER_VERSION. The
+per-experiment and per-generation aggregates are then plain SQL over those
+numeric columns; nothing is re-parsed or re-scored at query time.
+
+When an experiment is archived its per-generation aggregates go to the
+archive with it (computed under the scorer version of the time), so the
+analytics keep working afterwards.
+"""
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from . import models, genomes, archive, score_cache
+from .database import SessionLocal
+
+# Load environment variables
+load_dotenv()
+
+SCORE_BREAKDOWN_BATCH_SIZE = int(os.getenv("SCORE_BREAKDOWN_BATCH_SIZE", 500))
+SCORE_BREAKDOWN_INTERVAL_SECONDS = int(os.getenv("SCORE_BREAKDOWN_INTERVAL_SECONDS", 60))
+
+# Stored columns: the components plus their combined score
+COLUMNS = genomes.HEURISTIC_COMPONENTS + ("total",)
+
+
+def compute_pending(db: Session, experiment_id: int = None, batch_size: int = SCORE_BREAKDOWN_BATCH_SIZE):
+    """
+    Compute the breakdown of every payload that has none yet (or one from an
+    older scorer version), optionally only those of one experiment. Commits
+    after each batch and returns how many breakdowns were written.
+    """
+    version = genomes.HEURISTIC_SCORER_VERSION
+    query = db.query(models.GenomePayload, models.HeuristicBreakdown).outerjoin(
+        models.HeuristicBreakdown,
+        models.HeuristicBreakdown.hash == models.GenomePayload.hash
+    ).filter(
+        or_(models.HeuristicBreakdown.hash == None, models.HeuristicBreakdown.scorer_version != version)
+    )
+    if experiment_id is not None:
+        query = query.filter(models.GenomePayload.hash.in_(
+            db.query(models.Genome.payload_hash).join(
+                models.GenomeExperiment,
+                models.GenomeExperiment.genome_id == models.Genome.id
+            ).filter(models.GenomeExperiment.experiment_id == experiment_id)
+        ))
+
+    written = 0
+    last_hash = ""
+    while True:
+        # Keyset pagination, so a payload that fails to score is skipped rather than retried forever
+        batch = query.filter(
+            models.GenomePayload.hash > last_hash
+        ).order_by(models.GenomePayload.hash).limit(batch_size).all()
+        if not batch:
+            break
+        last_hash = batch[-1][0].hash
+
+        for payload, breakdown in batch:
+            try:
+                components = genomes.heuristic_components(payload.data)
+            except Exception as e:
+                print(f"Error scoring payload {payload.hash}: {e}")
+                continue
+            # A current cached score is reused; otherwise the components' total is cached
+            total = score_cache.cache.score(
+                payload.data, payload,
+                compute=lambda _: genomes.combine_heuristic_components(components) if components is not None else 50.0
+            )
+
+            if breakdown is None:
+                breakdown = models.HeuristicBreakdown(hash=payload.hash)
+                db.add(breakdown)
+            breakdown.scorer_version = version
+            for name in genomes.HEURISTIC_COMPONENTS:
+                setattr(breakdown, name, components[name] if components is not None else None)
+            breakdown.total = total
+            written += 1
+        db.commit()
+    return written
+
+
+def run_batch_job():
+    """Scheduler entry point: compute every pending breakdown"""
+    db = SessionLocal()
+    try:
+        written = compute_pending(db)
+        if written:
+            print(f"Computed {written} heuristic score breakdowns")
+    except Exception as e:
+        db.rollback()
+        print(f"Error computing heuristic score breakdowns: {e}")
+    finally:
+        db.close()
+
+
+def generation_summaries(db: Session, experiment_id: int, generation: int = None):
+    """
+    Mean, min and max of every component per generation of a hot
+    experiment. Genomes whose breakdown the batch job hasn't computed yet
+    are counted as pending and left out of the statistics.
+    """
+    breakdown = models.HeuristicBreakdown
+    aggregates = []
+    for name in COLUMNS:
+        column = getattr(breakdown, name)
+        aggregates += [func.avg(column), func.min(column), func.max(column)]
+
+    query = db.query(
+        models.GenomeExperiment.generation,
+        func.count(models.Genome.id),
+        func.count(breakdown.hash),
+        *aggregates
+    ).join(
+        models.Genome,
+        models.Genome.id == models.GenomeExperiment.genome_id
+    ).outerjoin(
+        breakdown,
+        (breakdown.hash == models.Genome.payload_hash) &
+        (breakdown.scorer_version == genomes.HEURISTIC_SCORER_VERSION)
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment_id
+    )
+    if generation is not None:
+        query = query.filter(models.GenomeExperiment.generation == generation)
+    rows = query.group_by(models.GenomeExperiment.generation).order_by(models.GenomeExperiment.generation).all()
+
+    summaries = []
+    for row in rows:
+        generation_number, genome_count, scored = row[:3]
+        values = row[3:]
+        summaries.append({
+            "generation": generation_number,
+            "genomes": genome_count,
+            "scored": scored,
+            "pending": genome_count - scored,
+            "components": {
+                name: {
+                    "mean": _round(values[3 * i]),
+                    "min": _round(values[3 * i + 1]),
+                    "max": _round(values[3 * i + 2]),
+                }
+                for i, name in enumerate(COLUMNS)
+            },
+        })
+    return summaries
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+def trends(summaries):
+    """
+    Per component: least-squares slope of the generation means (points per
+    generation) and the change from the first to the last scored generation
+    """
+    result = {}
+    for name in COLUMNS:
+        points = [
+            (summary["generation"], summary["components"][name]["mean"])
+            for summary in summaries
+            if summary["components"][name]["mean"] is not None
+        ]
+        if not points:
+            result[name] = {"slope": None, "first": None, "last": None, "change": None}
+            continue
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        spread = sum((x - mean_x) ** 2 for x, _ in points)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread if spread else 0.0
+        result[name] = {
+            "slope": round(slope, 4),
+            "first": points[0][1],
+            "last": points[-1][1],
+            "change": round(points[-1][1] - points[0][1], 3),
+        }
+    return result
+
+
+def experiment_breakdown(db: Session, experiment: models.Experiment):
+    """Component statistics of every generation of an experiment, plus their trends"""
+    if experiment.archived_at:
+        scorer_version, summaries = archive.store.get_score_summaries(experiment.id)
+    else:
+        scorer_version, summaries = genomes.HEURISTIC_SCORER_VERSION, generation_summaries(db, experiment.id)
+    return {
+        "experiment_id": experiment.id,
+        "scorer_version": scorer_version,
+        "components": list(COLUMNS),
+        "generations": summaries,
+        "trends": trends(summaries),
+    }
+
+
+def generation_breakdown(db: Session, experiment: models.Experiment, generation: int):
+    """Component statistics of one generation, or None if it has no genomes"""
+    if experiment.archived_at:
+        scorer_version, summaries = archive.store.get_score_summaries(experiment.id)
+        summaries = [summary for summary in summaries if summary["generation"] == generation]
+    else:
+        scorer_version, summaries = genomes.HEURISTIC_SCORER_VERSION, generation_summaries(db, experiment.id, generation)
+    if not summaries:
+        return None
+    return dict(summaries[0], experiment_id=experiment.id, scorer_version=scorer_version)
@@ -0,0 +1,130 @@
+"""
+Memoized heuristic scores, keyed by the content hash of the notes.
+
+Two layers:
+- an in-process LRU of content hash -> score (SCORE_CACHE_SIZE entries)
+- the genome's payload row, which keeps the score together with the
+  HEURISTIC_SCORER_VERSION it was computed under (SCORE_CACHE_PERSIST)
+
+Bumping genomes.HEURISTIC_SCORER_VERSION whenever heuristic_score changes
+makes every stored score stale, so they are recomputed on next use.
+Concurrent requests for the same melody share one computation, so a melody
+is scored at most once per scorer version and process.
+
+Every heuristic score the app computes goes through `cache`: the score
+breakdown job (score_breakdowns.compute_pending, which passes the total of
+the components it computes anyway) and the incremental scorer's reference
+fallback (scoring.py).
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from . import genomes, payloads
+
+# Load environment variables
+load_dotenv()
+
+SCORE_CACHE_SIZE = int(os.getenv("SCORE_CACHE_SIZE", 50000))
+SCORE_CACHE_PERSIST = os.getenv("SCORE_CACHE_PERSIST", "true").lower() == "true"
+
+
+class ScoreCache:
+    """LRU of heuristic scores in front of the payload-level persistent scores"""
+
+    def __init__(self, max_entries: int = SCORE_CACHE_SIZE, persist: bool = SCORE_CACHE_PERSIST):
+        self.max_entries = max_entries
+        self.persist = persist
+        self._entries = OrderedDict()  # (scorer version, content hash) -> score
+        self._inflight = {}  # key -> Event set once the score is in _entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        score = self._entries.get(key)
+        if score is not None:
+            self._entries.move_to_end(key)
+        return score
+
+    def _remember(self, key, score):
+        self._entries[key] = score
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def score(self, genome_data: str, payload=None, compute=None):
+        """
+        Heuristic score of some notes. If their GenomePayload is given it is
+        used as the persistent layer: a current score is read from it and a
+        fresh one written back (the caller commits). compute(genome_data)
+        replaces genomes.heuristic_score on a miss.
+        """
+        version = genomes.HEURISTIC_SCORER_VERSION
+        content_hash = payload.hash if payload is not None else payloads.content_hash(genome_data)
+        key = (version, content_hash)
+
+        while True:
+            with self._lock:
+                score = self._lookup(key)
+                if score is not None:
+                    self.hits += 1
+                    self._persist(payload, score, version)
+                    return score
+                if self.persist and payload is not None and payload.heuristic_score is not None \
+                        and payload.heuristic_score_version == version:
+                    self.persistent_hits += 1
+                    self._remember(key, payload.heuristic_score)
+                    return payload.heuristic_score
+                done = self._inflight.get(key)
+                if done is None:
+                    done = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Someone else is scoring these notes; use their result
+            done.wait()
+
+        try:
+            score = (compute or genomes.heuristic_score)(genome_data)
+            with self._lock:
+                self._remember(key, score)
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+        self._persist(payload, score, version)
+        return score
+
+    def _persist(self, payload, score, version):
+        """Write a score to its payload unless it already has it (or persistence is off)"""
+        if self.persist and payload is not None and (
+                payload.heuristic_score != score or payload.heuristic_score_version != version):
+            payload.heuristic_score = score
+            payload.heuristic_score_version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "scorer_version": genomes.HEURISTIC_SCORER_VERSION,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self.persist,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+cache = ScoreCache()
@@ -0,0 +1,228 @@
+"""
+Incremental heuristic scoring for single-note edits.
+
+heuristic_score rebuilds every component from the full note list, including
+a quadratic scan for repeated phrases. A mutation usually touches one or two
+notes, so IncrementalScorer keeps the state each component is derived from
+(pitch and duration histograms, contour and interval counts, per-length
+phrase tables) and updates it for the handful of windows around an edited
+note. score() returns exactly what heuristic_score would for the current
+notes.
+
+hill_climb() uses it to run a cheap local search over mutations.
+"""
+import json
+import random
+from bisect import bisect_right, insort
+
+from . import genomes, score_cache
+
+CONSONANT_INTERVALS = (0, 5, 7, 12)
+# heuristic_score looks for repeated pitch patterns of 2-4 notes
+MIN_PATTERN_LENGTH = 2
+MAX_PATTERN_LENGTH = 4
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+class IncrementalScorer:
+    """Score state of one melody; set_note() updates it in O(pattern length) windows"""
+
+    def __init__(self, notes):
+        if isinstance(notes, str):
+            notes = json.loads(notes)
+        self.notes = [dict(note) for note in notes]
+        self.pitches = [note.get("pitch", 60) for note in self.notes]
+        self.durations = [note.get("duration", 0.5) for note in self.notes]
+        n = len(self.notes)
+
+        self.pitch_counts = {}
+        for pitch in self.pitches:
+            self.pitch_counts[pitch] = self.pitch_counts.get(pitch, 0) + 1
+        self.duration_counts = {}
+        for duration in self.durations:
+            self.duration_counts[duration] = self.duration_counts.get(duration, 0) + 1
+
+        self.rhythm_patterns = sum(1 for i in range(n - 2) if self.durations[i] == self.durations[i + 2])
+        self.direction_changes = sum(1 for j in range(1, n - 1) if self._is_direction_change(j))
+        self.consonant_intervals = sum(1 for j in range(n - 1) if self._is_consonant(j))
+
+        # Per pattern length: pattern -> sorted start positions, and the summed phrase matches
+        self.pattern_lengths = list(range(MIN_PATTERN_LENGTH, min(MAX_PATTERN_LENGTH + 1, n // 2 + 1)))
+        self.positions = {length: {} for length in self.pattern_lengths}
+        self.pattern_matches = {length: {} for length in self.pattern_lengths}
+        self.phrase_matches = 0
+        for length in self.pattern_lengths:
+            table = self.positions[length]
+            for start in range(n - length + 1):
+                table.setdefault(tuple(self.pitches[start:start + length]), []).append(start)
+            for pattern in table:
+                self._refresh_pattern(length, pattern)
+
+    def __len__(self):
+        return len(self.notes)
+
+    def to_json(self):
+        return json.dumps(self.notes)
+
+    # Component helpers, each looking at a constant number of neighbouring notes
+
+    def _contour(self, j):
+        return _sign(self.pitches[j + 1] - self.pitches[j])
+
+    def _is_direction_change(self, j):
+        previous = self._contour(j - 1)
+        return previous != 0 and self._contour(j) != previous
+
+    def _is_consonant(self, j):
+        return abs(self.pitches[j + 1] - self.pitches[j]) in CONSONANT_INTERVALS
+
+    def _refresh_pattern(self, length, pattern):
+        """
+        heuristic_score counts a window once if the same pattern starts again
+        at least `length` notes later, so a pattern contributes every start
+        that is at least `length` before its last start.
+        """
+        starts = self.positions[length].get(pattern)
+        matches = bisect_right(starts, starts[-1] - length) * length if starts else 0
+        previous = self.pattern_matches[length].pop(pattern, 0)
+        if matches:
+            self.pattern_matches[length][pattern] = matches
+        self.phrase_matches += matches - previous
+
+    # Edits
+
+    def set_note(self, index, note):
+        """Replace the note at index and update the score state around it"""
+        note = dict(note)
+        n = len(self.notes)
+        pitch = note.get("pitch", 60)
+        duration = note.get("duration", 0.5)
+
+        if duration != self.durations[index]:
+            pairs = [i for i in (index - 2, index) if 0 <= i and i + 2 < n]
+            self.rhythm_patterns -= sum(1 for i in pairs if self.durations[i] == self.durations[i + 2])
+            self._count(self.duration_counts, self.durations[index], -1)
+            self.durations[index] = duration
+            self._count(self.duration_counts, duration, 1)
+            self.rhythm_patterns += sum(1 for i in pairs if self.durations[i] == self.durations[i + 2])
+
+        if pitch != self.pitches[index]:
+            self._set_pitch(index, pitch)
+
+        self.notes[index] = note
+
+    def _set_pitch(self, index, pitch):
+        n = len(self.notes)
+        changes = [j for j in (index - 1, index, index + 1) if 1 <= j < n - 1]
+        intervals = [j for j in (index - 1, index) if 0 <= j < n - 1]
+        windows = [
+            (length, start)
+            for length in self.pattern_lengths
+            for start in range(max(0, index - length + 1), min(index, n - length) + 1)
+        ]
+
+        self.direction_changes -= sum(1 for j in changes if self._is_direction_change(j))
+        self.consonant_intervals -= sum(1 for j in intervals if self._is_consonant(j))
+        touched = set()
+        for length, start in windows:
+            pattern = tuple(self.pitches[start:start + length])
+            starts = self.positions[length][pattern]
+            starts.remove(start)
+            if not starts:
+                del self.positions[length][pattern]
+            touched.add((length, pattern))
+        self._count(self.pitch_counts, self.pitches[index], -1)
+
+        self.pitches[index] = pitch
+
+        self._count(self.pitch_counts, pitch, 1)
+        self.direction_changes += sum(1 for j in changes if self._is_direction_change(j))
+        self.consonant_intervals += sum(1 for j in intervals if self._is_consonant(j))
+        for length, start in windows:
+            pattern = tuple(self.pitches[start:start + length])
+            insort(self.positions[length].setdefault(pattern, []), start)
+            touched.add((length, pattern))
+        for length, pattern in touched:
+            self._refresh_pattern(length, pattern)
+
+    @staticmethod
+    def _count(counts, key, delta):
+        counts[key] = counts.get(key, 0) + delta
+        if not counts[key]:
+            del counts[key]
+
+    # Score, computed exactly as heuristic_components/heuristic_score do
+
+    def score(self):
+        if len(self.notes) < 3:
+            # Too short to keep incremental state worth having; defer to the reference
+            return score_cache.cache.score(json.dumps(self.notes))
+        return genomes.combine_heuristic_components(self.components())
+
+    def components(self):
+        n = len(self.notes)
+        if n < 3:
+            return genomes.heuristic_components(json.dumps(self.notes))
+
+        pitch_range = max(self.pitch_counts) - min(self.pitch_counts)
+        if 5 <= pitch_range <= 24:
+            pitch_score = 20 * (1 - abs(pitch_range - 12) / 12)
+        else:
+            pitch_score = 5
+        pitch_score += min(10, len(self.pitch_counts)) / 2
+
+        unique_durations = len(self.duration_counts)
+        if 2 <= unique_durations <= 5:
+            rhythm_score = 10 + (unique_durations - 1) * 2
+        elif unique_durations > 5:
+            rhythm_score = 15
+        else:
+            rhythm_score = 5
+        rhythm_score += min(5, self.rhythm_patterns)
+
+        ideal_changes = (n - 2) / 2
+        contour_score = 20 * (1 - abs(self.direction_changes - ideal_changes) / ideal_changes)
+        contour_score = max(5, min(20, contour_score))
+
+        phrase_score = min(20, self.phrase_matches * 2) if self.phrase_matches > 0 else 0
+
+        consonant_ratio = self.consonant_intervals / (n - 1)
+        if 0.4 <= consonant_ratio <= 0.8:
+            interval_score = 20
+        else:
+            interval_score = 20 * (1 - abs(consonant_ratio - 0.6) / 0.6)
+
+        return {
+            "pitch": pitch_score,
+            "rhythm": rhythm_score,
+            "contour": contour_score,
+            "phrase": phrase_score,
+            "interval": interval_score,
+        }
+
+
+def hill_climb(genome_data: str, steps: int = 100, conservative: bool = True, rng=random):
+    """
+    Greedy local search: mutate one note at a time with genomes.mutate_gene and
+    keep the change unless it lowers the heuristic score.
+
+    Returns (genome JSON, score).
+    """
+    scorer = IncrementalScorer(genome_data)
+    if len(scorer) == 0:
+        return genome_data, score_cache.cache.score(genome_data)
+
+    best = scorer.score()
+    for _ in range(steps):
+        index = rng.randrange(len(scorer))
+        original = scorer.notes[index]
+        scorer.set_note(index, genomes.mutate_gene(original, conservative, rng))
+        candidate = scorer.score()
+        if candidate >= best:
+            best = candidate
+        else:
+            scorer.set_note(index, original)
+    return scorer.to_json(), best
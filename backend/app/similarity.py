@@ -0,0 +1,364 @@
+"""
+"Find melodies similar to this one" across every experiment.
+
+Each melody is reduced to a fixed-length feature vector built from the same
+properties heuristic_score looks at (interval histogram, rhythm histogram,
+contour) plus hashed interval n-grams, which are transposition invariant:
+the same tune in another key gets the same vector. Vectors are L2-normalised
+so cosine similarity is a dot product.
+
+The vectors live in one NumPy matrix. Small indexes are searched brute
+force; past SIMILARITY_LSH_THRESHOLD rows, random-projection LSH tables
+narrow the search to a candidate set that is then ranked exactly.
+
+The index is built lazily on first use (hot genomes plus the archive) and
+then kept current by the generation and mutation paths calling
+index_genomes(). A snapshot is written to SIMILARITY_INDEX_PATH so a
+restart only has to catch up on genomes changed since.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from . import models, archive
+
+# Load environment variables
+load_dotenv()
+
+SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", "./similarity_index.npz")
+# Up to this many melodies every query scans the whole matrix
+SIMILARITY_LSH_THRESHOLD = int(os.getenv("SIMILARITY_LSH_THRESHOLD", 50000))
+SIMILARITY_LSH_TABLES = int(os.getenv("SIMILARITY_LSH_TABLES", 16))
+SIMILARITY_LSH_BITS = int(os.getenv("SIMILARITY_LSH_BITS", 8))
+# Fewer LSH candidates than this and the query scans everything instead
+MIN_LSH_CANDIDATES = 100
+SIMILARITY_BUILD_BATCH_SIZE = int(os.getenv("SIMILARITY_BUILD_BATCH_SIZE", 1000))
+
+INTERVAL_RANGE = 12  # intervals are clipped to +-an octave
+DURATION_BINS = (0.25, 0.5, 0.75, 1.0, 1.5, 2.0)
+NGRAM_BUCKETS = 64
+# Relative weight of each feature block in the combined vector
+BLOCK_WEIGHTS = {"interval": 1.0, "rhythm": 0.6, "contour": 0.6, "ngram": 1.2}
+
+FEATURE_DIM = (2 * INTERVAL_RANGE + 1) + (len(DURATION_BINS) + 1) + 4 + NGRAM_BUCKETS
+
+
+def _unit(block: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(block)
+    return block / norm if norm > 0 else block
+
+
+def melody_features(genome_data: str) -> np.ndarray:
+    """Feature vector of a melody (JSON note list); the zero vector if it can't be parsed"""
+    try:
+        notes = json.loads(genome_data)
+    except (TypeError, ValueError):
+        notes = None
+    if not notes or not isinstance(notes, list):
+        return np.zeros(FEATURE_DIM, dtype=np.float32)
+
+    pitches = np.array([note.get("pitch", 60) for note in notes], dtype=np.int64)
+    durations = np.array([note.get("duration", 0.5) for note in notes], dtype=np.float64)
+    intervals = np.clip(np.diff(pitches), -INTERVAL_RANGE, INTERVAL_RANGE)
+
+    # Interval histogram (signed, so rising and falling lines differ)
+    interval_hist = np.bincount(intervals + INTERVAL_RANGE, minlength=2 * INTERVAL_RANGE + 1).astype(np.float64)
+
+    # Rhythm histogram; anything off the usual grid goes in the last bin
+    duration_index = np.full(len(durations), len(DURATION_BINS))
+    for i, value in enumerate(DURATION_BINS):
+        duration_index[np.isclose(durations, value)] = i
+    rhythm_hist = np.bincount(duration_index, minlength=len(DURATION_BINS) + 1).astype(np.float64)
+
+    # Contour: share of steps up / down / repeated, and how often direction changes
+    contour = np.sign(intervals)
+    moving = contour[contour != 0]
+    changes = np.count_nonzero(moving[1:] != moving[:-1]) if len(moving) > 1 else 0
+    steps = max(1, len(contour))
+    contour_block = np.array([
+        np.count_nonzero(contour > 0) / steps,
+        np.count_nonzero(contour < 0) / steps,
+        np.count_nonzero(contour == 0) / steps,
+        changes / steps,
+    ])
+
+    # Interval bigrams and trigrams hashed into buckets: transposition invariant phrase shape
+    ngram_hist = np.zeros(NGRAM_BUCKETS)
+    shifted = intervals + INTERVAL_RANGE
+    base = 2 * INTERVAL_RANGE + 1
+    if len(shifted) >= 2:
+        bigrams = shifted[:-1] * base + shifted[1:]
+        np.add.at(ngram_hist, (bigrams * 2654435761) % NGRAM_BUCKETS, 1.0)
+    if len(shifted) >= 3:
+        trigrams = (shifted[:-2] * base + shifted[1:-1]) * base + shifted[2:]
+        np.add.at(ngram_hist, (trigrams * 40503 + 7) % NGRAM_BUCKETS, 1.0)
+
+    vector = np.concatenate([
+        BLOCK_WEIGHTS["interval"] * _unit(interval_hist),
+        BLOCK_WEIGHTS["rhythm"] * _unit(rhythm_hist),
+        BLOCK_WEIGHTS["contour"] * _unit(contour_block),
+        BLOCK_WEIGHTS["ngram"] * _unit(ngram_hist),
+    ])
+    return _unit(vector).astype(np.float32)
+
+
+class SimilarityIndex:
+    """Feature matrix of melodies with cosine top-k search"""
+
+    def __init__(self, lsh_threshold: int = SIMILARITY_LSH_THRESHOLD, lsh_tables: int = SIMILARITY_LSH_TABLES,
+                 lsh_bits: int = SIMILARITY_LSH_BITS, seed: int = 0):
+        self.lsh_threshold = lsh_threshold
+        self.lsh_tables = lsh_tables
+        self.lsh_bits = lsh_bits
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, FEATURE_DIM), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._size = 0
+        self._rows = {}  # genome_id -> row
+        self._planes = None  # (tables, bits, dim) random hyperplanes once LSH is on
+        self._buckets = None  # per table: signature -> set of rows
+        self.built_at = None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def uses_lsh(self):
+        return self._planes is not None
+
+    def _grow(self, needed: int):
+        capacity = len(self._matrix)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        matrix = np.zeros((capacity, FEATURE_DIM), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.full(capacity, -1, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def _signatures(self, vectors: np.ndarray) -> np.ndarray:
+        """LSH signature of each vector in each table, shape (tables, n)"""
+        bits = np.einsum("tbd,nd->tnb", self._planes, vectors) > 0
+        weights = 1 << np.arange(self.lsh_bits, dtype=np.int64)
+        return bits.astype(np.int64) @ weights
+
+    def _bucket_rows(self, rows):
+        signatures = self._signatures(self._matrix[rows])
+        for table, table_signatures in enumerate(signatures):
+            buckets = self._buckets[table]
+            for row, signature in zip(rows, table_signatures):
+                buckets.setdefault(int(signature), set()).add(row)
+
+    def _unbucket_row(self, row):
+        signatures = self._signatures(self._matrix[[row]])
+        for table, table_signatures in enumerate(signatures):
+            bucket = self._buckets[table].get(int(table_signatures[0]))
+            if bucket is not None:
+                bucket.discard(row)
+
+    def _enable_lsh(self):
+        self._planes = self._rng.standard_normal((self.lsh_tables, self.lsh_bits, FEATURE_DIM)).astype(np.float32)
+        self._buckets = [{} for _ in range(self.lsh_tables)]
+        self._bucket_rows(np.arange(self._size))
+
+    def add(self, genome_ids, vectors: np.ndarray):
+        """Insert or replace the vectors of some genomes"""
+        if len(genome_ids) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(genome_ids), FEATURE_DIM)
+        with self._lock:
+            self._grow(self._size + len(genome_ids))
+            touched = []
+            for genome_id, vector in zip(genome_ids, vectors):
+                row = self._rows.get(genome_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[genome_id] = row
+                    self._ids[row] = genome_id
+                elif self.uses_lsh:
+                    self._unbucket_row(row)
+                self._matrix[row] = vector
+                touched.append(row)
+
+            if self.uses_lsh:
+                self._bucket_rows(np.array(touched))
+            elif self._size > self.lsh_threshold:
+                self._enable_lsh()
+
+    def remove(self, genome_ids):
+        """Drop genomes, moving the last row into each freed slot"""
+        with self._lock:
+            for genome_id in genome_ids:
+                row = self._rows.pop(genome_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if self.uses_lsh:
+                    self._unbucket_row(row)
+                    if row != last:
+                        self._unbucket_row(last)
+                if row != last:
+                    self._matrix[row] = self._matrix[last]
+                    self._ids[row] = self._ids[last]
+                    self._rows[int(self._ids[row])] = row
+                    if self.uses_lsh:
+                        self._bucket_rows(np.array([row]))
+                self._ids[last] = -1
+                self._size -= 1
+
+    def vector(self, genome_id: int):
+        with self._lock:
+            row = self._rows.get(genome_id)
+            return None if row is None else self._matrix[row].copy()
+
+    def _candidates(self, vector: np.ndarray):
+        signatures = self._signatures(vector[None, :])[:, 0]
+        rows = set()
+        for table, signature in enumerate(signatures):
+            rows.update(self._buckets[table].get(int(signature), ()))
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    def query(self, vector: np.ndarray, k: int = 10, exclude_ids=(), allowed_ids=None):
+        """
+        Return [(genome_id, cosine similarity)] of the k closest melodies.
+
+        allowed_ids restricts the search to a subset (scanned brute force);
+        otherwise LSH candidates are used when the index is large, falling
+        back to a full scan if they don't yield k results.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        exclude = set(exclude_ids)
+        with self._lock:
+            if allowed_ids is not None:
+                rows = np.array([self._rows[g] for g in allowed_ids if g in self._rows], dtype=np.int64)
+            elif self.uses_lsh:
+                rows = self._candidates(vector)
+                # Too few candidates to trust the ranking: fall back to a full scan
+                if len(rows) < max(MIN_LSH_CANDIDATES, 10 * (k + len(exclude))):
+                    rows = np.arange(self._size)
+            else:
+                rows = np.arange(self._size)
+            if len(rows) == 0:
+                return []
+
+            scores = self._matrix[rows] @ vector
+            wanted = min(len(rows), k + len(exclude))
+            top = np.argpartition(-scores, wanted - 1)[:wanted]
+            top = top[np.argsort(-scores[top])]
+            ids = self._ids[rows[top]]
+
+        results = []
+        for genome_id, score in zip(ids.tolist(), scores[top].tolist()):
+            if genome_id in exclude:
+                continue
+            results.append((genome_id, round(float(score), 4)))
+            if len(results) == k:
+                break
+        return results
+
+    def save(self, path: str = SIMILARITY_INDEX_PATH):
+        with self._lock:
+            ids = self._ids[:self._size].copy()
+            matrix = self._matrix[:self._size].copy()
+            built_at = self.built_at
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, ids=ids, matrix=matrix,
+                 built_at=np.array(built_at.isoformat() if built_at else ""))
+        os.replace(tmp_path, path)
+
+    def load(self, path: str = SIMILARITY_INDEX_PATH) -> bool:
+        try:
+            snapshot = np.load(path)
+        except (FileNotFoundError, OSError, ValueError):
+            return False
+        if snapshot["matrix"].shape[1:] != (FEATURE_DIM,):
+            return False  # features changed since the snapshot was written
+        self.add(snapshot["ids"].tolist(), snapshot["matrix"])
+        built_at = str(snapshot["built_at"])
+        self.built_at = datetime.fromisoformat(built_at) if built_at else None
+        return True
+
+
+index = SimilarityIndex()
+_build_lock = threading.Lock()
+_ready = False
+
+
+def _vectors_for(datas):
+    """Featurize melodies, computing each distinct note payload once"""
+    seen = {}
+    vectors = np.zeros((len(datas), FEATURE_DIM), dtype=np.float32)
+    for i, data in enumerate(datas):
+        vector = seen.get(data)
+        if vector is None:
+            vector = seen[data] = melody_features(data)
+        vectors[i] = vector
+    return vectors
+
+
+def _index_hot_genomes(db: Session, changed_since=None):
+    query = db.query(
+        models.Genome.id,
+        func.coalesce(models.GenomePayload.data, models.Genome.legacy_data)
+    ).outerjoin(
+        models.GenomePayload,
+        models.GenomePayload.hash == models.Genome.payload_hash
+    )
+    if changed_since is not None:
+        query = query.filter(or_(
+            models.Genome.created_at >= changed_since,
+            models.Genome.updated_at >= changed_since
+        ))
+    result = db.execute(query.statement, execution_options={"yield_per": SIMILARITY_BUILD_BATCH_SIZE})
+    for partition in result.partitions():
+        index.add([genome_id for genome_id, _ in partition], _vectors_for([data for _, data in partition]))
+
+
+def ensure_index(db: Session):
+    """Build the index on first use: load the snapshot if any, then catch up from the database"""
+    global _ready
+    if _ready:
+        return index
+    with _build_lock:
+        if _ready:
+            return index
+        started = datetime.utcnow()
+        if index.load():
+            print(f"Loaded similarity index snapshot with {len(index)} melodies, catching up from {index.built_at}")
+            _index_hot_genomes(db, changed_since=index.built_at)
+        else:
+            _index_hot_genomes(db)
+            archived_ids = [e for (e,) in db.query(models.Experiment.id).filter(models.Experiment.archived_at != None)]
+            for experiment_id in archived_ids:
+                for _, records in archive.store.iter_generations(experiment_id):
+                    index.add([record.id for record in records], _vectors_for([record.data for record in records]))
+        index.built_at = started
+        _ready = True
+        print(f"Similarity index ready: {len(index)} melodies ({'LSH' if index.uses_lsh else 'brute force'})")
+    return index
+
+
+def index_genomes(genomes_list):
+    """Add new or changed genomes; a no-op until the index has been built"""
+    if not _ready or not genomes_list:
+        return
+    index.add([genome.id for genome in genomes_list], _vectors_for([genome.data for genome in genomes_list]))
+
+
+def remove_genomes(genome_ids):
+    if _ready:
+        index.remove(genome_ids)
+
+
+def save_snapshot():
+    if _ready:
+        index.save()
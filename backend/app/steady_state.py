@@ -0,0 +1,312 @@
+"""
+Steady-state evolution: continuous replacement instead of whole generations.
+
+An experiment in steady-state mode (Experiment.evolution_mode) keeps one
+population at its current generation. Every human score immediately breeds
+one child from the best scored genomes, and the child takes the place of the
+worst-scoring genome nobody has saved. The replaced genome stays in the
+database (its scores and ancestry are history), marked with
+GenomeExperiment.replaced_at so it no longer counts as part of the
+population.
+
+Best and worst are looked up in a PopulationIndex, two heaps over the
+population's human scores kept in memory per experiment, so a contribution
+costs O(log n) for the bookkeeping plus one crossover, not a sort of the
+population. Children get the surrogate model's predicted score (see
+surrogate.py); the steady state breeds one child at a time, so there is no
+pool to screen. Every INITIAL_GENOME_COUNT births (one generation's worth) the
+population's diversity is measured and stored, and sets the mutation of the
+following children (see diversity.py). The experiment completes after
+breeding as many children as the generational scheme would in
+max_generations generations, or earlier when the population has converged.
+"""
+import heapq
+import threading
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models, genomes, operators, rng_streams, diversity, surrogate
+
+GENERATIONAL = "generational"
+STEADY_STATE = "steady_state"
+EVOLUTION_MODES = (GENERATIONAL, STEADY_STATE)
+
+
+class UnknownEvolutionModeError(ValueError):
+    pass
+
+
+def check_mode(mode: str) -> str:
+    if mode not in EVOLUTION_MODES:
+        raise UnknownEvolutionModeError(
+            f"Unknown evolution mode '{mode}'. Expected one of: {', '.join(EVOLUTION_MODES)}"
+        )
+    return mode
+
+
+def is_steady_state(experiment: models.Experiment) -> bool:
+    return experiment.evolution_mode == STEADY_STATE
+
+
+def birth_limit(experiment: models.Experiment) -> int:
+    """Children a steady-state experiment breeds before it completes"""
+    return max(1, experiment.max_generations - 1) * genomes.INITIAL_GENOME_COUNT
+
+
+class PopulationIndex:
+    """
+    Human scores of a steady-state population, with O(log n) access to the
+    best genomes (parents) and to the worst replaceable one.
+
+    Heap entries are never updated in place: a changed score pushes a new
+    entry and stale ones are dropped when they reach the top (or all at once
+    when they outnumber the live ones).
+    """
+
+    def __init__(self, experiment_id: int, generation: int, scores, protected, births: int = 0, mutation: dict = None):
+        self.experiment_id = experiment_id
+        self.generation = generation
+        self.births = births  # children bred so far; claimed under the lock
+        self.mutation = mutation or diversity.adaptive_mutation()  # from the last diversity snapshot
+        self.scores = dict(scores)  # genome_id -> human score
+        self.protected = set(protected)  # saved genomes, never replaced
+        self.lock = threading.Lock()
+        self._rebuild()
+
+    def _rebuild(self):
+        self._worst = [(score, genome_id) for genome_id, score in self.scores.items() if genome_id not in self.protected]
+        self._best = [(-score, genome_id) for genome_id, score in self.scores.items()]
+        heapq.heapify(self._worst)
+        heapq.heapify(self._best)
+
+    def _live(self, genome_id: int, score: float) -> bool:
+        return self.scores.get(genome_id) == score
+
+    def update(self, genome_id: int, score: float):
+        self.scores[genome_id] = score
+        if genome_id not in self.protected:
+            heapq.heappush(self._worst, (score, genome_id))
+        heapq.heappush(self._best, (-score, genome_id))
+        if len(self._best) > 2 * len(self.scores) + 32:
+            self._rebuild()
+
+    def remove(self, genome_id: int):
+        self.scores.pop(genome_id, None)
+
+    def protect(self, genome_id: int):
+        self.protected.add(genome_id)
+
+    def worst(self):
+        """The lowest-scoring genome that isn't protected, or None"""
+        while self._worst:
+            score, genome_id = self._worst[0]
+            if self._live(genome_id, score) and genome_id not in self.protected:
+                return genome_id
+            heapq.heappop(self._worst)
+        return None
+
+    def best(self, k: int):
+        """Up to k (genome_id, score) pairs, highest score first (ties by id); O(k log n)"""
+        found, seen = [], set()
+        while self._best and len(found) < k:
+            negative_score, genome_id = heapq.heappop(self._best)
+            if genome_id not in seen and self._live(genome_id, -negative_score):
+                seen.add(genome_id)
+                found.append((genome_id, -negative_score))
+        for genome_id, score in found:
+            heapq.heappush(self._best, (-score, genome_id))
+        return found
+
+
+def load_population_index(db: Session, experiment: models.Experiment) -> PopulationIndex:
+    rows = db.query(models.Genome.id, models.Genome.score).join(
+        models.GenomeExperiment,
+        models.GenomeExperiment.genome_id == models.Genome.id
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment.id,
+        models.GenomeExperiment.generation == experiment.current_generation,
+        models.GenomeExperiment.replaced_at == None,
+        models.Genome.user_scored == True
+    ).all()
+    saved = db.query(models.SavedMelody.genome_id).filter(
+        models.SavedMelody.genome_id.in_([genome_id for genome_id, _ in rows])
+    ).distinct().all()
+    return PopulationIndex(
+        experiment.id,
+        experiment.current_generation,
+        scores=[(genome_id, score or 0.0) for genome_id, score in rows],
+        protected=[genome_id for (genome_id,) in saved],
+        births=experiment.steady_state_births or 0,
+        mutation=diversity.latest_mutation(db, experiment.id),
+    )
+
+
+class PopulationIndexRegistry:
+    """Process-wide cache of PopulationIndex, one entry per steady-state experiment"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, experiment: models.Experiment) -> PopulationIndex:
+        index = self._indexes.get(experiment.id)
+        if index is not None and index.generation == experiment.current_generation:
+            return index
+        index = load_population_index(db, experiment)
+        with self._lock:
+            current = self._indexes.get(experiment.id)
+            if current is not None and current.generation == index.generation:
+                return current
+            self._indexes[experiment.id] = index
+            return index
+
+    def protect(self, genome_id: int):
+        """A genome was saved by a user: never replace it"""
+        for index in list(self._indexes.values()):
+            with index.lock:
+                index.protect(genome_id)
+
+    def invalidate(self, experiment_id: int):
+        with self._lock:
+            self._indexes.pop(experiment_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+registry = PopulationIndexRegistry()
+
+
+def contribute(db: Session, experiment: models.Experiment, genome: models.Genome):
+    """
+    Record a human score of a steady-state experiment's genome and breed one
+    child replacing the worst unsaved genome. Flushes but doesn't commit.
+
+    Returns {"status": "replaced", "genome": child, "replaced_genome_id": ...},
+    {"status": "completed", ...} if it had already bred all its children, or
+    {"status": "pending", ...} while there are fewer than two scored parents
+    or nothing that may be replaced. A "completion" entry (final genome and
+    score) means the experiment just completed.
+    """
+    index = registry.get(db, experiment)
+    try:
+        with index.lock:
+            index.update(genome.id, genome.score or 0.0)
+            top = index.best(genomes.TOP_GENOMES_TO_CROSSOVER)
+            if len(top) < 2:
+                return {"status": "pending", "message": "Waiting for at least two human-scored genomes"}
+
+            births = index.births
+            if births >= birth_limit(experiment):
+                return {
+                    "status": "completed",
+                    "message": "Experiment bred all its children and is now complete",
+                    "completion": _complete(experiment, top[0]),
+                }
+            replaced_id = index.worst()
+            if replaced_id is None:
+                return {"status": "pending", "message": "Every scored genome is saved by a user"}
+            # Claimed under the lock, so concurrent contributions replace different genomes
+            # and breed from different streams
+            index.remove(replaced_id)
+            index.births += 1
+            mutation = index.mutation
+
+        # Each birth has its own streams (spawn key (birth, stream)), so a replay is reproducible
+        selection_rng = rng_streams.numpy_rng(experiment, births, rng_streams.STEADY_STATE_SELECTION)
+        rng = rng_streams.python_rng(experiment, births, rng_streams.STEADY_STATE_BREEDING)
+
+        # The experiment's selection operator chooses among the top genomes
+        fitness = [score for _, score in top]
+        first, second = operators.get_selection(experiment.selection_operator)(
+            np.asarray(fitness, dtype=np.float64), 1, selection_rng
+        )[0].tolist()
+        parent1 = db.get(models.Genome, top[first][0])
+        parent2 = db.get(models.Genome, top[second][0])
+        child_data = operators.crossover_pairs(
+            [parent1.data, parent2.data], np.array([[0, 1]]), selection_rng, experiment.crossover_operator
+        )[0]
+
+        # Same adaptive mutation as in generational breeding
+        if rng.random() < mutation["mutation_rate"]:
+            child_data = genomes.apply_mutation(
+                child_data, num_genes=max(1, int(genomes.GENOME_LENGTH * mutation["mutation_strength"])), rng=rng
+            )
+
+        # Predicted score until a human scores it (see surrogate.py)
+        model = surrogate.ready_model(db, experiment)
+        predicted_score = float(model.predict(surrogate.features([child_data]))[0]) if model is not None else None
+
+        child_genome = models.Genome(
+            generation=experiment.current_generation,
+            data=child_data,
+            score=0.0,
+            predicted_score=predicted_score,
+            parent1_id=parent1.id,
+            parent2_id=parent2.id
+        )
+        db.add(child_genome)
+        db.flush()
+        db.add(models.GenomeExperiment(
+            genome_id=child_genome.id,
+            experiment_id=experiment.id,
+            generation=experiment.current_generation
+        ))
+        db.query(models.GenomeExperiment).filter(
+            models.GenomeExperiment.genome_id == replaced_id,
+            models.GenomeExperiment.experiment_id == experiment.id,
+            models.GenomeExperiment.replaced_at == None
+        ).update({models.GenomeExperiment.replaced_at: datetime.utcnow()}, synchronize_session=False)
+        experiment.steady_state_births = max(experiment.steady_state_births or 0, births + 1)
+        db.flush()
+    except Exception:
+        # The index may no longer match the database; reload it on next use
+        registry.invalidate(experiment.id)
+        raise
+
+    print(f"Steady-state experiment {experiment.id}: genome {child_genome.id} "
+          f"(parents {parent1.id}, {parent2.id}) replaced genome {replaced_id}")
+    result = {
+        "status": "replaced",
+        "genome": child_genome,
+        "replaced_genome_id": replaced_id,
+        "births": experiment.steady_state_births,
+    }
+    if experiment.steady_state_births >= birth_limit(experiment):
+        result["completion"] = _complete(experiment, top[0])
+    elif experiment.steady_state_births % genomes.INITIAL_GENOME_COUNT == 0 and _snapshot(db, experiment, index):
+        result["completion"] = _complete(experiment, top[0], reason="converged")
+    return result
+
+
+def _snapshot(db: Session, experiment: models.Experiment, index: PopulationIndex) -> bool:
+    """Measure and store the population's diversity, adapt mutation; True if it has converged"""
+    population = db.query(models.Genome).join(
+        models.GenomeExperiment,
+        models.GenomeExperiment.genome_id == models.Genome.id
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment.id,
+        models.GenomeExperiment.generation == experiment.current_generation,
+        models.GenomeExperiment.replaced_at == None
+    ).all()
+    population_diversity = diversity.population_diversity([g.data for g in population])
+    mutation = diversity.adaptive_mutation(population_diversity)
+    diversity.record(db, experiment, population_diversity, mutation, births=experiment.steady_state_births)
+    with index.lock:
+        index.mutation = mutation
+    # Every INITIAL_GENOME_COUNT births count as one generation
+    generations = experiment.steady_state_births // genomes.INITIAL_GENOME_COUNT
+    return diversity.has_converged(population_diversity, generations)
+
+
+def _complete(experiment: models.Experiment, best, reason: str = "max_generations"):
+    genome_id, score = best
+    experiment.completed = True
+    experiment.final_piece_name = f"{experiment.name} - Evolution {'Converged' if reason == 'converged' else 'Complete'}"
+    experiment.final_genome_id = genome_id
+    registry.invalidate(experiment.id)
+    surrogate.registry.invalidate(experiment.id)
+    return {"final_genome_id": genome_id, "final_score": score, "reason": reason}
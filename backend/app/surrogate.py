@@ -0,0 +1,336 @@
+"""
+Surrogate fitness model: predicts an experiment's human scores.
+
+Human scores are the scarce resource, so every experiment learns from the
+ones it gets. A ridge regression maps a genome's features to its score and
+is used in two ways:
+
+- screening: advance_experiment_generation breeds SURROGATE_POOL_FACTOR
+  times as many children as it needs and keeps the most promising ones
+  (distinct melodies first), plus a SURROGATE_EXPLORE_FRACTION picked at
+  random from the rest so the model's blind spots still reach humans;
+- predicted scores: unscored genomes get Genome.predicted_score, so they
+  compete in selection on an estimate (selection_score). It is kept apart
+  from Genome.score, which only ever holds human scores and is what users
+  see; a human score takes precedence over the estimate.
+
+The features are the heuristic_components scores, computed for each
+batch of equal-length genomes at once with NumPy (heuristic_components takes milliseconds per
+genome in pure Python, too slow for candidate pools), the quantities they
+are scored from (range, variety, rhythm repetition, contour, consonance),
+note statistics, and a pitch-class histogram that lets the model pick up a
+preferred key. A genome that can't be parsed or has fewer than 3 notes
+gets the zero vector: it isn't learned from, and is predicted the
+intercept.
+
+Training is incremental: the model keeps the running sums X'X and X'y of
+the scores it has seen, so learning a score is O(d^2) and refitting solves
+one d x d system (d = len(FEATURES) + 1), well under a millisecond. Models
+are cached per experiment; a fresh one is loaded from the experiment's most
+recent SURROGATE_MAX_SAMPLES human scores. It predicts once it has seen
+SURROGATE_MIN_SAMPLES scores; until then breeding is exactly as before.
+
+Benchmark: python -m benchmarks.bench_surrogate
+"""
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from . import models, genomes, operators
+
+# Load environment variables
+load_dotenv()
+
+SURROGATE_SCREENING = os.getenv("SURROGATE_SCREENING", "true").lower() in ("1", "true", "yes")
+SURROGATE_POOL_FACTOR = int(os.getenv("SURROGATE_POOL_FACTOR", 4))
+SURROGATE_EXPLORE_FRACTION = float(os.getenv("SURROGATE_EXPLORE_FRACTION", 0.2))
+SURROGATE_MIN_SAMPLES = int(os.getenv("SURROGATE_MIN_SAMPLES", 10))
+SURROGATE_MAX_SAMPLES = int(os.getenv("SURROGATE_MAX_SAMPLES", 5000))
+SURROGATE_RIDGE_ALPHA = float(os.getenv("SURROGATE_RIDGE_ALPHA", 1.0))
+
+# Human scores are 0-100 (schemas.MutationBase)
+MIN_SCORE = 0.0
+MAX_SCORE = 100.0
+
+CONSONANT_INTERVALS = (0, 5, 7, 12)
+PHRASE_BATCH = 256
+PITCH_CLASSES = ("c", "c#", "d", "d#", "e", "f", "f#", "g", "g#", "a", "a#", "b")
+
+FEATURES = tuple(f"heuristic_{name}" for name in genomes.HEURISTIC_COMPONENTS) + (
+    "pitch_range", "unique_pitches", "pitch_mean", "pitch_std",
+    "unique_durations", "duration_mean", "duration_std", "rhythm_repetition",
+    "direction_changes", "mean_interval", "leaps", "consonance",
+    "velocity_mean", "velocity_std",
+) + tuple(f"pitch_class_{name}" for name in PITCH_CLASSES)
+
+
+def _distinct_per_row(values: np.ndarray) -> np.ndarray:
+    ordered = np.sort(values, axis=1)
+    return 1 + (ordered[:, 1:] != ordered[:, :-1]).sum(axis=1)
+
+
+def _phrase_matches(pitches: np.ndarray) -> np.ndarray:
+    """heuristic_components' phrase count: patterns of 2-4 notes that recur later, weighted by length"""
+    if len(pitches) > PHRASE_BATCH:
+        # Compares all pairs of positions: bound the (rows, length, length) temporaries
+        return np.concatenate([_phrase_matches(pitches[i:i + PHRASE_BATCH]) for i in range(0, len(pitches), PHRASE_BATCH)])
+    n, length = pitches.shape
+    matches = np.zeros(n)
+    for pattern_length in range(2, min(5, length // 2 + 1)):
+        # One integer per pattern starting at each position
+        patterns = np.zeros((n, length - pattern_length + 1), dtype=np.int64)
+        for k in range(pattern_length):
+            patterns = patterns * 128 + np.clip(pitches[:, k:length - pattern_length + 1 + k], 0, 127)
+        starts = np.arange(patterns.shape[1])
+        # Pattern at i found again at some j >= i + pattern_length, for i <= length - 2 * pattern_length
+        later = starts[None, :] >= starts[:, None] + pattern_length
+        found = ((patterns[:, :, None] == patterns[:, None, :]) & later).any(axis=2)
+        matches += pattern_length * found[:, :length - 2 * pattern_length + 1].sum(axis=1)
+    return matches
+
+
+def _encode(genome_data: str):
+    """A genome as a (length, NOTE_FIELDS) array, or None if it can't be parsed or has fewer than 3 notes"""
+    try:
+        encoded = operators.encode_genome(genome_data)
+    except (TypeError, ValueError, AttributeError):
+        return None
+    return encoded if len(encoded) >= 3 else None
+
+
+def featurize(genome_datas):
+    """
+    Genome JSON strings -> ((n, len(FEATURES)) float array, (n,) bool array
+    of the genomes that could be featurized; the others' rows are zero)
+    """
+    encoded = [_encode(genome_data) for genome_data in genome_datas]
+    rows = np.zeros((len(encoded), len(FEATURES)))
+    by_length = {}
+    for i, genome in enumerate(encoded):
+        if genome is not None:
+            by_length.setdefault(len(genome), []).append(i)
+    for indexes in by_length.values():
+        rows[indexes] = _batch_features(np.stack([encoded[i] for i in indexes]))
+    return rows, np.array([genome is not None for genome in encoded], dtype=bool)
+
+
+def features(genome_datas) -> np.ndarray:
+    """Genome JSON strings -> (n, len(FEATURES)) float array"""
+    return featurize(genome_datas)[0]
+
+
+def _batch_features(encoded: np.ndarray) -> np.ndarray:
+    """(n, length, NOTE_FIELDS) encoded genomes of one length, length >= 3 -> (n, len(FEATURES))"""
+    length = encoded.shape[1]
+    pitches = encoded[:, :, 0].astype(np.int64)
+    durations = encoded[:, :, 1]
+    velocities = encoded[:, :, 2]
+
+    # The quantities heuristic_components scores, and its scores of them
+    pitch_range = pitches.max(axis=1) - pitches.min(axis=1)
+    unique_pitches = _distinct_per_row(pitches)
+    unique_durations = _distinct_per_row(durations)
+    rhythm_patterns = (durations[:, :-2] == durations[:, 2:]).sum(axis=1)
+    intervals = np.diff(pitches, axis=1)
+    steps = np.abs(intervals)
+    contour = np.sign(intervals)
+    direction_changes = ((contour[:, 1:] != contour[:, :-1]) & (contour[:, :-1] != 0)).sum(axis=1)
+    ideal_changes = (length - 2) / 2
+    consonance = np.isin(steps, CONSONANT_INTERVALS).mean(axis=1)
+
+    pitch_score = np.where((pitch_range >= 5) & (pitch_range <= 24), 20 * (1 - np.abs(pitch_range - 12) / 12), 5)
+    pitch_score = pitch_score + np.minimum(10, unique_pitches) / 2
+    rhythm_score = np.select(
+        [(unique_durations >= 2) & (unique_durations <= 5), unique_durations > 5],
+        [10 + (unique_durations - 1) * 2, 15],
+        5
+    ) + np.minimum(5, rhythm_patterns)
+    contour_score = np.clip(20 * (1 - np.abs(direction_changes - ideal_changes) / ideal_changes), 5, 20)
+    phrase_score = np.minimum(20, _phrase_matches(pitches) * 2)
+    interval_score = np.where((consonance >= 0.4) & (consonance <= 0.8), 20, 20 * (1 - np.abs(consonance - 0.6) / 0.6))
+    components = {
+        "pitch": pitch_score, "rhythm": rhythm_score, "contour": contour_score,
+        "phrase": phrase_score, "interval": interval_score,
+    }
+
+    pitch_classes = np.stack([(pitches % 12 == k).mean(axis=1) for k in range(12)], axis=1)
+    return np.column_stack([components[name] for name in genomes.HEURISTIC_COMPONENTS] + [
+        pitch_range,
+        unique_pitches,
+        pitches.mean(axis=1),
+        pitches.std(axis=1),
+        unique_durations,
+        durations.mean(axis=1),
+        durations.std(axis=1),
+        rhythm_patterns / (length - 2),
+        direction_changes / (length - 2),
+        steps.mean(axis=1),
+        (steps > 12).mean(axis=1),
+        consonance,
+        velocities.mean(axis=1),
+        velocities.std(axis=1),
+        pitch_classes,
+    ]).astype(np.float64)
+
+
+class SurrogateModel:
+    """Ridge regression of human scores on FEATURES, fitted from running sums"""
+
+    def __init__(self, experiment_id: int, alpha: float = SURROGATE_RIDGE_ALPHA):
+        self.experiment_id = experiment_id
+        self.alpha = alpha
+        size = len(FEATURES) + 1  # with an intercept column first
+        self.gram = np.zeros((size, size))  # sum of x x'
+        self.moment = np.zeros(size)  # sum of x y
+        self.sum_squares = 0.0  # sum of y^2
+        self.samples = 0
+        self.lock = threading.Lock()
+        self._fit = None  # (coef, intercept), dropped whenever a score is learned
+
+    @property
+    def ready(self) -> bool:
+        return self.samples >= SURROGATE_MIN_SAMPLES
+
+    def observe(self, feature_rows: np.ndarray, scores):
+        """Learn human scores of genomes with these features"""
+        scores = np.asarray(scores, dtype=np.float64)
+        rows = np.column_stack([np.ones(len(scores)), feature_rows])
+        with self.lock:
+            self.gram += rows.T @ rows
+            self.moment += rows.T @ scores
+            self.sum_squares += float(scores @ scores)
+            self.samples += len(scores)
+            self._fit = None
+
+    def _solve(self):
+        """
+        Ridge on standardized features, unpenalized intercept. Centring and
+        scaling come from the sums: sum (x - mean)(x - mean)' = X'X - n mean mean'.
+        """
+        n = self.gram[0, 0]
+        mean = self.gram[0, 1:] / n
+        centred = self.gram[1:, 1:] - n * np.outer(mean, mean)
+        scale = np.sqrt(np.maximum(np.diag(centred), 0.0) / n)
+        scale[scale < 1e-9] = 1.0  # constant features get no weight from the penalty below
+        score_mean = self.moment[0] / n
+        covariance = self.moment[1:] - mean * self.moment[0]
+        standardized = centred / np.outer(scale, scale) + self.alpha * np.eye(len(scale))
+        coef = np.linalg.solve(standardized, covariance / scale) / scale
+        return coef, score_mean - mean @ coef
+
+    def fit(self):
+        with self.lock:
+            if self._fit is None and self.samples:
+                self._fit = self._solve()
+            return self._fit
+
+    def predict(self, feature_rows: np.ndarray) -> np.ndarray:
+        coef, intercept = self.fit()
+        return np.clip(feature_rows @ coef + intercept, MIN_SCORE, MAX_SCORE)
+
+    def r_squared(self) -> float:
+        """Share of the score variance the fit explains on the scores it has seen"""
+        fitted = self.fit()
+        if fitted is None:
+            return 0.0
+        coef, intercept = fitted
+        weights = np.concatenate([[intercept], coef])
+        residual = self.sum_squares - 2 * weights @ self.moment + weights @ self.gram @ weights
+        total = self.sum_squares - self.moment[0] ** 2 / self.samples
+        return float(1 - residual / total) if total > 0 else 0.0
+
+    def stats(self):
+        return {"samples": self.samples, "ready": self.ready, "r_squared": round(self.r_squared(), 4)}
+
+
+def load_model(db: Session, experiment_id: int) -> SurrogateModel:
+    """A model trained on the experiment's most recent human scores"""
+    rows = db.query(models.Mutation.id, models.Mutation.mutation_data, models.Mutation.score).join(
+        models.GenomeExperiment,
+        models.GenomeExperiment.genome_id == models.Mutation.genome_id
+    ).filter(
+        models.GenomeExperiment.experiment_id == experiment_id,
+        models.Mutation.score != None
+    ).distinct().order_by(models.Mutation.id.desc()).limit(SURROGATE_MAX_SAMPLES).all()
+    model = SurrogateModel(experiment_id)
+    feature_rows, valid = featurize([data for _, data, _ in rows])
+    if valid.any():
+        model.observe(feature_rows[valid], np.array([score for _, _, score in rows], dtype=np.float64)[valid])
+    return model
+
+
+class SurrogateRegistry:
+    """Process-wide cache of SurrogateModel, one entry per experiment"""
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, experiment_id: int) -> SurrogateModel:
+        model = self._models.get(experiment_id)
+        if model is not None:
+            return model
+        model = load_model(db, experiment_id)
+        with self._lock:
+            return self._models.setdefault(experiment_id, model)
+
+    def invalidate(self, experiment_id: int):
+        with self._lock:
+            self._models.pop(experiment_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+registry = SurrogateRegistry()
+
+
+def learn(db: Session, experiment: models.Experiment, genome_data: str, score: float):
+    """
+    Teach the experiment's model a human score. Call it before the score is
+    flushed: a model loaded here doesn't include it yet, so it isn't counted twice.
+    """
+    if not SURROGATE_SCREENING:
+        return
+    feature_rows, valid = featurize([genome_data])
+    if valid[0]:
+        registry.get(db, experiment.id).observe(feature_rows, [score])
+
+
+def ready_model(db: Session, experiment: models.Experiment):
+    """The experiment's model if screening is on and it has seen enough scores, else None"""
+    if not SURROGATE_SCREENING:
+        return None
+    model = registry.get(db, experiment.id)
+    return model if model.ready else None
+
+
+def selection_score(genome: models.Genome) -> float:
+    """What a genome competes on in selection: its human score, else its predicted score"""
+    if not genome.user_scored and genome.predicted_score is not None:
+        return genome.predicted_score
+    return genome.score or 0.0
+
+
+def screen(predictions: np.ndarray, genome_datas, keep: int, rng: np.random.Generator):
+    """
+    Indexes of the `keep` candidates to breed: the best predicted distinct
+    melodies, with a SURROGATE_EXPLORE_FRACTION of them drawn at random from
+    the rest. Duplicates only fill up what distinct melodies can't.
+    """
+    order = np.argsort(-predictions, kind="stable").tolist()
+    seen, distinct, duplicates = set(), [], []
+    for i in order:
+        (duplicates if genome_datas[i] in seen else distinct).append(i)
+        seen.add(genome_datas[i])
+
+    explore = min(int(round(keep * SURROGATE_EXPLORE_FRACTION)), max(0, len(distinct) - keep))
+    chosen = distinct[:keep - explore]
+    rest = distinct[keep - explore:]
+    if explore:
+        chosen += [rest[i] for i in sorted(rng.choice(len(rest), size=explore, replace=False).tolist())]
+    return (chosen + duplicates)[:keep]
@@ -0,0 +1,73 @@
+"""
+Full versus incremental heuristic scoring of single-note mutations.
+
+Applies random single-note edits (conservative and wild mutations, plus
+arbitrary pitches to provoke phrase repeats) to random melodies, checks
+after every edit that IncrementalScorer.score() equals heuristic_score() of
+the same notes, and reports the time per rescore for both.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_delta_scoring --melodies 50 --edits 200
+"""
+import argparse
+import json
+import random
+import time
+
+from app import genomes, scoring
+
+
+def random_edit(rng, note):
+    choice = rng.random()
+    if choice < 0.4:
+        return genomes.mutate_gene(note, True, rng)
+    if choice < 0.8:
+        return genomes.mutate_gene(note, False, rng)
+    # Small pitch alphabet, so repeated phrases appear and disappear often
+    return dict(note, pitch=rng.choice([60, 62, 64, 65]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--melodies", type=int, default=50)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    full_time = delta_time = 0.0
+    checked = 0
+
+    for _ in range(args.melodies):
+        notes = json.loads(genomes.create_random_genome())
+        scorer = scoring.IncrementalScorer(notes)
+        for _ in range(args.edits):
+            index = rng.randrange(len(notes))
+            notes[index] = random_edit(rng, notes[index])
+
+            start = time.perf_counter()
+            expected = genomes.heuristic_score(json.dumps(notes))
+            full_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            scorer.set_note(index, notes[index])
+            actual = scorer.score()
+            delta_time += time.perf_counter() - start
+
+            if actual != expected:
+                raise SystemExit(f"Mismatch after editing note {index}: incremental {actual} != full {expected}\n{json.dumps(notes)}")
+            checked += 1
+
+    print(f"{checked} edits on {genomes.GENOME_LENGTH}-note melodies, all scores identical")
+    print(f"full rescore:        {full_time / checked * 1e6:8.1f} us/edit")
+    print(f"incremental rescore: {delta_time / checked * 1e6:8.1f} us/edit ({full_time / delta_time:.1f}x faster)")
+
+    start = time.perf_counter()
+    melody, score = scoring.hill_climb(genomes.create_random_genome(), steps=1000, rng=rng)
+    print(f"hill_climb, 1000 steps: {time.perf_counter() - start:.3f}s, score {score:.2f} "
+          f"(check {genomes.heuristic_score(melody):.2f})")
+
+
+if __name__ == "__main__":
+    main()
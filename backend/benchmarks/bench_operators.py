@@ -0,0 +1,101 @@
+"""
+Microbenchmarks of the selection and crossover operators.
+
+Times every registered operator on a random population, next to the
+per-child Python loop advance_experiment_generation used before (sort, then
+random.choice among the top genomes and a rebuilt candidate list for the
+second parent, then a list-slicing crossover). Also asserts that a short
+parent doesn't shorten anyone else's children.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_operators --population 1000 --children 1000
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from app import genomes, operators
+
+
+def best_of(repeats, fn):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def loop_selection(scored, n_children):
+    top = sorted(scored, key=lambda g: g[1], reverse=True)[:genomes.TOP_GENOMES_TO_CROSSOVER]
+    pairs = []
+    for _ in range(n_children):
+        parent1 = random.choice(top)
+        parent2 = random.choice([g for g in top if g[0] != parent1[0]])
+        pairs.append((parent1[0], parent2[0]))
+    return pairs
+
+
+def loop_crossover(notes, pairs):
+    children = []
+    for first, second in pairs:
+        point = len(notes[first]) // 2
+        children.append(json.dumps(notes[first][:point] + notes[second][point:]))
+    return children
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--population", type=int, default=1000)
+    parser.add_argument("--children", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+    datas = genomes.create_random_genomes(args.population, seed=args.seed)
+    fitness = rng.random(args.population) * 100
+    encoded = operators.encode_genomes(datas)
+    notes = [json.loads(genome_data) for genome_data in datas]
+    pairs = operators.elitist_selection(fitness, args.children, rng)
+
+    print(f"population {args.population}, {args.children} children of {encoded.shape[1]} notes, best of {args.repeats}")
+    print()
+    print(f"{'selection':<28} {'ms':>8}")
+    scored = list(enumerate(fitness.tolist()))
+    print(f"{'python loop (old)':<28} {best_of(args.repeats, lambda: loop_selection(scored, args.children)) * 1000:8.3f}")
+    for name, select in operators.SELECTION_OPERATORS.items():
+        elapsed = best_of(args.repeats, lambda: select(fitness, args.children, rng))
+        print(f"{name:<28} {elapsed * 1000:8.3f}")
+
+    print()
+    print(f"{'crossover (arrays)':<28} {'ms':>8}")
+    first, second = encoded[pairs[:, 0]], encoded[pairs[:, 1]]
+    print(f"{'python loop + json (old)':<28} {best_of(args.repeats, lambda: loop_crossover(notes, pairs.tolist())) * 1000:8.3f}")
+    for name, cross in operators.CROSSOVER_OPERATORS.items():
+        elapsed = best_of(args.repeats, lambda: cross(first, second, rng))
+        print(f"{name:<28} {elapsed * 1000:8.3f}")
+
+    # A short melody among the parents (users can submit any length) only affects its own children
+    short = json.dumps(notes[0][:4])
+    mixed = [short] + datas[1:]
+    mixed_pairs = np.array([[0, 1], [1, 0]] + pairs[:8].tolist())
+    length = len(notes[1])
+    for name in operators.CROSSOVER_OPERATORS:
+        children = [json.loads(c) for c in operators.crossover_pairs(mixed, mixed_pairs, rng, name)]
+        others = [len(c) for c, (a, b) in zip(children, mixed_pairs.tolist()) if 0 not in (a, b)]
+        assert len(children[0]) == len(children[1]) == length, (name, len(children[0]), len(children[1]))
+        assert all(n == length for n in others), (name, others)
+
+    print()
+    print(f"{'encode / decode':<28} {'ms':>8}")
+    print(f"{'encode_genomes':<28} {best_of(args.repeats, lambda: operators.encode_genomes(datas)) * 1000:8.3f}")
+    print(f"{'decode_genomes':<28} {best_of(args.repeats, lambda: operators.decode_genomes(encoded)) * 1000:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
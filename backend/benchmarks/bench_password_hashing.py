@@ -0,0 +1,79 @@
+"""
+Event-loop latency under a burst of concurrent logins.
+
+Runs a 10 ms heartbeat on the event loop while N logins verify their
+password, first calling bcrypt inline (the old behaviour of the async auth
+handlers) and then through auth's bounded password executor, and reports
+how late the heartbeat fired.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_password_hashing --logins 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app import auth
+
+TICK = 0.01
+
+
+async def heartbeat(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def login_inline(password, hashed):
+    # What google_callback/reset_password used to do: bcrypt on the loop thread
+    return auth.pwd_context.verify(password, hashed)
+
+
+async def login_offloaded(password, hashed):
+    return await auth.verify_password_async(password, hashed)
+
+
+async def run(login, logins, password, hashed):
+    lags = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(TICK * 5)  # let the heartbeat settle
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login(password, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    assert all(results)
+    return elapsed, lags
+
+
+def report(name, elapsed, lags):
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(f"{name:<10} total {elapsed * 1000:8.1f} ms | loop lag p50 {statistics.median(lags_ms):7.1f} ms"
+          f"  p99 {p99:7.1f} ms  max {lags_ms[-1]:7.1f} ms  ({len(lags)} ticks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=20, help="concurrent logins per run")
+    args = parser.parse_args()
+
+    password = "correct horse battery staple"
+    hashed = auth.pwd_context.hash(password)
+    logins = min(args.logins, auth.PASSWORD_HASH_MAX_PENDING)
+
+    print(f"bcrypt rounds={auth.BCRYPT_ROUNDS}, workers={auth.PASSWORD_HASH_WORKERS}, "
+          f"max pending={auth.PASSWORD_HASH_MAX_PENDING}, logins={logins}")
+    report("inline", *asyncio.run(run(login_inline, logins, password, hashed)))
+    report("offloaded", *asyncio.run(run(login_offloaded, logins, password, hashed)))
+    auth.password_hash_executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
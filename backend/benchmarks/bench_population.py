@@ -0,0 +1,79 @@
+"""
+Scalar versus vectorized random population generation.
+
+Generates the same number of genomes with create_random_genome (one at a
+time) and create_random_genomes (one NumPy batch), reports the time each
+takes and compares summary statistics of the two populations, which should
+agree within sampling noise: z is the difference of the means over its
+standard error (per-genome values), so |z| above about 3 means the two
+generators have drifted apart.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_population --genomes 2000
+"""
+import argparse
+import json
+import math
+import random
+import statistics
+import time
+
+from app import genomes
+
+
+def describe(population):
+    """Per-genome values of each statistic"""
+    notes = [json.loads(genome_data) for genome_data in population]
+    pitches = [[note["pitch"] for note in genome] for genome in notes]
+    return {
+        "mean pitch": [statistics.mean(genome) for genome in pitches],
+        "pitch range": [max(genome) - min(genome) for genome in pitches],
+        "unique pitches": [len(set(genome)) for genome in pitches],
+        "mean |step|": [
+            statistics.mean(abs(genome[i + 1] - genome[i]) for i in range(len(genome) - 1)) for genome in pitches
+        ],
+        "mean duration": [statistics.mean(note["duration"] for note in genome) for genome in notes],
+        "mean velocity": [statistics.mean(note["velocity"] for note in genome) for genome in notes],
+        "last duration": [genome[-1]["duration"] for genome in notes],
+        "last pitch": [genome[-1]["pitch"] for genome in notes],
+        "heuristic score": [genomes.heuristic_score(genome_data) for genome_data in population],
+    }
+
+
+def z_score(first, second):
+    """Difference of the means of two samples over its standard error"""
+    error = math.sqrt(statistics.variance(first) / len(first) + statistics.variance(second) / len(second))
+    difference = statistics.mean(first) - statistics.mean(second)
+    return difference / error if error else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--genomes", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    start = time.perf_counter()
+    scalar = [genomes.create_random_genome() for _ in range(args.genomes)]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    arrays = genomes.create_random_population(args.genomes, seed=args.seed)
+    array_time = time.perf_counter() - start
+    batch = genomes.population_to_json(*arrays)
+    batch_time = time.perf_counter() - start
+
+    print(f"{args.genomes} genomes of {genomes.GENOME_LENGTH} notes")
+    print(f"create_random_genome loop: {scalar_time * 1000:8.1f} ms")
+    print(f"create_random_population:  {array_time * 1000:8.1f} ms arrays, {batch_time * 1000:.1f} ms with JSON")
+    print()
+    print(f"{'statistic':<16} {'scalar':>10} {'batch':>10} {'z':>7}")
+    scalar_stats, batch_stats = describe(scalar), describe(batch)
+    for name in scalar_stats:
+        first, second = scalar_stats[name], batch_stats[name]
+        print(f"{name:<16} {statistics.mean(first):>10.3f} {statistics.mean(second):>10.3f} {z_score(first, second):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Bookkeeping cost of a steady-state contribution.
+
+Replays random score updates against a PopulationIndex (record the score,
+take the top parents, replace the worst unprotected genome) and against
+re-sorting the population on every contribution, checks that both pick the
+same genomes, and reports the time per contribution.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_steady_state --population 10000 --contributions 5000
+"""
+import argparse
+import random
+import time
+
+from app import genomes
+from app.steady_state import PopulationIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--population", type=int, default=10000)
+    parser.add_argument("--contributions", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scores = {genome_id: rng.uniform(0, 10) for genome_id in range(args.population)}
+    protected = set(rng.sample(range(args.population), args.population // 100))
+    updates = [(rng.randrange(args.population), rng.uniform(0, 10)) for _ in range(args.contributions)]
+    k = genomes.TOP_GENOMES_TO_CROSSOVER
+
+    index = PopulationIndex(0, 0, scores.items(), protected)
+    next_id = args.population
+    picked_index = []
+    start = time.perf_counter()
+    for genome_id, score in updates:
+        if genome_id not in index.scores:
+            continue
+        index.update(genome_id, score)
+        top = index.best(k)
+        worst = index.worst()
+        index.remove(worst)
+        index.update(next_id, score)  # stands in for the child's first score
+        next_id += 1
+        picked_index.append(([g for g, _ in top], worst))
+    index_time = time.perf_counter() - start
+
+    population = dict(scores)
+    next_id = args.population
+    picked_sort = []
+    start = time.perf_counter()
+    for genome_id, score in updates:
+        if genome_id not in population:
+            continue
+        population[genome_id] = score
+        ranked = sorted(population.items(), key=lambda item: (-item[1], item[0]))
+        top = [g for g, _ in ranked[:k]]
+        # Ties: the index takes the lowest id among the lowest scores
+        lowest = min(s for g, s in population.items() if g not in protected)
+        worst = min(g for g, s in population.items() if s == lowest and g not in protected)
+        del population[worst]
+        population[next_id] = score
+        next_id += 1
+        picked_sort.append((top, worst))
+    sort_time = time.perf_counter() - start
+
+    count = len(picked_index)
+    print(f"population {args.population}, {count} contributions")
+    print(f"PopulationIndex: {index_time / count * 1e6:10.1f} us per contribution")
+    print(f"sort per score:  {sort_time / count * 1e6:10.1f} us per contribution")
+    print(f"same picks: {picked_index == picked_sort}")
+
+
+if __name__ == "__main__":
+    main()
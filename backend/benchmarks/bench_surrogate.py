@@ -0,0 +1,97 @@
+"""
+Training cost and screening value of the surrogate fitness model.
+
+A hidden "human" taste (the heuristic score plus a preference for one key,
+with noise) scores random genomes. The model learns the first --train of
+them one score at a time, as contributions arrive, and is then asked to
+rank --holdout others and to screen candidate pools: keep the best
+INITIAL_GENOME_COUNT of INITIAL_GENOME_COUNT * SURROGATE_POOL_FACTOR.
+Reports the time to learn, refit, load and predict, the rank correlation
+on held-out genomes, and the hidden score of screened vs unscreened children.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_surrogate --train 200 --holdout 300
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app import genomes, surrogate
+
+
+def taste(genome_datas, rng):
+    """Half the heuristic score, up to 50 for melodies in C major, and noise"""
+    in_c_major = surrogate.features(genome_datas)[:, -12:][:, [0, 2, 4, 5, 7, 9, 11]].sum(axis=1)
+    heuristic = np.array([genomes.heuristic_score(data) for data in genome_datas])
+    return np.clip(heuristic / 2 + 50 * in_c_major + rng.normal(0, 5, len(genome_datas)), 0, 100)
+
+
+def ranks(values):
+    order = np.empty(len(values))
+    order[np.argsort(values, kind="stable")] = np.arange(len(values))
+    return order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train", type=int, default=200)
+    parser.add_argument("--holdout", type=int, default=300)
+    parser.add_argument("--pools", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    keep = genomes.INITIAL_GENOME_COUNT
+    pool_size = keep * surrogate.SURROGATE_POOL_FACTOR
+    datas = genomes.create_random_genomes(args.train + args.holdout + args.pools * pool_size, seed=args.seed)
+    scores = taste(datas, rng)
+    train, holdout = slice(0, args.train), slice(args.train, args.train + args.holdout)
+
+    model = surrogate.SurrogateModel(0)
+    start = time.perf_counter()
+    for data, score in zip(datas[train], scores[train]):
+        model.observe(surrogate.features([data]), [score])
+    learn_time = time.perf_counter() - start
+    start = time.perf_counter()
+    model.fit()
+    fit_time = time.perf_counter() - start
+
+    # What loading a model from stored scores costs: one batch
+    start = time.perf_counter()
+    surrogate.SurrogateModel(0).observe(surrogate.features(datas[train]), scores[train])
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predicted = model.predict(surrogate.features(datas[holdout]))
+    predict_time = time.perf_counter() - start
+    correlation = np.corrcoef(ranks(predicted), ranks(scores[holdout]))[0, 1]
+
+    # Short or unreadable submissions among the rows don't change anyone else's features
+    mixed = surrogate.features(["[]", "not json", json.dumps(json.loads(datas[0])[:2])] + datas[holdout])
+    assert not mixed[:3].any()
+    assert np.array_equal(mixed[3:], surrogate.features(datas[holdout]))
+
+    screened, unscreened = [], []
+    offset = args.train + args.holdout
+    for p in range(args.pools):
+        pool = slice(offset + p * pool_size, offset + (p + 1) * pool_size)
+        pool_datas = datas[pool]
+        kept = surrogate.screen(model.predict(surrogate.features(pool_datas)), pool_datas, keep, rng)
+        screened.append(scores[pool][kept].mean())
+        unscreened.append(scores[pool][:keep].mean())
+
+    print(f"{args.train} training scores, {len(surrogate.FEATURES)} features, "
+          f"{len(json.loads(datas[0]))} notes per genome")
+    print(f"learn one score:   {learn_time / args.train * 1e6:10.1f} us")
+    print(f"refit:             {fit_time * 1e6:10.1f} us")
+    print(f"load {args.train} scores:  {load_time * 1e3:10.1f} ms")
+    print(f"predict {args.holdout}:       {predict_time * 1e3:10.1f} ms")
+    print(f"training R^2: {model.r_squared():.3f}, held-out rank correlation: {correlation:.3f}")
+    print(f"hidden score of kept children: screened {np.mean(screened):.1f}, "
+          f"unscreened {np.mean(unscreened):.1f} (pool of {pool_size}, keep {keep}; hidden score sd {scores.std():.1f})")
+
+
+if __name__ == "__main__":
+    main()
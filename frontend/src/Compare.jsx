@@ -121,36 +121,31 @@ const Compare = () => {
         'Content-Type': 'application/json'
       };
 
-      // Fetch both melodies in parallel
-      const [firstResponse, secondResponse] = await Promise.all([
-        fetch(`http://localhost:8000/api/genome/${melodyIds.first}`, {
-          headers: authHeaders
-        }),
-        fetch(`http://localhost:8000/api/genome/${melodyIds.second}`, {
-          headers: authHeaders
-        })
-      ]);
+      // Fetch both melodies in a single batch request
+      const response = await fetch(
+        `http://localhost:8000/api/genomes?ids=${melodyIds.first},${melodyIds.second}`,
+        { headers: authHeaders }
+      );
 
       // Handle specific error cases more gracefully
-      if (!firstResponse.ok) {
-        if (firstResponse.status === 401) {
+      if (!response.ok) {
+        if (response.status === 401) {
           localStorage.removeItem('token');
           navigate('/login', { state: { message: "Your session has expired. Please log in again." } });
           return;
         }
-        throw new Error(`Melody with ID ${melodyIds.first} not found or is inaccessible.`);
+        throw new Error("Could not load the melodies to compare.");
       }
-      if (!secondResponse.ok) {
-        if (secondResponse.status === 401) {
-          localStorage.removeItem('token');
-          navigate('/login', { state: { message: "Your session has expired. Please log in again." } });
-          return;
-        }
-        throw new Error(`Melody with ID ${melodyIds.second} not found or is inaccessible.`);
+
+      const batch = await response.json();
+      const missingId = [melodyIds.first, melodyIds.second].find(
+        id => batch.missing_ids.includes(Number(id))
+      );
+      if (missingId !== undefined) {
+        throw new Error(`Melody with ID ${missingId} not found or is inaccessible.`);
       }
 
-      const firstGenome = await firstResponse.json();
-      const secondGenome = await secondResponse.json();
+      const [firstGenome, secondGenome] = batch.genomes;
 
       const loadedMelodies = {
         first: firstGenome,
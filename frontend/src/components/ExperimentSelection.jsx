@@ -10,6 +10,34 @@ const ExperimentSelection = ({ onSelectGenome, onSelectGenomeWithContribution })
     fetchExperiments();
   }, []);
 
+  // Keep the list current from server-sent events instead of re-polling
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (!token || typeof EventSource === 'undefined') return undefined;
+
+    const source = new EventSource(`http://localhost:8000/api/events?token=${encodeURIComponent(token)}`);
+    const updateExperiment = (experimentId, changes) => {
+      setExperiments(prev => prev.map(exp => (
+        exp.id === experimentId ? { ...exp, ...changes } : exp
+      )));
+    };
+
+    source.addEventListener('experiment_advanced', (event) => {
+      const data = JSON.parse(event.data);
+      updateExperiment(data.experiment_id, { current_generation: data.generation });
+    });
+    source.addEventListener('experiment_completed', (event) => {
+      const data = JSON.parse(event.data);
+      updateExperiment(data.experiment_id, { completed: true, final_genome_id: data.final_genome_id });
+    });
+    source.addEventListener('best_score_changed', (event) => {
+      const data = JSON.parse(event.data);
+      updateExperiment(data.experiment_id, { best_score: data.best_score });
+    });
+
+    return () => source.close();
+  }, []);
+
   const fetchExperiments = async () => {
     try {
       setLoading(true);
@@ -55,26 +83,21 @@ const ExperimentSelection = ({ onSelectGenome, onSelectGenomeWithContribution })
       setLoading(true);
       const token = localStorage.getItem('token');
       
-      // First check if user has already contributed to this experiment's generation
-      const contributionCheck = await fetch(
-        `http://localhost:8000/api/experiments/${experimentId}/generation/${generation}/contribution`,
+      // Check eligibility and get a genome for this generation in a single call
+      const response = await fetch(
+        `http://localhost:8000/api/experiments/${experimentId}/generation/${generation}/claim`,
         {
+          method: 'POST',
           headers: { Authorization: `Bearer ${token}` },
         }
       );
       
-      const contributionStatus = await contributionCheck.json();
+      if (!response.ok) throw new Error('Failed to fetch genome from experiment');
       
-      if (contributionStatus.has_contributed) {
-        // User has already contributed - get the genome anyway but set the countdown state
-        const response = await fetch(`http://localhost:8000/api/experiments/${experimentId}/generation/${generation}`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        
-        if (!response.ok) throw new Error('Failed to fetch genome from experiment');
-        
-        const genomeData = await response.json();
-        
+      const { has_contributed: hasContributed, next_update: nextUpdate, ...genomeData } = await response.json();
+      
+      if (hasContributed) {
+        // User has already contributed - show the genome but set the countdown state
         // Ensure we're storing the contribution record in localStorage
         const contributionKey = `${experimentId}_${generation}`;
         const storedContributions = JSON.parse(localStorage.getItem('userContributions') || '{}');
@@ -82,21 +105,13 @@ const ExperimentSelection = ({ onSelectGenome, onSelectGenomeWithContribution })
         localStorage.setItem('userContributions', JSON.stringify(storedContributions));
         
         // Set next update time in the parent component
-        if (contributionStatus.next_update) {
-          const nextUpdateTime = new Date(contributionStatus.next_update);
-          onSelectGenomeWithContribution(genomeData, true, nextUpdateTime);
+        if (nextUpdate) {
+          onSelectGenomeWithContribution(genomeData, true, new Date(nextUpdate));
         } else {
           onSelectGenomeWithContribution(genomeData, true);
         }
       } else {
         // User hasn't contributed yet - proceed normally
-        const response = await fetch(`http://localhost:8000/api/experiments/${experimentId}/generation/${generation}`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        
-        if (!response.ok) throw new Error('Failed to fetch genome from experiment');
-        
-        const genomeData = await response.json();
         onSelectGenomeWithContribution(genomeData, false);
       }
     } catch (err) {